@@ -1,12 +1,49 @@
 from django.contrib import admin
+from django.contrib.admin import helpers
 from django.contrib.auth.admin import UserAdmin
+from django.db.models import Sum
+from django.template.response import TemplateResponse
+from django.utils import timezone
 from .models import (
     User, Specialization, LessonTopic, TeacherProfile, 
-    LessonRequest, TeacherAvailability, LessonBooking
+    LessonRequest, TeacherAvailability, LessonBooking, DailyTopicStats,
+    ArchivedLessonRequest, ArchivedTeacherAvailability, ArchivedLessonBooking,
+    OutboxMessage, LessonRequestMatch
 )
+from .exports import streaming_export_response
+from .paginator import EstimatedCountPaginator
+from .scheduling import confirm_schedule, propose_schedule
+
+
+class ScalableAdminMixin:
+    """
+    Changelist settings for tables that can grow to millions of rows:
+    no second COUNT(*) for the unfiltered total, and an estimated count
+    for the paginator when the table is large.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def get_queryset(self, request):
+        # Also used by the autocomplete views, which render __str__ per row
+        queryset = super().get_queryset(request)
+        if isinstance(self.list_select_related, (list, tuple)) and self.list_select_related:
+            queryset = queryset.select_related(*self.list_select_related)
+        return queryset
+
+
+@admin.action(description='Export selected rows as CSV')
+def export_as_csv(modeladmin, request, queryset):
+    return streaming_export_response(queryset, 'csv')
+
+
+@admin.action(description='Export selected rows as JSONL')
+def export_as_jsonl(modeladmin, request, queryset):
+    return streaming_export_response(queryset, 'jsonl')
+
 
 @admin.register(User)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(ScalableAdminMixin, UserAdmin):
     """Custom admin for User model"""
     list_display = ('username', 'email', 'first_name', 'last_name', 'user_type', 'is_active', 'date_joined')
     list_filter = ('user_type', 'is_active', 'is_staff', 'date_joined')
@@ -27,7 +64,7 @@ class CustomUserAdmin(UserAdmin):
 
 
 @admin.register(Specialization)
-class SpecializationAdmin(admin.ModelAdmin):
+class SpecializationAdmin(ScalableAdminMixin, admin.ModelAdmin):
     """Admin for Specialization model"""
     list_display = ('name', 'description', 'created_at')
     search_fields = ('name', 'description')
@@ -36,52 +73,235 @@ class SpecializationAdmin(admin.ModelAdmin):
 
 
 @admin.register(LessonTopic)
-class LessonTopicAdmin(admin.ModelAdmin):
+class LessonTopicAdmin(ScalableAdminMixin, admin.ModelAdmin):
     """Admin for LessonTopic model"""
     list_display = ('name', 'specialization', 'description', 'created_at')
     list_filter = ('specialization', 'created_at')
     search_fields = ('name', 'description', 'specialization__name')
     ordering = ('specialization', 'name')
     list_per_page = 20
+    list_select_related = ('specialization',)
+    autocomplete_fields = ('specialization',)
 
 
 @admin.register(TeacherProfile)
-class TeacherProfileAdmin(admin.ModelAdmin):
+class TeacherProfileAdmin(ScalableAdminMixin, admin.ModelAdmin):
     """Admin for TeacherProfile model"""
     list_display = ('user', 'hourly_rate', 'experience_years', 'is_available', 'created_at')
     list_filter = ('is_available', 'experience_years', 'created_at')
     search_fields = ('user__username', 'user__first_name', 'user__last_name', 'about')
     ordering = ('-created_at',)
     list_per_page = 20
+    list_select_related = ('user',)
+    
+    # Autocomplete widgets fetch options on demand instead of rendering
+    # every user/specialization/topic into the page
+    autocomplete_fields = ('user', 'specializations', 'lesson_topics')
+
+
+@admin.action(description='Propose a conflict-free schedule for the selected offers')
+def optimize_schedule(modeladmin, request, queryset):
+    """Show the bookings the optimizer proposes; book them once confirmed"""
+    if request.POST.get('post'):
+        bookings = confirm_schedule(queryset)
+        modeladmin.message_user(request, f'{len(bookings)} booking(s) created.')
+        return None
     
-    filter_horizontal = ('specializations', 'lesson_topics')
+    proposals, stats = propose_schedule(queryset)
+    shown = TeacherAvailability.objects.select_related(
+        'teacher', 'lesson_request__student', 'lesson_request__lesson_topic'
+    ).in_bulk([proposal.teacher_availability_id for proposal in proposals[:200]])
+    return TemplateResponse(request, 'admin/core/teacheravailability/schedule_proposal.html', {
+        **modeladmin.admin_site.each_context(request),
+        'title': 'Proposed schedule',
+        'opts': modeladmin.model._meta,
+        'proposals': [shown[proposal.teacher_availability_id] for proposal in proposals[:200]],
+        'proposal_count': len(proposals),
+        'stats': stats,
+        'selected_ids': queryset.values_list('pk', flat=True),
+        'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+    })
 
 
 @admin.register(LessonRequest)
-class LessonRequestAdmin(admin.ModelAdmin):
+class LessonRequestAdmin(ScalableAdminMixin, admin.ModelAdmin):
     """Admin for LessonRequest model"""
     list_display = ('student', 'lesson_topic', 'lesson_duration', 'max_hourly_rate', 'status', 'created_at')
     list_filter = ('status', 'lesson_topic__specialization', 'created_at')
     search_fields = ('student__username', 'student__first_name', 'student__last_name', 'lesson_topic__name')
     ordering = ('-created_at',)
     list_per_page = 20
+    actions = [export_as_csv, export_as_jsonl]
+    list_select_related = ('student', 'lesson_topic__specialization')
+    autocomplete_fields = ('student', 'lesson_topic')
 
 
 @admin.register(TeacherAvailability)
-class TeacherAvailabilityAdmin(admin.ModelAdmin):
+class TeacherAvailabilityAdmin(ScalableAdminMixin, admin.ModelAdmin):
     """Admin for TeacherAvailability model"""
     list_display = ('teacher', 'lesson_request', 'available_date', 'available_time', 'duration', 'is_accepted')
     list_filter = ('is_accepted', 'available_date', 'created_at')
     search_fields = ('teacher__username', 'teacher__first_name', 'teacher__last_name')
     ordering = ('available_date', 'available_time')
     list_per_page = 20
+    actions = [export_as_csv, export_as_jsonl, optimize_schedule]
+    list_select_related = ('teacher', 'lesson_request__student', 'lesson_request__lesson_topic')
+    autocomplete_fields = ('teacher', 'lesson_request')
 
 
 @admin.register(LessonBooking)
-class LessonBookingAdmin(admin.ModelAdmin):
+class LessonBookingAdmin(ScalableAdminMixin, admin.ModelAdmin):
     """Admin for LessonBooking model"""
     list_display = ('lesson_request', 'teacher', 'teacher_availability', 'status', 'created_at')
     list_filter = ('status', 'created_at')
     search_fields = ('lesson_request__student__username', 'teacher__username')
     ordering = ('-created_at',)
     list_per_page = 20
+    actions = [export_as_csv, export_as_jsonl]
+    list_select_related = (
+        'lesson_request__student', 'lesson_request__lesson_topic',
+        'teacher', 'teacher_availability__teacher',
+    )
+    autocomplete_fields = ('lesson_request', 'teacher', 'teacher_availability')
+
+
+class ArchiveAdminMixin(ScalableAdminMixin):
+    """Archived rows are only written by the archive_requests command"""
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedLessonRequest)
+class ArchivedLessonRequestAdmin(ArchiveAdminMixin, admin.ModelAdmin):
+    """Admin for ArchivedLessonRequest model"""
+    list_display = ('id', 'student', 'lesson_topic', 'status', 'created_at', 'archived_at')
+    list_filter = ('status', 'lesson_topic__specialization', 'created_at')
+    search_fields = ('student__username', 'student__first_name', 'student__last_name', 'lesson_topic__name')
+    ordering = ('-created_at',)
+    list_per_page = 20
+    list_select_related = ('student', 'lesson_topic__specialization')
+
+
+@admin.register(ArchivedTeacherAvailability)
+class ArchivedTeacherAvailabilityAdmin(ArchiveAdminMixin, admin.ModelAdmin):
+    """Admin for ArchivedTeacherAvailability model"""
+    list_display = ('id', 'teacher', 'lesson_request', 'available_date', 'available_time', 'is_accepted')
+    list_filter = ('is_accepted', 'available_date')
+    search_fields = ('teacher__username', 'teacher__first_name', 'teacher__last_name')
+    ordering = ('-available_date', '-available_time')
+    list_per_page = 20
+    list_select_related = ('teacher',)
+
+
+@admin.register(ArchivedLessonBooking)
+class ArchivedLessonBookingAdmin(ArchiveAdminMixin, admin.ModelAdmin):
+    """Admin for ArchivedLessonBooking model"""
+    list_display = ('id', 'lesson_request', 'teacher', 'status', 'created_at', 'archived_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('lesson_request__student__username', 'teacher__username')
+    ordering = ('-created_at',)
+    list_per_page = 20
+    list_select_related = ('teacher',)
+
+
+@admin.register(LessonRequestMatch)
+class LessonRequestMatchAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    """Eligible teachers per pending request; rebuilt by match_requests"""
+    list_display = ('lesson_request', 'rank', 'teacher', 'hourly_rate')
+    search_fields = ('teacher__username', 'lesson_request__student__username')
+    ordering = ('lesson_request', 'rank')
+    list_per_page = 50
+    list_select_related = ('lesson_request__student', 'lesson_request__lesson_topic', 'teacher')
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    """Notification outbox; deliver_notifications sends the pending rows"""
+    list_display = ('event', 'recipient', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status', 'event', 'created_at')
+    search_fields = ('recipient__username', 'recipient__email', 'dedup_key')
+    ordering = ('-created_at',)
+    list_per_page = 50
+    list_select_related = ('recipient',)
+    readonly_fields = (
+        'event', 'recipient', 'dedup_key', 'payload', 'status', 'attempts',
+        'next_attempt_at', 'last_error', 'created_at', 'sent_at',
+    )
+    actions = ['requeue']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    @admin.action(description='Retry selected failed messages')
+    def requeue(self, request, queryset):
+        count = queryset.filter(status='failed').update(
+            status='pending', attempts=0, next_attempt_at=timezone.now(), last_error=''
+        )
+        self.message_user(request, f'{count} message(s) queued for delivery.')
+
+
+@admin.register(DailyTopicStats)
+class DailyTopicStatsAdmin(admin.ModelAdmin):
+    """
+    Read-only reports built from the daily rollups; never touches the raw
+    request/booking tables. Refresh with the rollup_analytics command.
+    """
+    list_display = (
+        'date', 'specialization', 'lesson_topic', 'requests_created', 'requests_matched',
+        'conversion', 'bookings_created', 'bookings_cancelled', 'revenue_estimate'
+    )
+    list_filter = ('specialization', 'date')
+    date_hierarchy = 'date'
+    ordering = ('-date', 'specialization__name', 'lesson_topic__name')
+    list_select_related = ('specialization', 'lesson_topic__specialization')
+    list_per_page = 50
+    
+    SUMMARY_FIELDS = (
+        'requests_created', 'requests_matched', 'requests_cancelled',
+        'bookings_created', 'bookings_completed', 'bookings_cancelled', 'revenue_estimate',
+    )
+    
+    @admin.display(description='Conversion')
+    def conversion(self, obj):
+        return f'{obj.conversion_rate:.0%}'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context=extra_context)
+        try:
+            queryset = response.context_data['cl'].queryset
+        except (AttributeError, KeyError):
+            # Redirects and error responses have no changelist
+            return response
+        
+        # Totals per specialization for the current filters
+        summary = list(
+            queryset.order_by().values('specialization__name').annotate(
+                **{field: Sum(field) for field in self.SUMMARY_FIELDS}
+            ).order_by('specialization__name')
+        )
+        for row in summary:
+            created = row['requests_created'] or 0
+            row['conversion'] = (row['requests_matched'] or 0) / created if created else 0
+        totals = queryset.aggregate(**{field: Sum(field) for field in self.SUMMARY_FIELDS})
+        created = totals['requests_created'] or 0
+        totals['conversion'] = (totals['requests_matched'] or 0) / created if created else 0
+        
+        response.context_data['summary'] = summary
+        response.context_data['summary_totals'] = totals
+        return response
@@ -0,0 +1,564 @@
+"""
+Versioned JSON API (``/api/v1/``) for the mobile client.
+
+Rows are built straight from ``.values()``, with one joined query per page
+and never any model instances, and written as compact JSON. List endpoints
+take:
+
+* ``fields=a,b``: return only these fields (see RESOURCES);
+* ``limit=n`` and ``cursor=...``: keyset pagination, newest first; ``next``
+  is the cursor of the following page, or null on the last one.
+
+GETs carry an ETag derived from the cache version stamps, so a client
+sending If-None-Match gets a 304 without any query running. ``changes/``
+returns only what changed since a client-held token (see core.sync). Writes go
+through the same forms, outbox notifications and booking logic as the HTML
+views. The API uses the session login; POSTs need the CSRF token.
+"""
+import base64
+import binascii
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from . import outbox, sync
+from .caching import dashboard_versions, get_versions
+from .forms import LessonRequestForm, LessonSearchForm, TeacherAvailabilityForm
+from .freebusy import free_teachers
+from .models import User, TeacherProfile, LessonRequest, TeacherAvailability, LessonBooking
+from .scheduling import BookingConflict, book_availability
+from .views import eligible_lesson_requests
+
+
+API_VERSION = 'v1'
+
+# Public field name -> lookup passed to .values(), per resource. None marks
+# fields computed per page: names from the name columns, and the teachers'
+# specializations and topics with one extra query each.
+RESOURCES = {
+    'teachers': {
+        'id': 'user_id',
+        'username': 'user__username',
+        'first_name': 'user__first_name',
+        'last_name': 'user__last_name',
+        'profile_picture': 'user__profile_picture',
+        'hourly_rate': 'hourly_rate',
+        'experience_years': 'experience_years',
+        'about': 'about',
+        'specializations': None,
+        'lesson_topics': None,
+    },
+    'requests': {
+        'id': 'pk',
+        'student_id': 'student_id',
+        'student_name': None,
+        'lesson_topic_id': 'lesson_topic_id',
+        'lesson_topic': 'lesson_topic__name',
+        'specialization': 'lesson_topic__specialization__name',
+        'lesson_duration': 'lesson_duration',
+        'max_hourly_rate': 'max_hourly_rate',
+        'additional_notes': 'additional_notes',
+        'status': 'status',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    },
+    'availabilities': {
+        'id': 'pk',
+        'lesson_request_id': 'lesson_request_id',
+        'lesson_topic': 'lesson_request__lesson_topic__name',
+        'teacher_id': 'teacher_id',
+        'teacher_name': None,
+        'hourly_rate': 'teacher__teacher_profile__hourly_rate',
+        'student_id': 'lesson_request__student_id',
+        'date': 'available_date',
+        'time': 'available_time',
+        'duration': 'duration',
+        'is_accepted': 'is_accepted',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    },
+    'bookings': {
+        'id': 'pk',
+        'lesson_request_id': 'lesson_request_id',
+        'lesson_topic': 'lesson_request__lesson_topic__name',
+        'teacher_id': 'teacher_id',
+        'teacher_name': None,
+        'student_id': 'lesson_request__student_id',
+        'student_name': None,
+        'date': 'teacher_availability__available_date',
+        'time': 'teacher_availability__available_time',
+        'duration': 'teacher_availability__duration',
+        'status': 'status',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    },
+}
+
+# Columns the ``*_name`` fields are built from, and the relation they sit
+# behind in each resource
+NAME_LOOKUPS = {
+    'student_name': ('student__first_name', 'student__last_name', 'student__username'),
+    'teacher_name': ('teacher__first_name', 'teacher__last_name', 'teacher__username'),
+}
+NAME_PREFIXES = {
+    'requests': {'student_name': ''},
+    'availabilities': {'teacher_name': ''},
+    'bookings': {'teacher_name': '', 'student_name': 'lesson_request__'},
+}
+
+
+class ApiError(Exception):
+    """Turned into a JSON error response by api_view"""
+
+    def __init__(self, status, message, **extra):
+        super().__init__(message)
+        self.status = status
+        self.body = {'error': message, **extra}
+
+
+def api_response(data, status=200):
+    """Compact JSON: no whitespace, non-ASCII kept as is"""
+    return JsonResponse(
+        data, status=status, encoder=DjangoJSONEncoder,
+        json_dumps_params={'separators': (',', ':'), 'ensure_ascii': False},
+    )
+
+
+def api_view(methods, user_type=None):
+    """
+    Allowed methods, login and user type checks with JSON errors (the HTML
+    views redirect instead), and ApiError -> JSON response
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                response = api_response({'error': 'Method not allowed.'}, status=405)
+                response['Allow'] = ', '.join(methods)
+                return response
+            if not request.user.is_authenticated:
+                return api_response({'error': 'Authentication required.'}, status=401)
+            if user_type is not None and request.user.user_type != user_type:
+                return api_response({'error': f'Only {user_type}s can use this endpoint.'}, status=403)
+            try:
+                return view(request, *args, **kwargs)
+            except ApiError as error:
+                return api_response(error.body, status=error.status)
+        return wrapper
+    return decorator
+
+
+def make_etag(*parts):
+    raw = ':'.join(str(part) for part in (API_VERSION, *parts))
+    return hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+
+
+def user_etag(request, *args, **kwargs):
+    """ETag of the user's own data, from the same versions as the dashboards"""
+    if request.method != 'GET' or not request.user.is_authenticated:
+        return None
+    versions = dashboard_versions(request.user)
+    return make_etag(request.user.pk, request.user.user_type, versions['requests'], request.get_full_path())
+
+
+def dated_user_etag(request, *args, **kwargs):
+    """user_etag for views that also depend on today's date (upcoming counts)"""
+    etag = user_etag(request)
+    return etag and make_etag(etag, timezone.localdate())
+
+
+def search_etag(request, *args, **kwargs):
+    """
+    ETag of a search, from the teacher profile and taxonomy versions.
+    Searches filtered by free/busy depend on every booking, so get none.
+    """
+    if request.method != 'GET' or request.GET.get('available_date') or request.GET.get('available_time'):
+        return None
+    versions = get_versions(['teacher_profiles', 'taxonomy'])
+    return make_etag(versions['teacher_profiles'], versions['taxonomy'], request.get_full_path())
+
+
+def request_data(request):
+    """POST data from a JSON body or a form-encoded one"""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            raise ApiError(400, 'Invalid JSON body.')
+        if not isinstance(data, dict):
+            raise ApiError(400, 'The JSON body must be an object.')
+        return {key: '' if value is None else str(value) for key, value in data.items()}
+    return request.POST
+
+
+def form_errors(form):
+    return ApiError(400, 'Invalid data.', errors=form.errors)
+
+
+def parse_fields(request, resource):
+    """Fields selected with ``fields=`` (all of them by default)"""
+    available = RESOURCES[resource]
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(available)
+    fields = [field.strip() for field in raw.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise ApiError(400, 'Unknown fields.', fields=unknown, available=list(available))
+    return fields
+
+
+def parse_limit(request):
+    raw = request.GET.get('limit')
+    if not raw:
+        return settings.API_PAGE_SIZE
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise ApiError(400, 'limit must be an integer.')
+    return max(1, min(limit, settings.API_MAX_PAGE_SIZE))
+
+
+def encode_cursor(pk):
+    return base64.urlsafe_b64encode(str(pk).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        return int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ApiError(400, 'Invalid cursor.')
+
+
+def full_name(first_name, last_name, username):
+    return f'{first_name} {last_name}'.strip() or username
+
+
+def fill_names(resource, fields, rows):
+    """``*_name`` fields from the name columns fetched with the page"""
+    for field, prefix in NAME_PREFIXES.get(resource, {}).items():
+        if field in fields:
+            lookups = [prefix + lookup for lookup in NAME_LOOKUPS[field]]
+            for row in rows:
+                row[field] = full_name(*(row[lookup] for lookup in lookups))
+
+
+def fill_teacher_fields(fields, rows):
+    """Specializations and topics of a page of teachers, one query each"""
+    profile_ids = [row['pk'] for row in rows]
+    if 'specializations' in fields:
+        names = {}
+        through = TeacherProfile.specializations.through.objects.filter(
+            teacherprofile_id__in=profile_ids
+        ).values_list('teacherprofile_id', 'specialization__name').order_by('specialization__name')
+        for profile_id, name in through:
+            names.setdefault(profile_id, []).append(name)
+        for row in rows:
+            row['specializations'] = names.get(row['pk'], [])
+    if 'lesson_topics' in fields:
+        topics = {}
+        through = TeacherProfile.lesson_topics.through.objects.filter(
+            teacherprofile_id__in=profile_ids
+        ).values_list('teacherprofile_id', 'lessontopic_id', 'lessontopic__name').order_by('lessontopic__name')
+        for profile_id, topic_id, name in through:
+            topics.setdefault(profile_id, []).append({'id': topic_id, 'name': name})
+        for row in rows:
+            row['lesson_topics'] = topics.get(row['pk'], [])
+    if 'profile_picture' in fields:
+        for row in rows:
+            path = row['user__profile_picture']
+            row['user__profile_picture'] = settings.MEDIA_URL + path if path else None
+
+
+def read_rows(resource, fields, queryset, count, keep=None):
+    """
+    Up to ``count`` ``.values()`` rows of ``queryset`` for the selected fields
+    (fewer if ``keep`` drops some), plus whether more follow and the last
+    primary key read
+    """
+    available = RESOURCES[resource]
+    lookups = {'pk'}
+    lookups.update(available[field] for field in fields if available[field])
+    for field, prefix in NAME_PREFIXES.get(resource, {}).items():
+        if field in fields:
+            lookups.update(prefix + lookup for lookup in NAME_LOOKUPS[field])
+    if resource == 'teachers':
+        lookups.add('user_id')
+    rows = list(queryset.values(*lookups)[:count + 1])
+    more = len(rows) > count
+    rows = rows[:count]
+    last_pk = rows[-1]['pk'] if rows else None
+    if keep is not None:
+        rows = keep(rows)
+    return rows, more, last_pk
+
+
+def serialize_rows(resource, fields, rows):
+    """The selected fields of rows from read_rows(), computed ones filled in"""
+    available = RESOURCES[resource]
+    fill_names(resource, fields, rows)
+    if resource == 'teachers':
+        fill_teacher_fields(fields, rows)
+    return [
+        {field: row[available[field] or field] for field in fields}
+        for row in rows
+    ]
+
+
+def fetch_rows(resource, fields, queryset, count):
+    """Up to ``count`` serialized rows, whether more follow and the last primary key"""
+    rows, more, last_pk = read_rows(resource, fields, queryset, count)
+    return serialize_rows(resource, fields, rows), more, last_pk
+
+
+def paginate(request, resource, queryset, keep=None):
+    """
+    One page of ``queryset`` as ``{'results': [...], 'next': cursor}``,
+    newest first by primary key. ``keep(rows)`` may drop fetched rows (e.g.
+    teachers who are busy); the page is then refilled a full ``limit`` at a
+    time, at most API_PAGE_PASSES times, after which a short page is returned
+    with the cursor where the scan stopped.
+    """
+    fields = parse_fields(request, resource)
+    limit = parse_limit(request)
+    queryset = queryset.order_by('-pk')
+    cursor = request.GET.get('cursor')
+    if cursor:
+        queryset = queryset.filter(pk__lt=decode_cursor(cursor))
+
+    rows, next_pk = [], None
+    for _ in range(settings.API_PAGE_PASSES):
+        batch, more, last_pk = read_rows(resource, fields, queryset, limit, keep)
+        rows.extend(batch)
+        next_pk = last_pk if more else None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_pk = rows[-1]['pk']
+        if next_pk is None or len(rows) >= limit:
+            break
+        queryset = queryset.filter(pk__lt=next_pk)
+    return {
+        'results': serialize_rows(resource, fields, rows),
+        'next': encode_cursor(next_pk) if next_pk is not None else None,
+    }
+
+
+def serialize_one(resource, instance):
+    queryset = type(instance).objects.filter(pk=instance.pk)
+    return fetch_rows(resource, list(RESOURCES[resource]), queryset, 1)[0][0]
+
+
+def teacher_profile_or_error(user):
+    try:
+        return user.teacher_profile
+    except TeacherProfile.DoesNotExist:
+        raise ApiError(409, 'Create your teacher profile first.')
+
+
+def free_at(available_date, available_time, duration):
+    """paginate() filter keeping the teacher rows free for that slot"""
+    def keep(rows):
+        free = free_teachers([row['user_id'] for row in rows], available_date, available_time, duration)
+        return [row for row in rows if row['user_id'] in free]
+    return keep
+
+
+@api_view(['GET'], user_type='student')
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=search_etag)
+def search(request):
+    """Available teachers matching the search form's filters"""
+    form = LessonSearchForm(request.GET)
+    if not form.is_valid():
+        raise form_errors(form)
+
+    available_date = form.cleaned_data.get('available_date')
+    available_time = form.cleaned_data.get('available_time')
+    keep = None
+    if available_date and available_time:
+        duration = form.cleaned_data.get('lesson_duration') or 60
+        keep = free_at(available_date, available_time, duration)
+
+    return api_response(paginate(request, 'teachers', form.get_teacher_profiles(), keep))
+
+
+@api_view(['GET'])
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=dated_user_etag)
+def dashboard(request):
+    """Counts the dashboards show, without the rows themselves"""
+    user = request.user
+    today = timezone.localdate()
+    data = {
+        'user': {
+            'id': user.pk,
+            'username': user.username,
+            'name': user.get_full_name_or_username(),
+            'user_type': user.user_type,
+        },
+    }
+    if user.is_teacher:
+        try:
+            profile = user.teacher_profile
+        except TeacherProfile.DoesNotExist:
+            profile = None
+        data['has_profile'] = profile is not None
+        data['open_requests'] = eligible_lesson_requests(profile).count() if profile else 0
+        data['pending_availabilities'] = TeacherAvailability.objects.filter(
+            teacher=user, is_accepted=False
+        ).count()
+        data['upcoming_bookings'] = LessonBooking.objects.filter(
+            teacher=user, status='confirmed', teacher_availability__available_date__gte=today
+        ).count()
+    else:
+        counts = dict(
+            LessonRequest.objects.filter(student=user).order_by()
+            .values_list('status').annotate(count=Count('pk'))
+        )
+        data['requests'] = {status: counts.get(status, 0) for status, _ in LessonRequest.STATUS_CHOICES}
+        data['pending_availabilities'] = TeacherAvailability.objects.filter(
+            lesson_request__student=user, lesson_request__status='pending', is_accepted=False
+        ).count()
+        data['upcoming_bookings'] = LessonBooking.objects.filter(
+            lesson_request__student=user, status='confirmed',
+            teacher_availability__available_date__gte=today,
+        ).count()
+    return api_response(data)
+
+
+@api_view(['GET', 'POST'])
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=user_etag)
+def lesson_requests(request):
+    """
+    GET: a student's own requests, or the pending requests a teacher is
+    eligible for. POST (students): create a request for ``teacher_id``.
+    """
+    user = request.user
+    if request.method == 'POST':
+        if not user.is_student:
+            raise ApiError(403, 'Only students can create lesson requests.')
+        data = request_data(request)
+        try:
+            teacher = User.objects.get(pk=int(data.get('teacher_id', '')), user_type='teacher')
+        except (ValueError, User.DoesNotExist):
+            raise ApiError(400, 'Invalid data.', errors={'teacher_id': ['Select a valid teacher.']})
+        form = LessonRequestForm(data)
+        if not form.is_valid():
+            raise form_errors(form)
+        lesson_request = form.save(commit=False)
+        lesson_request.student = user
+        with transaction.atomic():
+            lesson_request.save()
+            outbox.lesson_request_created(lesson_request, teacher)
+        return api_response(serialize_one('requests', lesson_request), status=201)
+
+    if user.is_teacher:
+        queryset = eligible_lesson_requests(teacher_profile_or_error(user))
+    else:
+        queryset = LessonRequest.objects.filter(student=user)
+    status = request.GET.get('status')
+    if status:
+        queryset = queryset.filter(status=status)
+    return api_response(paginate(request, 'requests', queryset))
+
+
+@api_view(['GET'])
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=user_etag)
+def availabilities(request):
+    """A teacher's submitted availabilities, or those offered for a student's requests"""
+    user = request.user
+    if user.is_teacher:
+        queryset = TeacherAvailability.objects.filter(teacher=user)
+    else:
+        queryset = TeacherAvailability.objects.filter(lesson_request__student=user)
+    if request.GET.get('open'):
+        queryset = queryset.filter(is_accepted=False, lesson_request__status='pending')
+    return api_response(paginate(request, 'availabilities', queryset))
+
+
+@api_view(['POST'], user_type='teacher')
+def submit_availability(request, lesson_request_id):
+    """Offer a time for a lesson request"""
+    lesson_request = get_object_or_404(LessonRequest, id=lesson_request_id)
+    form = TeacherAvailabilityForm(request_data(request), teacher=request.user)
+    if not form.is_valid():
+        raise form_errors(form)
+    availability = form.save(commit=False)
+    availability.teacher = request.user
+    availability.lesson_request = lesson_request
+    with transaction.atomic():
+        availability.save()
+        outbox.availability_submitted(availability)
+    return api_response(serialize_one('availabilities', availability), status=201)
+
+
+@api_view(['POST'], user_type='student')
+def accept_availability(request, availability_id):
+    """Book a teacher's availability for one of the student's requests"""
+    availability = get_object_or_404(
+        TeacherAvailability.objects.select_related(
+            'teacher', 'lesson_request__student', 'lesson_request__lesson_topic'
+        ),
+        id=availability_id,
+    )
+    if availability.lesson_request.student_id != request.user.pk:
+        raise ApiError(403, 'You can only accept availability for your own lesson requests.')
+    try:
+        booking = book_availability(availability)
+    except BookingConflict as error:
+        raise ApiError(409, str(error))
+    return api_response(serialize_one('bookings', booking), status=201)
+
+
+@api_view(['GET'])
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=user_etag)
+def bookings(request):
+    """A teacher's or a student's bookings"""
+    user = request.user
+    if user.is_teacher:
+        queryset = LessonBooking.objects.filter(teacher=user)
+    else:
+        queryset = LessonBooking.objects.filter(lesson_request__student=user)
+    status = request.GET.get('status')
+    if status:
+        queryset = queryset.filter(status=status)
+    return api_response(paginate(request, 'bookings', queryset))
+
+
+@api_view(['GET'])
+@cache_control(private=True, no_cache=True)
+def changes(request):
+    """
+    Requests, availabilities and bookings changed or deleted since the
+    ``since`` token of the previous call (see core.sync)
+    """
+    try:
+        changed, deleted, next_token, reset = sync.changes_since(request.user, request.GET.get('since'))
+    except sync.InvalidToken:
+        raise ApiError(400, 'Invalid since token.')
+
+    data = {'changed': {}, 'deleted': {}}
+    for resource, queryset in changed.items():
+        rows, more, _ = fetch_rows(resource, list(RESOURCES[resource]), queryset, settings.SYNC_MAX_CHANGES)
+        if more:
+            data = {'changed': {}, 'deleted': {}}
+            reset = True
+            break
+        if rows:
+            data['changed'][resource] = rows
+        if deleted[resource]:
+            data['deleted'][resource] = deleted[resource]
+    return api_response({**data, 'next': next_token, 'reset': reset})
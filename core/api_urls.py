@@ -0,0 +1,19 @@
+"""
+JSON API URLconf, a lazy include of core/urls.py: core.api and the forms
+it uses are only imported when an API URL is first resolved or reversed.
+"""
+from django.urls import path
+from . import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('search/', api.search, name='search'),
+    path('dashboard/', api.dashboard, name='dashboard'),
+    path('requests/', api.lesson_requests, name='lesson_requests'),
+    path('requests/<int:lesson_request_id>/availabilities/', api.submit_availability, name='submit_availability'),
+    path('availabilities/', api.availabilities, name='availabilities'),
+    path('availabilities/<int:availability_id>/accept/', api.accept_availability, name='accept_availability'),
+    path('bookings/', api.bookings, name='bookings'),
+    path('changes/', api.changes, name='changes'),
+]
@@ -0,0 +1,165 @@
+"""
+Archival of closed lesson requests.
+
+Completed and cancelled requests that have not changed for the retention
+period, and whose availabilities are all in the past, are moved together
+with their availabilities and bookings into the Archived* tables. Each
+batch is copied and deleted in one transaction, so a request is always in
+exactly one of the two places.
+
+The per-row delete handlers are paused while a batch is deleted; their
+effects are applied once for the whole batch instead: the tombstones are
+bulk inserted, each teacher/day calendar is rebuilt once and each dashboard
+version is bumped once. Dashboards read the archive through the history
+helpers below; the rollups and recommendations read both.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .freebusy import affected_days, rebuild_day
+from .models import (
+    LessonRequest, TeacherAvailability, LessonBooking, Tombstone,
+    ArchivedLessonRequest, ArchivedTeacherAvailability, ArchivedLessonBooking,
+)
+from .signals import invalidate_dashboards, pause_row_handlers
+
+
+CLOSED_STATUSES = ['completed', 'cancelled']
+
+# Live model -> archive model, in insert order (parents first)
+ARCHIVES = [
+    (LessonRequest, ArchivedLessonRequest),
+    (TeacherAvailability, ArchivedTeacherAvailability),
+    (LessonBooking, ArchivedLessonBooking),
+]
+
+
+def archivable_requests(retention_days=None):
+    """Closed requests untouched for ``retention_days`` with no upcoming availability"""
+    if retention_days is None:
+        retention_days = settings.ARCHIVE_RETENTION_DAYS
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    return LessonRequest.objects.filter(
+        status__in=CLOSED_STATUSES,
+        updated_at__lt=cutoff,
+    ).exclude(
+        teacher_availabilities__available_date__gte=timezone.localdate()
+    )
+
+
+def copy_rows(queryset, archive_model, archived_at):
+    """Insert the rows of ``queryset`` into ``archive_model``; returns the count"""
+    fields = [
+        field.attname for field in archive_model._meta.concrete_fields
+        if field.name != 'archived_at'
+    ]
+    rows = [
+        archive_model(archived_at=archived_at, **row)
+        for row in queryset.values(*fields).iterator()
+    ]
+    archive_model.objects.bulk_create(rows)
+    return len(rows)
+
+
+def deleted_rows(request_ids):
+    """The columns of the rows about to be deleted that their side effects need"""
+    return (
+        list(LessonRequest.objects.filter(pk__in=request_ids).values_list(
+            'pk', 'student_id', 'lesson_topic_id'
+        )),
+        list(TeacherAvailability.objects.filter(lesson_request_id__in=request_ids).values_list(
+            'pk', 'teacher_id', 'lesson_request__student_id',
+            'available_date', 'available_time', 'duration',
+        )),
+        list(LessonBooking.objects.filter(lesson_request_id__in=request_ids).values_list(
+            'pk', 'teacher_id', 'lesson_request__student_id',
+        )),
+    )
+
+
+def apply_deletions(requests, availabilities, bookings):
+    """What the per-row delete handlers do, once for the whole batch"""
+    Tombstone.objects.bulk_create(
+        [
+            Tombstone(resource='requests', object_id=pk, student_id=student_id, lesson_topic_id=topic_id)
+            for pk, student_id, topic_id in requests
+        ] + [
+            Tombstone(resource='availabilities', object_id=pk, student_id=student_id, teacher_id=teacher_id)
+            for pk, teacher_id, student_id, *_ in availabilities
+        ] + [
+            Tombstone(resource='bookings', object_id=pk, student_id=student_id, teacher_id=teacher_id)
+            for pk, teacher_id, student_id in bookings
+        ]
+    )
+    days = {
+        (teacher_id, day)
+        for _, teacher_id, _, start_day, at, duration in availabilities
+        for day in affected_days(start_day, at, duration)
+    }
+    for teacher_id, day in sorted(days):
+        rebuild_day(teacher_id, day)
+    invalidate_dashboards(
+        user_ids={student_id for _, student_id, _ in requests}
+        | {teacher_id for _, teacher_id, *_ in availabilities + bookings},
+        topic_ids={topic_id for _, _, topic_id in requests},
+    )
+
+
+def archive_batch(request_ids):
+    """
+    Move the given requests and their availabilities and bookings in one
+    transaction. Returns ``{live model: rows moved}``.
+    """
+    archived_at = timezone.now()
+    moved = {}
+    with transaction.atomic():
+        for model, archive_model in ARCHIVES:
+            lookup = 'pk__in' if model is LessonRequest else 'lesson_request_id__in'
+            moved[model] = copy_rows(
+                model.objects.filter(**{lookup: request_ids}), archive_model, archived_at
+            )
+        rows = deleted_rows(request_ids)
+        with pause_row_handlers():
+            # Cascades to the availabilities and bookings
+            LessonRequest.objects.filter(pk__in=request_ids).delete()
+        apply_deletions(*rows)
+    return moved
+
+
+def archive_requests(retention_days=None, batch_size=None):
+    """
+    Archive every eligible request in batches of ``batch_size``.
+    Returns ``{live model: rows moved}``.
+    """
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    queryset = archivable_requests(retention_days).order_by('pk')
+    totals = {model: 0 for model, _ in ARCHIVES}
+    while True:
+        # Archived rows are gone from the live table, so each pass picks
+        # up the next batch
+        request_ids = list(queryset.values_list('pk', flat=True).distinct()[:batch_size])
+        if not request_ids:
+            return totals
+        for model, count in archive_batch(request_ids).items():
+            totals[model] += count
+
+
+def request_history(student, limit=None):
+    """Archived requests of a student with their bookings, newest first"""
+    return ArchivedLessonRequest.objects.filter(
+        student=student
+    ).select_related('lesson_topic').prefetch_related(
+        'bookings__teacher', 'bookings__teacher_availability'
+    ).order_by('-created_at')[:limit or settings.DASHBOARD_HISTORY_LIMIT]
+
+
+def booking_history(teacher, limit=None):
+    """Archived bookings of a teacher, newest first"""
+    return ArchivedLessonBooking.objects.filter(
+        teacher=teacher
+    ).select_related(
+        'lesson_request__student', 'lesson_request__lesson_topic', 'teacher_availability'
+    ).order_by('-created_at')[:limit or settings.DASHBOARD_HISTORY_LIMIT]
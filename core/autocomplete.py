@@ -0,0 +1,145 @@
+"""
+Teacher name autocomplete from an in-process prefix index.
+
+Each worker keeps a sorted list of ``(word, teacher id)`` pairs, where the
+words are the teacher's first and last names and username, case- and
+accent-folded. A query is a binary search for its prefix and a short scan,
+so keystrokes never reach the database. The index is built on the first
+query and holds at most AUTOCOMPLETE_MAX_TEACHERS available teachers (the
+most recently updated profiles).
+
+Signal handlers update the index of the process that made the write and bump
+the ``teacher_names`` version; other processes compare that version at most
+every AUTOCOMPLETE_VERSION_CHECK_INTERVAL seconds and rebuild when it moved.
+"""
+import bisect
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+
+from .caching import bump_version, get_version
+from .models import TeacherProfile
+
+
+VERSION = 'teacher_names'
+
+
+def normalize(text):
+    """Case- and accent-folded ``text`` (``José`` -> ``jose``)"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def teacher_rows():
+    return TeacherProfile.objects.filter(
+        is_available=True, user__user_type='teacher',
+    ).order_by('-updated_at').values_list(
+        'user_id', 'user__first_name', 'user__last_name', 'user__username', 'hourly_rate',
+    )
+
+
+class TeacherNameIndex:
+
+    def __init__(self, rows, version):
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.lock = threading.Lock()
+        self.teachers = {}
+        self.words = {}
+        self.keys = []
+        for row in rows:
+            self.keys.extend(self.store(row))
+        self.keys.sort()
+
+    def store(self, row):
+        """Keep a teacher's details; returns their ``(word, id)`` keys"""
+        teacher_id, first_name, last_name, username, hourly_rate = row
+        name = f'{first_name} {last_name}'.strip()
+        self.teachers[teacher_id] = {
+            'id': teacher_id,
+            'name': name or username,
+            'username': username,
+            'hourly_rate': str(hourly_rate),
+        }
+        words = tuple(set(normalize(f'{name} {username}').split()))
+        self.words[teacher_id] = words
+        return [(word, teacher_id) for word in words]
+
+    def remove(self, teacher_id):
+        for word in self.words.pop(teacher_id, ()):
+            position = bisect.bisect_left(self.keys, (word, teacher_id))
+            del self.keys[position]
+        self.teachers.pop(teacher_id, None)
+
+    def update(self, teacher_id, row):
+        """Replace a teacher's entries with ``row`` (None removes them)"""
+        with self.lock:
+            self.remove(teacher_id)
+            if row is None or len(self.teachers) >= settings.AUTOCOMPLETE_MAX_TEACHERS:
+                return
+            for key in self.store(row):
+                bisect.insort(self.keys, key)
+
+    def search(self, query, limit):
+        """
+        Teachers with a word starting with each word of ``query``, in the
+        alphabetical order of the word matching the longest one
+        """
+        tokens = normalize(query).split()
+        if not tokens:
+            return []
+        tokens.sort(key=len, reverse=True)
+        prefix, others = tokens[0], tokens[1:]
+        found = {}
+        with self.lock:
+            position = bisect.bisect_left(self.keys, (prefix,))
+            while position < len(self.keys) and len(found) < limit:
+                word, teacher_id = self.keys[position]
+                if not word.startswith(prefix):
+                    break
+                position += 1
+                if teacher_id in found:
+                    continue
+                words = self.words[teacher_id]
+                if all(any(other.startswith(token) for other in words) for token in others):
+                    found[teacher_id] = self.teachers[teacher_id]
+        return list(found.values())
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """This process's index, (re)built when another process changed a teacher"""
+    global _index
+    index = _index
+    if index is not None and time.monotonic() - index.checked_at < settings.AUTOCOMPLETE_VERSION_CHECK_INTERVAL:
+        return index
+    version = get_version(VERSION)
+    if index is not None and index.version == version:
+        index.checked_at = time.monotonic()
+        return index
+    with _index_lock:
+        if _index is index:
+            _index = TeacherNameIndex(teacher_rows()[:settings.AUTOCOMPLETE_MAX_TEACHERS], version)
+    return _index
+
+
+def search_teachers(query, limit=None):
+    """Up to ``limit`` (AUTOCOMPLETE_LIMIT) teachers whose names start like ``query``"""
+    return get_index().search(query, limit or settings.AUTOCOMPLETE_LIMIT)
+
+
+def teacher_changed(teacher_id):
+    """Called by the User/TeacherProfile signal handlers"""
+    version = bump_version(VERSION)
+    index = _index
+    if index is None:
+        return
+    index.update(teacher_id, teacher_rows().filter(user_id=teacher_id).first())
+    # Keep the index unless another process changed a teacher meanwhile
+    if index.version == version - 1:
+        index.version = version
@@ -0,0 +1,218 @@
+"""
+Online backup and restore of the SQLite database.
+
+A snapshot is taken with SQLite's backup API a few pages at a time. The
+source is only locked while a step copies its pages, so a writer waits for
+one step at most, and the copy pauses between steps to let writers through.
+The longest step is reported as the worst writer stall. A write from another
+connection makes SQLite restart the copy; after ``max_restarts`` restarts
+the copy is finished in a single step instead.
+
+The snapshot goes to a temporary file. It is checked with ``PRAGMA
+integrity_check`` and then streamed, optionally gzipped, to the target file
+or to stdout. Restoring reverses that, copying a verified snapshot into the
+live database through the same API, so open connections see the restored
+data.
+"""
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from django.db import connections
+
+
+CHUNK_SIZE = 1024 * 1024
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+class BackupError(Exception):
+    pass
+
+
+class TooManyRestarts(Exception):
+    pass
+
+
+def database_path(alias='default'):
+    """File of the SQLite database ``alias``"""
+    connection = connections[alias]
+    if connection.vendor != 'sqlite':
+        raise BackupError(f'Online backup needs SQLite; the {alias!r} database uses {connection.vendor}')
+    if connection.is_in_memory_db():
+        raise BackupError(f'The {alias!r} database is in memory')
+    return str(connection.settings_dict['NAME'])
+
+
+def snapshot(source_path, target_path, pages, sleep, max_restarts):
+    """
+    Copy the database at ``source_path`` to a new file at ``target_path``.
+    Returns ``{'pages', 'bytes', 'seconds', 'steps', 'restarts',
+    'max_step', 'single_step'}`` (times in seconds).
+    """
+    stats = {'steps': 0, 'restarts': 0, 'max_step': 0.0, 'single_step': False, 'pages': 0}
+    source = sqlite3.connect(source_path, timeout=30)
+    target = sqlite3.connect(target_path)
+    last = None
+    previous_remaining = None
+
+    def progress(status, remaining, total):
+        # Called between steps, once the source lock is released: the time
+        # since the previous call is the step, which writers had to wait for
+        nonlocal last, previous_remaining
+        stats['max_step'] = max(stats['max_step'], time.perf_counter() - last)
+        stats['steps'] += 1
+        stats['pages'] = total
+        if previous_remaining is not None and remaining > previous_remaining:
+            stats['restarts'] += 1
+            if stats['restarts'] > max_restarts:
+                raise TooManyRestarts
+        previous_remaining = remaining
+        if remaining:
+            time.sleep(sleep)
+        last = time.perf_counter()
+
+    start = time.perf_counter()
+    try:
+        try:
+            last = time.perf_counter()
+            # sleep is also the wait before retrying a step a writer blocked
+            source.backup(target, pages=pages, progress=progress, sleep=sleep)
+        except TooManyRestarts:
+            stats['single_step'] = True
+            step_start = time.perf_counter()
+            source.backup(target, sleep=sleep)
+            stats['max_step'] = max(stats['max_step'], time.perf_counter() - step_start)
+            stats['steps'] += 1
+    finally:
+        target.close()
+        source.close()
+    stats['seconds'] = time.perf_counter() - start
+    stats['bytes'] = os.path.getsize(target_path)
+    return stats
+
+
+def integrity_errors(path):
+    """Problems ``PRAGMA integrity_check`` finds in the database at ``path``"""
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        rows = [row[0] for row in connection.execute('PRAGMA integrity_check')]
+        if rows != ['ok']:
+            return rows
+        tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    except sqlite3.DatabaseError as error:
+        return [str(error)]
+    finally:
+        connection.close()
+    if 'django_migrations' not in tables:
+        return ['not a Django database (no django_migrations table)']
+    return []
+
+
+class CountingWriter:
+    """File wrapper counting the bytes written through it"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def stream_snapshot(path, output, compress, level=6):
+    """
+    Write the file at ``path`` to the binary stream ``output``, gzipped if
+    ``compress``. Returns ``(bytes written, sha256 of the snapshot)``.
+    """
+    digest = hashlib.sha256()
+    writer = CountingWriter(output)
+    target = gzip.GzipFile(fileobj=writer, mode='wb', compresslevel=level, mtime=0) if compress else writer
+    with open(path, 'rb') as snapshot_file:
+        while chunk := snapshot_file.read(CHUNK_SIZE):
+            digest.update(chunk)
+            target.write(chunk)
+    if compress:
+        target.close()
+    writer.flush()
+    return writer.size, digest.hexdigest()
+
+
+def backup(target, pages, sleep, max_restarts, compress, alias='default', output=None):
+    """
+    Snapshot the database ``alias``, verify it and write it to the file
+    ``target`` (replaced once complete) or to the binary stream ``output``.
+    Returns the snapshot stats plus ``'written'``, ``'sha256'`` and
+    ``'total_seconds'``.
+    """
+    source_path = database_path(alias)
+    start = time.perf_counter()
+    directory = os.path.dirname(os.path.abspath(target)) if output is None else None
+    with tempfile.TemporaryDirectory(dir=directory) as temporary:
+        snapshot_path = os.path.join(temporary, 'snapshot.sqlite3')
+        stats = snapshot(source_path, snapshot_path, pages, sleep, max_restarts)
+        errors = integrity_errors(snapshot_path)
+        if errors:
+            raise BackupError('Snapshot failed the integrity check: ' + '; '.join(errors[:5]))
+        if output is not None:
+            stats['written'], stats['sha256'] = stream_snapshot(snapshot_path, output, compress)
+        else:
+            partial = os.path.join(temporary, 'partial')
+            with open(partial, 'wb') as partial_file:
+                stats['written'], stats['sha256'] = stream_snapshot(snapshot_path, partial_file, compress)
+                partial_file.flush()
+                os.fsync(partial_file.fileno())
+            os.replace(partial, target)
+    stats['total_seconds'] = time.perf_counter() - start
+    return stats
+
+
+def restore(source, alias='default', input_stream=None):
+    """
+    Replace the database ``alias`` with the backup in the file ``source``
+    (or read from the binary stream ``input_stream``), gzipped or not, after
+    verifying it. Returns ``{'bytes', 'seconds'}``.
+    """
+    database = database_path(alias)
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(database))) as temporary:
+        raw_path = os.path.join(temporary, 'raw')
+        with open(raw_path, 'wb') as raw_file:
+            if input_stream is not None:
+                shutil.copyfileobj(input_stream, raw_file, CHUNK_SIZE)
+            else:
+                with open(source, 'rb') as source_file:
+                    shutil.copyfileobj(source_file, raw_file, CHUNK_SIZE)
+        with open(raw_path, 'rb') as raw_file:
+            compressed = raw_file.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+        snapshot_path = raw_path
+        if compressed:
+            snapshot_path = os.path.join(temporary, 'snapshot.sqlite3')
+            try:
+                with gzip.open(raw_path, 'rb') as compressed_file, open(snapshot_path, 'wb') as snapshot_file:
+                    shutil.copyfileobj(compressed_file, snapshot_file, CHUNK_SIZE)
+            except (OSError, EOFError) as error:
+                raise BackupError(f'Cannot decompress the backup: {error}')
+
+        errors = integrity_errors(snapshot_path)
+        if errors:
+            raise BackupError('Backup failed the integrity check: ' + '; '.join(errors[:5]))
+
+        # The destination stays locked until the copy is done, so one step
+        connections[alias].close()
+        backup_connection = sqlite3.connect(snapshot_path)
+        live = sqlite3.connect(database, timeout=30)
+        try:
+            backup_connection.backup(live)
+        finally:
+            live.close()
+            backup_connection.close()
+        size = os.path.getsize(snapshot_path)
+    return {'bytes': size, 'seconds': time.perf_counter() - start}
@@ -0,0 +1,202 @@
+"""
+Cache helpers shared by views, template tags and signal handlers.
+
+Keys are built from cheap version stamps (row ``updated_at`` values and
+named version counters) so that a write never has to find and delete
+every cached entry that depends on it: bumping the stamp simply makes
+the old entries unreachable until they expire.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.template.loader import render_to_string
+
+
+STATS_PREFIX = 'stats'
+VERSION_PREFIX = 'version'
+
+
+def _incr(key, delta=1):
+    """Increment a counter in the cache, creating it when missing"""
+    if cache.add(key, delta, timeout=None):
+        return delta
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # The key expired between add() and incr()
+        cache.set(key, delta, timeout=None)
+        return delta
+
+
+def record_hit(name, count=1):
+    """Count cache hits for the named cache area"""
+    if count:
+        _incr(f'{STATS_PREFIX}:{name}:hits', count)
+
+
+def record_miss(name, count=1):
+    """Count cache misses for the named cache area"""
+    if count:
+        _incr(f'{STATS_PREFIX}:{name}:misses', count)
+
+
+def get_stats(name):
+    """Return hits, misses and hit rate for the named cache area"""
+    values = cache.get_many([
+        f'{STATS_PREFIX}:{name}:hits',
+        f'{STATS_PREFIX}:{name}:misses',
+    ])
+    hits = values.get(f'{STATS_PREFIX}:{name}:hits', 0)
+    misses = values.get(f'{STATS_PREFIX}:{name}:misses', 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else 0.0,
+    }
+
+
+def reset_stats(name):
+    """Reset the counters for the named cache area"""
+    cache.delete_many([
+        f'{STATS_PREFIX}:{name}:hits',
+        f'{STATS_PREFIX}:{name}:misses',
+    ])
+
+
+def clear_cache():
+    """
+    Drop every cached entry, e.g. after the data was replaced without the
+    signals seeing it. Returns whether the other processes see the clear: a
+    process-local (locmem) cache is only cleared here, and running workers
+    keep serving their own copies until they are restarted.
+    """
+    cache.clear()
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+
+def _initial_version():
+    # Seeded from the clock so that a counter evicted from the cache never
+    # restarts at a value that older cached entries were keyed on
+    return int(time.time() * 1000)
+
+
+def get_version(name):
+    """Return the current value of a named version counter"""
+    return get_versions([name])[name]
+
+
+def get_versions(names):
+    """Return the current values of several version counters at once"""
+    keys = {f'{VERSION_PREFIX}:{name}': name for name in names}
+    found = cache.get_many(keys)
+    versions = {keys[key]: value for key, value in found.items()}
+    for key, name in keys.items():
+        if name not in versions:
+            cache.add(key, _initial_version(), timeout=None)
+            versions[name] = cache.get(key)
+    return versions
+
+
+def bump_version(name):
+    """Invalidate everything keyed on a named version counter"""
+    key = f'{VERSION_PREFIX}:{name}'
+    if cache.add(key, _initial_version(), timeout=None):
+        return cache.get(key)
+    return _incr(key)
+
+
+def bump_versions(names):
+    """Bump several version counters"""
+    for name in set(names):
+        bump_version(name)
+
+
+def teacher_card_key(teacher, taxonomy_version=None):
+    """Cache key for a teacher result card"""
+    profile = teacher.teacher_profile
+    return 'teacher_card:{}:{}:{}'.format(
+        teacher.id,
+        profile.updated_at.timestamp(),
+        get_version('taxonomy') if taxonomy_version is None else taxonomy_version,
+    )
+
+
+def render_teacher_cards(teachers):
+    """
+    Render teacher result cards, reusing the cached HTML when possible. The
+    cached cards are read with one get_many() and the hits and misses of
+    the whole list are counted once.
+    """
+    taxonomy_version = get_version('taxonomy')
+    keys = [teacher_card_key(teacher, taxonomy_version) for teacher in teachers]
+    cards = cache.get_many(keys)
+    hits = len(cards)
+    rendered = {}
+    for teacher, key in zip(teachers, keys):
+        if key not in cards:
+            cards[key] = rendered[key] = render_to_string(
+                'core/includes/teacher_card.html', {'teacher': teacher}
+            )
+    if rendered:
+        cache.set_many(rendered, settings.TEACHER_CARD_CACHE_TIMEOUT)
+    record_hit('teacher_card', hits)
+    record_miss('teacher_card', len(rendered))
+    return [cards[key] for key in keys]
+
+
+def render_teacher_card(teacher):
+    """Render a teacher result card, reusing the cached HTML when possible"""
+    return render_teacher_cards([teacher])[0]
+
+
+def dashboard_user_version_name(user_id):
+    return f'dashboard:user:{user_id}'
+
+
+def dashboard_topic_version_name(topic_id):
+    return f'dashboard:topic:{topic_id}'
+
+
+def teacher_topic_ids(user, user_version):
+    """Lesson topic ids a teacher teaches, cached for the user's dashboard version"""
+    from .models import LessonTopic
+
+    key = f'teacher_topics:{user.pk}:{user_version}'
+    topic_ids = cache.get(key)
+    if topic_ids is None:
+        topic_ids = sorted(
+            LessonTopic.objects.filter(teachers__user=user).values_list('id', flat=True)
+        )
+        cache.set(key, topic_ids, settings.DASHBOARD_CACHE_TIMEOUT)
+    return topic_ids
+
+
+def dashboard_versions(user):
+    """
+    Version stamps for each dashboard section of a user.
+
+    ``user`` covers everything stored against the user (their requests,
+    availabilities, bookings and profile) plus topic/specialization names;
+    ``requests`` additionally covers the pending requests of every topic a
+    teacher teaches. They are only seen by every worker with a shared cache
+    (``core.E003`` deploy check).
+    """
+    found = get_versions([dashboard_user_version_name(user.pk), 'taxonomy'])
+    user_version = found[dashboard_user_version_name(user.pk)]
+    stamp = '{}-{}'.format(user_version, found['taxonomy'])
+    versions = {'user': stamp, 'requests': stamp}
+
+    if user.is_teacher:
+        topic_names = [
+            dashboard_topic_version_name(topic_id)
+            for topic_id in teacher_topic_ids(user, user_version)
+        ]
+        topic_versions = get_versions(topic_names)
+        versions['requests'] = '{}-{}'.format(
+            stamp,
+            '.'.join(str(topic_versions[name]) for name in topic_names),
+        )
+    return versions
@@ -0,0 +1,56 @@
+"""
+System checks for settings the code relies on but Django cannot validate.
+"""
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.cache.backends.redis import RedisCache
+
+
+# Backends shared between processes whose incr() is atomic
+SHARED_ATOMIC_CACHES = (RedisCache, BaseMemcachedCache)
+
+
+@checks.register(checks.Tags.caches, checks.Tags.security)
+def check_throttle_cache(app_configs, **kwargs):
+    """Throttle counters (core.throttling) are only exact with an atomic incr()"""
+    backend = caches['default']
+    if not settings.AUTH_THROTTLE_ENABLED or isinstance(backend, (*SHARED_ATOMIC_CACHES, LocMemCache)):
+        return []
+    return [checks.Warning(
+        f'Sign-in throttling needs a cache with an atomic incr(); {type(backend).__name__} '
+        'reads and rewrites the value, so parallel attempts can pass the limit.',
+        hint='Set DYSCHOOL_CACHE_BACKEND=redis, or DYSCHOOL_AUTH_THROTTLE=0.',
+        id='core.W001',
+    )]
+
+
+@checks.register(checks.Tags.caches, checks.Tags.security, deploy=True)
+def check_throttle_cache_shared(app_configs, **kwargs):
+    """Throttle counters must be shared by every worker"""
+    backend = caches['default']
+    if not settings.AUTH_THROTTLE_ENABLED or not isinstance(backend, LocMemCache):
+        return []
+    return [checks.Error(
+        'Sign-in throttling counts attempts in the local-memory cache, so each '
+        'worker process allows the full limit.',
+        hint='Set DYSCHOOL_CACHE_BACKEND=redis, unless the site runs a single process, or DYSCHOOL_AUTH_THROTTLE=0.',
+        id='core.E002',
+    )]
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_dashboard_cache_shared(app_configs, **kwargs):
+    """Dashboard versions (core.caching) must be bumped where every worker reads them"""
+    backend = caches['default']
+    if not isinstance(backend, LocMemCache):
+        return []
+    return [checks.Error(
+        'Dashboard versions live in the local-memory cache, so a write bumps them '
+        'only in the worker that handled it; the other workers keep answering 304 '
+        'and serving cached dashboard sections from before the write.',
+        hint='Set DYSCHOOL_CACHE_BACKEND=redis, or silence core.E003 if the site runs a single process.',
+        id='core.E003',
+    )]
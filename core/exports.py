@@ -0,0 +1,140 @@
+"""
+Streaming CSV/JSONL exports of lesson requests, availabilities and bookings.
+
+Rows are read with ``values_list().iterator()`` over a single joined query,
+so no model instances are built and memory stays flat however many rows
+are exported.
+"""
+import csv
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import LessonRequest, TeacherAvailability, LessonBooking
+
+
+CHUNK_SIZE = 2000
+
+# Export name -> (model, [(column header, lookup), ...])
+EXPORTS = {
+    'requests': (LessonRequest, [
+        ('id', 'id'),
+        ('student_username', 'student__username'),
+        ('student_first_name', 'student__first_name'),
+        ('student_last_name', 'student__last_name'),
+        ('student_email', 'student__email'),
+        ('specialization', 'lesson_topic__specialization__name'),
+        ('lesson_topic', 'lesson_topic__name'),
+        ('lesson_duration', 'lesson_duration'),
+        ('max_hourly_rate', 'max_hourly_rate'),
+        ('status', 'status'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    ]),
+    'availabilities': (TeacherAvailability, [
+        ('id', 'id'),
+        ('lesson_request_id', 'lesson_request_id'),
+        ('teacher_username', 'teacher__username'),
+        ('teacher_first_name', 'teacher__first_name'),
+        ('teacher_last_name', 'teacher__last_name'),
+        ('student_username', 'lesson_request__student__username'),
+        ('specialization', 'lesson_request__lesson_topic__specialization__name'),
+        ('lesson_topic', 'lesson_request__lesson_topic__name'),
+        ('available_date', 'available_date'),
+        ('available_time', 'available_time'),
+        ('duration', 'duration'),
+        ('is_accepted', 'is_accepted'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    ]),
+    'bookings': (LessonBooking, [
+        ('id', 'id'),
+        ('lesson_request_id', 'lesson_request_id'),
+        ('student_username', 'lesson_request__student__username'),
+        ('student_email', 'lesson_request__student__email'),
+        ('teacher_username', 'teacher__username'),
+        ('teacher_email', 'teacher__email'),
+        ('specialization', 'lesson_request__lesson_topic__specialization__name'),
+        ('lesson_topic', 'lesson_request__lesson_topic__name'),
+        ('date', 'teacher_availability__available_date'),
+        ('time', 'teacher_availability__available_time'),
+        ('duration', 'teacher_availability__duration'),
+        ('hourly_rate', 'teacher__teacher_profile__hourly_rate'),
+        ('status', 'status'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    ]),
+}
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson; charset=utf-8', 'jsonl'),
+}
+
+
+def get_export(model):
+    """Return the export name and columns configured for a model"""
+    for name, (export_model, columns) in EXPORTS.items():
+        if export_model is model:
+            return name, columns
+    raise KeyError(f'No export configured for {model.__name__}')
+
+
+def serialize_value(value):
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat() if timezone.is_aware(value) else value.isoformat()
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def iter_rows(queryset, columns):
+    """Yield one tuple per row, ordered by primary key, in fixed-size chunks"""
+    lookups = [lookup for _, lookup in columns]
+    rows = queryset.order_by('pk').values_list(*lookups).iterator(chunk_size=CHUNK_SIZE)
+    for row in rows:
+        yield [serialize_value(value) for value in row]
+
+
+class Echo:
+    """File-like object whose write() returns the value, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(queryset, columns):
+    writer = csv.writer(Echo())
+    yield writer.writerow([header for header, _ in columns])
+    for row in iter_rows(queryset, columns):
+        yield writer.writerow(row)
+
+
+def iter_jsonl(queryset, columns):
+    headers = [header for header, _ in columns]
+    for row in iter_rows(queryset, columns):
+        yield json.dumps(dict(zip(headers, row)), ensure_ascii=False) + '\n'
+
+
+def iter_export(queryset, columns, file_format):
+    if file_format == 'csv':
+        return iter_csv(queryset, columns)
+    return iter_jsonl(queryset, columns)
+
+
+def streaming_export_response(queryset, file_format):
+    """StreamingHttpResponse that downloads the queryset as CSV or JSONL"""
+    name, columns = get_export(queryset.model)
+    content_type, extension = FORMATS[file_format]
+    response = StreamingHttpResponse(
+        iter_export(queryset, columns, file_format),
+        content_type=content_type,
+    )
+    filename = f"{name}-{timezone.localdate().isoformat()}.{extension}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,121 @@
+"""
+Facet counts for the lesson search: available teachers per specialization,
+per lesson topic of the chosen specialization and per hourly-rate bucket.
+
+Each facet applies the other filters but not its own, so a student sees the
+alternatives to what they picked: the specialization counts honour the
+maximum rate, the topic counts the specialization and the rate, and the
+rate counts the specialization and the topic. All three come from one
+``UNION ALL`` of grouped counts, cached per filter combination under the
+taxonomy and teacher-profile versions. Rate buckets use the shared bin
+edges of core.pricing and are reported cumulatively ("up to R$ x"), which
+is what the maximum-rate filter selects. The free/busy filter is ignored.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, IntegerField, Value, When
+
+from .caching import get_versions
+from .models import TeacherProfile
+from .pricing import get_price_stats
+
+
+def facet_queries(specialization_id, lesson_topic_id, max_hourly_rate, edges):
+    """Grouped ``(facet, id, name, count)`` querysets to union"""
+    specializations = TeacherProfile.specializations.through.objects.filter(
+        teacherprofile__is_available=True
+    )
+    topics = TeacherProfile.lesson_topics.through.objects.filter(
+        teacherprofile__is_available=True
+    )
+    if max_hourly_rate:
+        specializations = specializations.filter(teacherprofile__hourly_rate__lte=max_hourly_rate)
+        topics = topics.filter(teacherprofile__hourly_rate__lte=max_hourly_rate)
+
+    queries = [
+        specializations.order_by().values('specialization_id', 'specialization__name').annotate(
+            facet=Value('specializations', output_field=CharField()), count=Count('pk'),
+        ).values_list('facet', 'specialization_id', 'specialization__name', 'count'),
+    ]
+    if specialization_id:
+        topics = topics.filter(
+            lessontopic__specialization_id=specialization_id,
+            teacherprofile__specializations=specialization_id,
+        )
+        queries.append(
+            topics.order_by().values('lessontopic_id', 'lessontopic__name').annotate(
+                facet=Value('topics', output_field=CharField()), count=Count('pk'),
+            ).values_list('facet', 'lessontopic_id', 'lessontopic__name', 'count')
+        )
+
+    if edges:
+        profiles = TeacherProfile.objects.filter(is_available=True)
+        if specialization_id:
+            profiles = profiles.filter(specializations=specialization_id)
+        if lesson_topic_id:
+            profiles = profiles.filter(lesson_topics=lesson_topic_id)
+        # Bucket i holds the rates in (edges[i], edges[i + 1]], the first one
+        # also edges[0]
+        bucket = Case(
+            *(When(hourly_rate__lte=edge, then=Value(i)) for i, edge in enumerate(edges[1:-1])),
+            default=Value(len(edges) - 2),
+            output_field=IntegerField(),
+        )
+        queries.append(
+            profiles.order_by().annotate(bucket=bucket).values('bucket').annotate(
+                facet=Value('rates', output_field=CharField()),
+                name=Value('', output_field=CharField()),
+                count=Count('pk'),
+            ).values_list('facet', 'bucket', 'name', 'count')
+        )
+    return queries
+
+
+def compute_facets(specialization_id, lesson_topic_id, max_hourly_rate, edges):
+    queries = facet_queries(specialization_id, lesson_topic_id, max_hourly_rate, edges)
+    rows = queries[0].union(*queries[1:], all=True)
+
+    facets = {'specializations': [], 'topics': [], 'rates': []}
+    buckets = {}
+    for facet, group_id, name, count in rows:
+        if facet == 'rates':
+            buckets[group_id] = count
+        else:
+            facets[facet].append({'id': group_id, 'name': name, 'count': count})
+    for facet, selected in (('specializations', specialization_id), ('topics', lesson_topic_id)):
+        facets[facet].sort(key=lambda entry: entry['name'])
+        for entry in facets[facet]:
+            entry['selected'] = entry['id'] == selected
+
+    cumulative = 0
+    for i, edge in enumerate(edges[1:]):
+        if buckets.get(i):
+            cumulative += buckets[i]
+            facets['rates'].append({
+                'max': edge, 'count': cumulative,
+                'selected': max_hourly_rate is not None and edge == max_hourly_rate,
+            })
+    return facets
+
+
+def search_facets(specialization=None, lesson_topic=None, max_hourly_rate=None):
+    """
+    Cached facets for the given search filters: ``{'specializations': [...],
+    'topics': [...], 'rates': [...]}``, each entry with its ``count`` and
+    whether it is ``selected``
+    """
+    specialization_id = specialization.pk if specialization else None
+    lesson_topic_id = lesson_topic.pk if lesson_topic else None
+    versions = get_versions(['taxonomy', 'teacher_profiles'])
+    key = 'search_facets:{taxonomy}:{teacher_profiles}'.format(**versions) + (
+        f':{specialization_id}:{lesson_topic_id}:{max_hourly_rate}'
+    )
+    facets = cache.get(key)
+    if facets is None:
+        bins = get_price_stats()['bins']
+        edges = [Decimal(str(edge)).quantize(Decimal('0.01')) for edge in bins] if bins[-1] else []
+        facets = compute_facets(specialization_id, lesson_topic_id, max_hourly_rate, edges)
+        cache.set(key, facets, settings.SEARCH_FACETS_CACHE_TIMEOUT)
+    return facets
@@ -1,6 +1,8 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from .models import User, TeacherProfile, LessonRequest, TeacherAvailability, Specialization, LessonTopic
+from .freebusy import free_windows, is_free
+from .pricing import get_price_stats, price_stats_for
 
 class UserRegistrationForm(UserCreationForm):
     """Custom user registration form"""
@@ -218,6 +220,9 @@ class LessonRequestForm(forms.ModelForm):
         self.fields['lesson_topic'].queryset = LessonTopic.objects.filter(
             teachers__isnull=False
         ).distinct()
+        # Rate distribution per topic, so the page can suggest a realistic
+        # maximum rate for whichever topic gets picked
+        self.price_stats = get_price_stats()['topics']
 
 
 class TeacherAvailabilityForm(forms.ModelForm):
@@ -244,12 +249,39 @@ class TeacherAvailabilityForm(forms.ModelForm):
             })
         }
     
+    def __init__(self, *args, teacher=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.teacher = teacher
+    
     def clean_available_date(self):
         from datetime import date
         available_date = self.cleaned_data.get('available_date')
         if available_date and available_date < date.today():
             raise forms.ValidationError("Available date cannot be in the past.")
         return available_date
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        available_date = cleaned_data.get('available_date')
+        available_time = cleaned_data.get('available_time')
+        duration = cleaned_data.get('duration')
+        if self.teacher and available_date and available_time and duration:
+            if not is_free(self.teacher.pk, available_date, available_time, duration):
+                raise forms.ValidationError(
+                    "You already have a lesson booked at this time."
+                    + self.free_times_hint(available_date, available_time, duration)
+                )
+        return cleaned_data
+    
+    def free_times_hint(self, available_date, available_time, duration):
+        """The closest free start times before and after the requested one"""
+        windows = free_windows(self.teacher.pk, available_date, duration)
+        before = [start for start in windows if start < available_time][-1:]
+        after = [start for start in windows if start > available_time][:1]
+        nearest = [start.strftime('%H:%M') for start in before + after]
+        if not nearest:
+            return " You have no free time for this duration on that day."
+        return f" Nearest free times that day: {' or '.join(nearest)}."
 
 
 class LessonSearchForm(forms.Form):
@@ -287,6 +319,20 @@ class LessonSearchForm(forms.Form):
             'max': '180'
         })
     )
+    available_date = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={
+            'class': 'form-input',
+            'type': 'date'
+        })
+    )
+    available_time = forms.TimeField(
+        required=False,
+        widget=forms.TimeInput(attrs={
+            'class': 'form-input',
+            'type': 'time'
+        })
+    )
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -298,4 +344,34 @@ class LessonSearchForm(forms.Form):
                     specialization_id=specialization_id
                 )
             except (ValueError, TypeError):
-                pass 
\ No newline at end of file
+                pass
+        
+        # Rate distribution for the selected topic (or specialization)
+        self.price_stats = price_stats_for(
+            lesson_topic_id=self.data.get('lesson_topic'),
+            specialization_id=self.data.get('specialization'),
+        )
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if bool(cleaned_data.get('available_date')) != bool(cleaned_data.get('available_time')):
+            raise forms.ValidationError("Enter both a date and a time to filter by availability.")
+        return cleaned_data
+    
+    def get_teacher_profiles(self):
+        """Available teacher profiles matching the cleaned filters (not the free/busy one)"""
+        teacher_profiles = TeacherProfile.objects.filter(is_available=True)
+        
+        specialization = self.cleaned_data.get('specialization')
+        if specialization:
+            teacher_profiles = teacher_profiles.filter(specializations=specialization)
+        
+        lesson_topic = self.cleaned_data.get('lesson_topic')
+        if lesson_topic:
+            teacher_profiles = teacher_profiles.filter(lesson_topics=lesson_topic)
+        
+        max_hourly_rate = self.cleaned_data.get('max_hourly_rate')
+        if max_hourly_rate:
+            teacher_profiles = teacher_profiles.filter(hourly_rate__lte=max_hourly_rate)
+        
+        return teacher_profiles
@@ -0,0 +1,165 @@
+"""
+Per-teacher, per-day free/busy bitmaps.
+
+A day is 288 five-minute slots stored as a 36-byte blob in
+TeacherDayCalendar and handled as a Python int, so "is the teacher free
+at T for D minutes" is one ``bitmap & mask`` and free windows are found
+with shifts. Lessons that run past midnight set bits on both days.
+
+Signals rebuild the affected teacher/days from the raw rows on every
+availability and booking write; rebuild_calendars recomputes everything
+(e.g. after bulk updates that bypass signals).
+"""
+from datetime import datetime, time, timedelta
+
+from .models import TeacherAvailability, LessonBooking, TeacherDayCalendar
+
+
+SLOT_MINUTES = 5
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+DAY_BYTES = SLOTS_PER_DAY // 8
+FULL_DAY = (1 << SLOTS_PER_DAY) - 1
+
+
+def to_bitmap(value):
+    return int.from_bytes(bytes(value or b''), 'little')
+
+
+def to_blob(bitmap):
+    return bitmap.to_bytes(DAY_BYTES, 'little')
+
+
+def day_masks(day, at, duration):
+    """
+    ``(day, mask)`` pairs of the slots covered by a lesson starting at
+    ``at`` for ``duration`` minutes; partly covered slots count as taken
+    """
+    first = (at.hour * 60 + at.minute) // SLOT_MINUTES
+    last = -(-(at.hour * 60 + at.minute + duration) // SLOT_MINUTES)  # ceil
+    masks = []
+    while last > 0:
+        if first < SLOTS_PER_DAY:
+            masks.append((day, (((1 << (min(last, SLOTS_PER_DAY) - first)) - 1) << first)))
+        day += timedelta(days=1)
+        first = max(first - SLOTS_PER_DAY, 0)
+        last -= SLOTS_PER_DAY
+    return masks
+
+
+def affected_days(day, at, duration):
+    return [mask_day for mask_day, _ in day_masks(day, at, duration)]
+
+
+def build_day(teacher_id, day):
+    """``(booked, offered)`` bitmaps of a teacher/day from the raw rows"""
+    booked = offered = 0
+    # Lessons starting the day before may run past midnight
+    days = [day - timedelta(days=1), day]
+    bookings = LessonBooking.objects.filter(
+        teacher_id=teacher_id,
+        teacher_availability__available_date__in=days,
+    ).exclude(status='cancelled').values_list(
+        'teacher_availability__available_date',
+        'teacher_availability__available_time',
+        'teacher_availability__duration',
+    )
+    for start_day, at, duration in bookings:
+        for mask_day, mask in day_masks(start_day, at, duration):
+            if mask_day == day:
+                booked |= mask
+    availabilities = TeacherAvailability.objects.filter(
+        teacher_id=teacher_id, available_date__in=days, is_accepted=False,
+    ).values_list('available_date', 'available_time', 'duration')
+    for start_day, at, duration in availabilities:
+        for mask_day, mask in day_masks(start_day, at, duration):
+            if mask_day == day:
+                offered |= mask
+    return booked, offered
+
+
+def rebuild_day(teacher_id, day):
+    """Recompute one stored teacher/day; empty days are not stored"""
+    booked, offered = build_day(teacher_id, day)
+    if booked or offered:
+        TeacherDayCalendar.objects.update_or_create(
+            teacher_id=teacher_id, date=day,
+            defaults={'booked': to_blob(booked), 'offered': to_blob(offered)},
+        )
+    else:
+        TeacherDayCalendar.objects.filter(teacher_id=teacher_id, date=day).delete()
+
+
+def rebuild_all(since=None):
+    """Recompute every teacher/day with availabilities on or after ``since``"""
+    availabilities = TeacherAvailability.objects.all()
+    calendars = TeacherDayCalendar.objects.all()
+    if since is not None:
+        availabilities = availabilities.filter(available_date__gte=since)
+        calendars = calendars.filter(date__gte=since)
+    pairs = set()
+    for teacher_id, day, at, duration in availabilities.values_list(
+        'teacher_id', 'available_date', 'available_time', 'duration'
+    ).order_by().iterator(chunk_size=5000):
+        pairs.update((teacher_id, mask_day) for mask_day in affected_days(day, at, duration))
+    # Stored days that no longer have any rows
+    pairs.update(calendars.values_list('teacher_id', 'date'))
+    for teacher_id, day in sorted(pairs):
+        rebuild_day(teacher_id, day)
+    return len(pairs)
+
+
+def load_bitmaps(teacher_ids, days):
+    """``{(teacher_id, day): (booked, offered)}`` for the stored calendars among the given ones"""
+    calendars = TeacherDayCalendar.objects.filter(
+        teacher_id__in=teacher_ids, date__in=days
+    ).values_list('teacher_id', 'date', 'booked', 'offered')
+    return {
+        (teacher_id, day): (to_bitmap(booked), to_bitmap(offered))
+        for teacher_id, day, booked, offered in calendars
+    }
+
+
+def free_teachers(teacher_ids, day, at, duration, include_offered=False):
+    """
+    Subset of ``teacher_ids`` with no booked lesson (and, optionally, no
+    pending offer) overlapping ``at`` for ``duration`` minutes, in one query
+    """
+    masks = day_masks(day, at, duration)
+    bitmaps = load_bitmaps(teacher_ids, [mask_day for mask_day, _ in masks])
+    free = set()
+    for teacher_id in teacher_ids:
+        for mask_day, mask in masks:
+            booked, offered = bitmaps.get((teacher_id, mask_day), (0, 0))
+            if (booked | offered if include_offered else booked) & mask:
+                break
+        else:
+            free.add(teacher_id)
+    return free
+
+
+def is_free(teacher_id, day, at, duration, include_offered=False):
+    return teacher_id in free_teachers([teacher_id], day, at, duration, include_offered)
+
+
+def free_windows(teacher_id, day, duration, start=time(0), end=None):
+    """
+    Start times on ``day``, on the slot grid between ``start`` and ``end``,
+    where the teacher has ``duration`` booked-free minutes
+    """
+    booked, _ = load_bitmaps([teacher_id], [day]).get((teacher_id, day), (0, 0))
+    free = ~booked & FULL_DAY
+    # Bit i of ``windows`` is set when slots i .. i + n - 1 are all free
+    windows = free
+    length = -(-duration // SLOT_MINUTES)
+    covered = 1
+    while covered < length:
+        step = min(covered, length - covered)
+        windows &= windows >> step
+        covered += step
+    first = (start.hour * 60 + start.minute) // SLOT_MINUTES
+    last = SLOTS_PER_DAY - length if end is None else (end.hour * 60 + end.minute) // SLOT_MINUTES - length
+    return [
+        (datetime.min + timedelta(minutes=slot * SLOT_MINUTES)).time()
+        for slot in range(first, last + 1)
+        if windows >> slot & 1
+    ]
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """
+    PBKDF2 hasher whose iteration count comes from PASSWORD_HASH_ITERATIONS.
+    
+    Existing hashes with a different count are upgraded transparently on the
+    next successful login. Use the benchmark_hashing command to pick a value.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS or super().iterations
@@ -0,0 +1,46 @@
+"""
+Namespaced URL includes whose URLconf is imported on first use.
+
+Django walks every include when it builds the reverse lookups of the root
+URLconf, i.e. on the first ``{% url %}`` of any page, which would import
+the admin and API modules in every worker. A lazy include is skipped by that
+walk; it imports its URLconf when a path under it is resolved or one of its
+names (``namespace:name``) is reversed. Its views are not in the root's
+lookups, so they can only be reversed by name, not by the view callable.
+
+This overrides private URLResolver methods; core.tests.LazyIncludeTests
+reverses and resolves every name of the lazy namespaces to catch a Django
+upgrade that changes them.
+"""
+from django.urls.resolvers import RoutePattern, URLResolver
+
+
+class LazyURLResolver(URLResolver):
+
+    def _populate(self):
+        # Called by the parent's _populate, which only needs the namespace
+        if 'url_patterns' in self.__dict__:
+            super()._populate()
+
+    @property
+    def reverse_dict(self):
+        self.url_patterns
+        return super().reverse_dict
+
+    @property
+    def namespace_dict(self):
+        self.url_patterns
+        return super().namespace_dict
+
+    @property
+    def app_dict(self):
+        self.url_patterns
+        return super().app_dict
+
+
+def lazy_include(route, urlconf_name, namespace):
+    """``path(route, include((urlconf_name, namespace)))``, imported on first use"""
+    return LazyURLResolver(
+        RoutePattern(route, is_endpoint=False), urlconf_name,
+        app_name=namespace, namespace=namespace,
+    )
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from core.archive import ARCHIVES, archivable_requests, archive_requests
+from core.sync import purge_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Move closed lesson requests, with their availabilities and bookings, to the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            default=settings.ARCHIVE_RETENTION_DAYS,
+            help=f'Archive requests closed and untouched for this many days (default: {settings.ARCHIVE_RETENTION_DAYS})',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.ARCHIVE_BATCH_SIZE,
+            help=f'Requests moved per transaction (default: {settings.ARCHIVE_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count the requests that would be archived',
+        )
+
+    def handle(self, *args, **options):
+        if options['retention_days'] < 0:
+            raise CommandError('--retention-days must not be negative')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        if options['dry_run']:
+            count = archivable_requests(options['retention_days']).distinct().count()
+            self.stdout.write(f'{count} request(s) would be archived')
+            return
+
+        totals = archive_requests(options['retention_days'], options['batch_size'])
+        for model, _ in ARCHIVES:
+            self.stdout.write(f"{model._meta.verbose_name_plural}: {totals[model]} archived")
+        # Archiving leaves tombstones for delta-sync clients; old ones are dropped
+        purged = purge_tombstones()
+        if purged:
+            self.stdout.write(f'Purged {purged} tombstone(s)')
+        self.stdout.write(self.style.SUCCESS('Archival complete'))
@@ -0,0 +1,83 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from core.backup import BackupError, backup
+
+
+class Command(BaseCommand):
+    help = 'Back up the SQLite database while the site is running, a few pages at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'target',
+            help='Backup file, replaced once the backup is verified; "-" writes to stdout',
+        )
+        parser.add_argument(
+            '--compress',
+            action='store_true',
+            help='Gzip the backup (implied by a target ending in .gz)',
+        )
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=100,
+            help='Database pages copied per step; writers wait for one step at most (default: 100)',
+        )
+        parser.add_argument(
+            '--sleep-ms',
+            type=float,
+            default=5,
+            help='Pause between steps, letting writers through (default: 5)',
+        )
+        parser.add_argument(
+            '--max-restarts',
+            type=int,
+            default=5,
+            help='Copies restarted by concurrent writes before finishing in one step (default: 5)',
+        )
+        parser.add_argument(
+            '--database',
+            default='default',
+            help='Database alias (default: default)',
+        )
+
+    def handle(self, *args, **options):
+        if options['pages'] < 1:
+            raise CommandError('--pages must be at least 1')
+        if options['sleep_ms'] < 0 or options['max_restarts'] < 0:
+            raise CommandError('--sleep-ms and --max-restarts must not be negative')
+        to_stdout = options['target'] == '-'
+        compress = options['compress'] or options['target'].endswith('.gz')
+        # The backup itself goes to stdout, so report on stderr
+        report = self.stderr if to_stdout else self.stdout
+
+        try:
+            stats = backup(
+                options['target'], options['pages'], options['sleep_ms'] / 1000,
+                options['max_restarts'], compress, alias=options['database'],
+                output=sys.stdout.buffer if to_stdout else None,
+            )
+        except BackupError as error:
+            raise CommandError(str(error))
+
+        megabytes = stats['bytes'] / 1024 / 1024
+        report.write(
+            f"Snapshot: {stats['pages']} pages ({megabytes:.1f} MB) in {stats['seconds']:.2f} s, "
+            f"{megabytes / max(stats['seconds'], 1e-9):.1f} MB/s"
+        )
+        report.write(
+            f"Steps: {stats['steps']}, restarts: {stats['restarts']}, "
+            f"longest writer stall (step): {stats['max_step'] * 1000:.1f} ms"
+        )
+        if stats['single_step']:
+            report.write(self.style.WARNING(
+                'Concurrent writes kept restarting the copy, so it was finished in one step; '
+                'use a larger --pages or back up at a quieter time'
+            ))
+        report.write('Integrity check: ok')
+        ratio = f", {stats['written'] / stats['bytes']:.0%} of the snapshot" if compress else ''
+        report.write(
+            f"Wrote {stats['written']} bytes{ratio} to {'stdout' if to_stdout else options['target']} "
+            f"in {stats['total_seconds']:.2f} s total (sha256 of the snapshot {stats['sha256']})"
+        )
+        report.write(self.style.SUCCESS('Backup complete'))
@@ -0,0 +1,156 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+from core.models import (
+    User, Specialization, LessonTopic, TeacherProfile, LessonRequest,
+    TeacherAvailability, LessonBooking,
+)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare payload size and response time of the HTML views and the JSON API'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=100,
+            help='Requests, availabilities and search results per page (default: 100)',
+        )
+        parser.add_argument(
+            '--rounds',
+            type=int,
+            default=20,
+            help='Number of times each page is fetched (default: 20)',
+        )
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        # The dummy cache disables the fragment cache and ETags, so every
+        # response is built in full: the cost a scraping client pays
+        with override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            API_MAX_PAGE_SIZE=max(settings.API_MAX_PAGE_SIZE, rows),
+        ):
+            results = self.run_pages(rows, options['rounds'])
+
+        self.stdout.write(f"{'page':<20}{'format':<8}{'requests':>9}{'bytes':>11}{'median ms':>11}")
+        for name, html, api in results:
+            for label, (count, size, elapsed) in (('html', html), ('json', api)):
+                self.stdout.write(f'{name:<20}{label:<8}{count:>9}{size:>11}{elapsed:>11.1f}')
+            self.stdout.write(
+                f'{"":<20}{"ratio":<8}{"":>9}{api[1] / html[1]:>11.2f}{api[2] / html[2]:>11.2f}'
+            )
+        self.stdout.write(self.style.SUCCESS('Rows were created for the benchmark and rolled back.'))
+
+    def run_pages(self, rows, rounds):
+        """Fetch every page inside a transaction that is rolled back afterwards"""
+        results = []
+        try:
+            with transaction.atomic():
+                student, teacher, specialization = self.create_fixtures(rows)
+                limit = f'limit={rows}'
+                # (name, user, HTML page, equivalent API calls)
+                pages = [
+                    ('student dashboard', student, '/student/dashboard/', [
+                        f'/api/v1/requests/?{limit}',
+                        f'/api/v1/availabilities/?{limit}',
+                    ]),
+                    ('teacher dashboard', teacher, '/teacher/dashboard/', [
+                        f'/api/v1/requests/?{limit}',
+                        f'/api/v1/availabilities/?{limit}',
+                        f'/api/v1/bookings/?{limit}',
+                    ]),
+                    ('search', student, f'/lesson/search/?specialization={specialization.pk}', [
+                        f'/api/v1/search/?specialization={specialization.pk}&{limit}',
+                    ]),
+                    ('search (3 fields)', student, f'/lesson/search/?specialization={specialization.pk}', [
+                        f'/api/v1/search/?specialization={specialization.pk}&{limit}'
+                        '&fields=id,first_name,hourly_rate',
+                    ]),
+                ]
+                for name, user, html_url, api_urls in pages:
+                    client = Client()
+                    client.force_login(user)
+                    results.append((
+                        name,
+                        self.measure(client, [html_url], rounds),
+                        self.measure(client, api_urls, rounds),
+                    ))
+                raise Rollback
+        except Rollback:
+            pass
+        return results
+
+    def measure(self, client, urls, rounds):
+        """``(requests, bytes, median ms)`` of fetching all ``urls`` once"""
+        timings = []
+        for _ in range(rounds):
+            size = 0
+            start = time.perf_counter()
+            for url in urls:
+                response = client.get(url)
+                if response.status_code != 200:
+                    raise RuntimeError(f'{url} returned {response.status_code}')
+                size += len(response.content)
+            timings.append((time.perf_counter() - start) * 1000)
+        return len(urls), size, statistics.median(timings)
+
+    def create_fixtures(self, rows):
+        specialization = Specialization.objects.create(name='Benchmark specialization')
+        topic = LessonTopic.objects.create(specialization=specialization, name='Benchmark topic')
+        student = User.objects.create_user(
+            'benchmark_student', user_type='student', first_name='Benchmark', last_name='Student'
+        )
+        teachers = User.objects.bulk_create([
+            User(username=f'benchmark_teacher_{i}', user_type='teacher', first_name='Teacher', last_name=str(i))
+            for i in range(rows)
+        ])
+        profiles = TeacherProfile.objects.bulk_create([
+            TeacherProfile(user=teacher, hourly_rate=50 + i % 50, experience_years=i % 20, about='Benchmark teacher')
+            for i, teacher in enumerate(teachers)
+        ])
+        TeacherProfile.specializations.through.objects.bulk_create([
+            TeacherProfile.specializations.through(teacherprofile=profile, specialization=specialization)
+            for profile in profiles
+        ])
+        TeacherProfile.lesson_topics.through.objects.bulk_create([
+            TeacherProfile.lesson_topics.through(teacherprofile=profile, lessontopic=topic)
+            for profile in profiles
+        ])
+
+        # Half of the requests are still pending, the other half booked
+        teacher = teachers[0]
+        requests = LessonRequest.objects.bulk_create([
+            LessonRequest(
+                student=student, lesson_topic=topic, lesson_duration=60, max_hourly_rate=150,
+                status='pending' if i % 2 else 'matched',
+            )
+            for i in range(rows)
+        ])
+        today = timezone.localdate()
+        availabilities = TeacherAvailability.objects.bulk_create([
+            TeacherAvailability(
+                teacher=teacher, lesson_request=lesson_request,
+                available_date=today + timedelta(days=i + 1), available_time='10:00', duration=60,
+                is_accepted=lesson_request.status == 'matched',
+            )
+            for i, lesson_request in enumerate(requests)
+        ])
+        LessonBooking.objects.bulk_create([
+            LessonBooking(lesson_request=availability.lesson_request, teacher=teacher, teacher_availability=availability)
+            for availability in availabilities if availability.is_accepted
+        ])
+        return student, teacher, specialization
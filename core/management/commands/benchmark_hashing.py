@@ -0,0 +1,64 @@
+import statistics
+import time
+
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Measure password hashing cost and suggest PASSWORD_HASH_ITERATIONS for a target login latency'
+
+    # Below this, PBKDF2-SHA256 is no longer a meaningful defence
+    MIN_ITERATIONS = 100000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target-ms',
+            type=float,
+            default=150.0,
+            help='Target time for one password check in milliseconds (default: 150)',
+        )
+        parser.add_argument(
+            '--samples',
+            type=int,
+            default=5,
+            help='Number of hashes timed per measurement (default: 5)',
+        )
+
+    def measure(self, hasher, samples):
+        """Median time in seconds of one hash with the hasher's current settings"""
+        salt = hasher.salt()
+        timings = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            hasher.encode('benchmark-password', salt)
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        hasher = get_hasher('default')
+        current = hasher.iterations
+        elapsed = self.measure(hasher, options['samples'])
+        self.stdout.write(
+            f'{hasher.algorithm}: {current} iterations take {elapsed * 1000:.1f} ms per check'
+        )
+
+        # PBKDF2 cost is linear in the iteration count
+        suggested = int(current * options['target_ms'] / 1000 / elapsed)
+        suggested = max(self.MIN_ITERATIONS, round(suggested, -4))
+
+        class Candidate(type(hasher)):
+            iterations = suggested
+
+        verified = self.measure(Candidate(), options['samples'])
+        self.stdout.write(
+            f'{hasher.algorithm}: {suggested} iterations take {verified * 1000:.1f} ms per check'
+        )
+        if suggested == self.MIN_ITERATIONS and verified * 1000 > options['target_ms']:
+            self.stdout.write(self.style.WARNING(
+                f'This machine cannot reach {options["target_ms"]:.0f} ms without dropping '
+                f'below {self.MIN_ITERATIONS} iterations; keeping the minimum.'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Suggested setting: DYSCHOOL_PASSWORD_HASH_ITERATIONS={suggested}'
+        ))
@@ -0,0 +1,83 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from core.matching import build_index, match_arrays, run_matching
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the batch matching engine on synthetic requests and teachers, and optionally '
+        'the real rebuild against the database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100000, help='Pending requests (default: 100000)')
+        parser.add_argument('--teachers', type=int, default=20000, help='Available teachers (default: 20000)')
+        parser.add_argument('--topics', type=int, default=200, help='Lesson topics (default: 200)')
+        parser.add_argument(
+            '--topics-per-teacher',
+            type=int,
+            default=3,
+            help='Topics taught by each teacher (default: 3)',
+        )
+        parser.add_argument('--limit', type=int, default=20, help='Matches kept per request (default: 20)')
+        parser.add_argument(
+            '--naive-sample',
+            type=int,
+            default=1000,
+            help='Requests matched with a per-request scan for comparison (default: 1000)',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--write',
+            action='store_true',
+            help='Also run match_requests on the database and time its load, match and write phases',
+        )
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        teachers, per_teacher = options['teachers'], options['topics_per_teacher']
+
+        # Teacher rows: every teacher teaches a few topics at one rate
+        teacher_ids = np.repeat(np.arange(1, teachers + 1), per_teacher)
+        topic_ids = rng.integers(1, options['topics'] + 1, size=teachers * per_teacher)
+        rates = np.repeat(rng.integers(3000, 30001, size=teachers), per_teacher)
+        request_topics = rng.integers(1, options['topics'] + 1, size=options['requests'])
+        request_rates = rng.integers(2000, 30001, size=options['requests'])
+
+        start = time.perf_counter()
+        index = build_index(teacher_ids, topic_ids, rates)
+        indexed = time.perf_counter()
+        positions, _, _, _, eligible = match_arrays(index, request_topics, request_rates, options['limit'])
+        matched = time.perf_counter()
+
+        self.stdout.write(
+            f"{options['requests']} requests x {teachers} teachers ({len(teacher_ids)} teacher/topic rows)"
+        )
+        self.stdout.write(f'  index build:   {(indexed - start) * 1000:8.1f} ms')
+        self.stdout.write(f'  matching:      {(matched - indexed) * 1000:8.1f} ms')
+        self.stdout.write(
+            f'  {len(positions)} matches computed (not stored), {int(eligible.sum())} eligible pairs, '
+            f'{int((eligible == 0).sum())} requests without a teacher'
+        )
+
+        sample = min(options['naive_sample'], options['requests'])
+        if sample:
+            # One scan over every teacher row per request, as a per-request
+            # query would do without an index
+            start = time.perf_counter()
+            for topic, max_rate in zip(request_topics[:sample], request_rates[:sample]):
+                int(((topic_ids == topic) & (rates <= max_rate)).sum())
+            naive = (time.perf_counter() - start) / sample * options['requests']
+            self.stdout.write(f'  per-request scan (extrapolated from {sample}): {naive * 1000:8.1f} ms')
+
+        if options['write']:
+            # The real path: loading from and rewriting LessonRequestMatch
+            result = run_matching(options['limit'])
+            self.stdout.write(
+                f"Database: {result['requests']} pending requests, {result['matches']} matches written"
+            )
+            for phase, seconds in result['seconds'].items():
+                self.stdout.write(f'  {phase + ":":14} {seconds * 1000:8.1f} ms')
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
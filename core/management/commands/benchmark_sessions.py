@@ -0,0 +1,133 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from core.models import User, Specialization, LessonTopic, TeacherProfile, LessonRequest
+
+
+class WriteCounter:
+    """execute_wrapper that counts write statements and session table reads"""
+
+    def __init__(self):
+        self.writes = 0
+        self.session_writes = 0
+        self.session_reads = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        statement = sql.lstrip().split(None, 1)[0].upper()
+        touches_session = 'django_session' in sql
+        if statement in ('INSERT', 'UPDATE', 'DELETE'):
+            self.writes += 1
+            if touches_session:
+                self.session_writes += 1
+        elif touches_session:
+            self.session_reads += 1
+        return execute(sql, params, many, context)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Count DB writes per user flow for each session/message storage mode'
+
+    PASSWORD = 'benchmark-pass-123'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rounds',
+            type=int,
+            default=5,
+            help='Number of times each flow is repeated (default: 5)',
+        )
+
+    def handle(self, *args, **options):
+        modes = [
+            ('db', 'session'),
+            ('db', 'fallback'),
+            ('cached_db', 'fallback'),
+            ('signed_cookies', 'fallback'),
+        ]
+        self.stdout.write(
+            f"{'sessions':<16}{'messages':<10}{'flow':<22}"
+            f"{'writes':>8}{'session w':>11}{'session r':>11}"
+        )
+        for session_mode, message_mode in modes:
+            with override_settings(
+                SESSION_ENGINE=settings.SESSION_ENGINES[session_mode],
+                MESSAGE_STORAGE=settings.MESSAGE_STORAGE_BACKENDS[message_mode],
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                AUTH_THROTTLE_ENABLED=False,
+            ):
+                for flow, counter in self.run_flows(options['rounds']):
+                    self.stdout.write(
+                        f'{session_mode:<16}{message_mode:<10}{flow:<22}'
+                        f'{counter.writes / options["rounds"]:>8.1f}'
+                        f'{counter.session_writes / options["rounds"]:>11.1f}'
+                        f'{counter.session_reads / options["rounds"]:>11.1f}'
+                    )
+        self.stdout.write(self.style.SUCCESS('Averages are per flow run; all data was rolled back.'))
+
+    def run_flows(self, rounds):
+        """Run every flow inside a transaction that is rolled back afterwards"""
+        results = []
+        try:
+            with transaction.atomic():
+                student, teacher, topic = self.create_fixtures()
+                # (name, user logged in beforehand, flow)
+                flows = [
+                    ('sign in', None, lambda client, i: self.sign_in(client, student)),
+                    ('request lesson', student, lambda client, i: self.request_lesson(client, teacher, topic)),
+                    ('submit availability', teacher, lambda client, i: self.submit_availability(client, topic, i)),
+                ]
+                for name, user, flow in flows:
+                    counter = WriteCounter()
+                    for i in range(rounds):
+                        client = Client()
+                        if user is not None:
+                            client.force_login(user)
+                        with connection.execute_wrapper(counter):
+                            flow(client, i)
+                    results.append((name, counter))
+                raise Rollback
+        except Rollback:
+            pass
+        return results
+
+    def create_fixtures(self):
+        specialization = Specialization.objects.create(name='Benchmark specialization')
+        topic = LessonTopic.objects.create(specialization=specialization, name='Benchmark topic')
+        student = User.objects.create_user(
+            'benchmark_student', password=self.PASSWORD, user_type='student'
+        )
+        teacher = User.objects.create_user(
+            'benchmark_teacher', password=self.PASSWORD, user_type='teacher'
+        )
+        profile = TeacherProfile.objects.create(
+            user=teacher, hourly_rate=100, experience_years=1, about='Benchmark'
+        )
+        profile.specializations.add(specialization)
+        profile.lesson_topics.add(topic)
+        return student, teacher, topic
+
+    def sign_in(self, client, student):
+        client.post('/sign-in/', {'username': student.username, 'password': self.PASSWORD}, follow=True)
+
+    def request_lesson(self, client, teacher, topic):
+        client.post(f'/lesson/request/{teacher.pk}/', {
+            'lesson_topic': topic.pk,
+            'lesson_duration': 60,
+            'max_hourly_rate': 150,
+        }, follow=True)
+
+    def submit_availability(self, client, topic, i):
+        lesson_request = LessonRequest.objects.filter(lesson_topic=topic).first()
+        client.post(f'/teacher/availability/{lesson_request.pk}/', {
+            'available_date': date.today() + timedelta(days=i + 1),
+            'available_time': '10:00',
+            'duration': 60,
+        }, follow=True)
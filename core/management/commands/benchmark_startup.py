@@ -0,0 +1,124 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Run in a fresh interpreter per measurement: imports the WSGI module (what
+# a new worker does), then sends the paths through it
+CHILD = '''
+import importlib, json, sys, time
+start = time.perf_counter()
+module = importlib.import_module(sys.argv[1])
+started = time.perf_counter()
+from core.warmup import wsgi_request
+responses = []
+for path in sys.argv[2:]:
+    before = time.perf_counter()
+    status, size = wsgi_request(module.application, path)
+    responses.append([path, status, size, (time.perf_counter() - before) * 1000])
+print(json.dumps({
+    'startup': (started - start) * 1000,
+    'responses': responses,
+    'modules': sorted(sys.modules),
+}))
+'''
+
+# Modules worth knowing whether a worker loaded them
+WATCHED = ['PIL', 'numpy', 'django.contrib.admin.sites', 'core.admin', 'core.forms', 'core.api']
+
+
+def parse_importtime(stderr):
+    """``{module: (self µs, cumulative µs, depth)}`` from ``-X importtime`` output"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules[name.strip()] = (int(own), int(cumulative), depth)
+    return modules
+
+
+class Command(BaseCommand):
+    help = 'Measure worker cold start: import time per module and time to first response'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=5,
+            help='Fresh interpreters to start; medians are reported (default: 5)',
+        )
+        parser.add_argument(
+            '--path',
+            action='append',
+            dest='paths',
+            help='Path requested after startup, in order (repeatable; default: / twice)',
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=15,
+            help='Modules listed per table (default: 15)',
+        )
+        parser.add_argument(
+            '--warmup',
+            action='store_true',
+            help='Start the workers with the warm-up hook enabled (DYSCHOOL_WARMUP=1)',
+        )
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError('--runs must be at least 1')
+        paths = options['paths'] or ['/', '/']
+        wsgi_module = settings.WSGI_APPLICATION.rsplit('.', 1)[0]
+        env = {
+            **os.environ,
+            'PYTHONPATH': os.pathsep.join(filter(None, [str(settings.BASE_DIR), os.environ.get('PYTHONPATH')])),
+            'DYSCHOOL_WARMUP': '1' if options['warmup'] else '0',
+        }
+
+        runs = []
+        for _ in range(options['runs']):
+            result = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', CHILD, wsgi_module, *paths],
+                capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+            )
+            if result.returncode != 0:
+                raise CommandError(f'Worker failed to start:\n{result.stderr[-2000:]}')
+            output = json.loads(result.stdout.strip().splitlines()[-1])
+            output['imports'] = parse_importtime(result.stderr)
+            runs.append(output)
+
+        self.stdout.write(f"Startup (import {wsgi_module}): {statistics.median(run['startup'] for run in runs):.1f} ms")
+        for position, path in enumerate(paths):
+            elapsed = statistics.median(run['responses'][position][3] for run in runs)
+            status = runs[0]['responses'][position][1]
+            self.stdout.write(f'  request {position + 1} GET {path}: {elapsed:.1f} ms (HTTP {status})')
+        self.stdout.write(f"Loaded: {', '.join(name for name in WATCHED if name in runs[0]['modules']) or '-'}")
+        self.stdout.write(f"Not loaded: {', '.join(name for name in WATCHED if name not in runs[0]['modules']) or '-'}")
+
+        names = set().union(*(run['imports'] for run in runs))
+
+        def median_times(name):
+            times = [run['imports'][name] for run in runs if name in run['imports']]
+            return statistics.median(t[0] for t in times), statistics.median(t[1] for t in times)
+
+        project = sorted(
+            (name for name in names if name.split('.')[0] in ('core', 'dyschool')),
+            key=lambda name: -median_times(name)[1],
+        )
+        top_level = sorted(
+            (name for name in names if all(run['imports'].get(name, (0, 0, 0))[2] == 0 for run in runs)),
+            key=lambda name: -median_times(name)[1],
+        )
+        for title, table in (('Project modules', project), ('Top-level imports', top_level)):
+            self.stdout.write(f"\n{title:<48}{'self ms':>10}{'total ms':>10}")
+            for name in table[:options['top']]:
+                own, cumulative = median_times(name)
+                self.stdout.write(f'{name:<48}{own / 1000:>10.1f}{cumulative / 1000:>10.1f}')
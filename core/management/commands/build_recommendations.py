@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from core.recommendations import build_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the related-teacher recommendations (top-K neighbours per teacher)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=10,
+            help='Neighbours kept per teacher and kind (default: 10)',
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recompute every teacher instead of only those affected by recent changes',
+        )
+
+    def handle(self, *args, **options):
+        count = build_recommendations(k=options['top_k'], full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'Updated recommendations for {count} teacher(s)'))
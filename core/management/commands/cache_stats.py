@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from core.caching import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters for the application caches'
+
+    CACHE_AREAS = ['teacher_card']
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset the counters after printing them',
+        )
+
+    def handle(self, *args, **options):
+        for name in self.CACHE_AREAS:
+            stats = get_stats(name)
+            self.stdout.write(
+                f"{name}: {stats['hits']} hits, {stats['misses']} misses, "
+                f"hit rate {stats['hit_rate']:.1%}"
+            )
+            if options['reset']:
+                reset_stats(name)
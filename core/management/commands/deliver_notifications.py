@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.outbox import deliver_batch, purge_delivered
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending notifications from the outbox as batched emails'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.OUTBOX_BATCH_SIZE,
+            help=f'Messages claimed per batch (default: {settings.OUTBOX_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, polling the outbox every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds between polls when the outbox is empty (default: 5)',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            totals = {'sent': 0, 'retry': 0, 'skipped': 0, 'expanded': 0}
+            while True:
+                result = deliver_batch(options['batch_size'])
+                for name, count in result.items():
+                    totals[name] += count
+                if not any(result.values()):
+                    break
+            if any(totals.values()):
+                self.stdout.write(
+                    f"Sent {totals['sent']}, scheduled {totals['retry']} for retry, skipped {totals['skipped']}, "
+                    f"expanded {totals['expanded']} event(s)"
+                )
+            purged = purge_delivered(settings.OUTBOX_RETENTION_DAYS)
+            if purged:
+                self.stdout.write(f'Purged {purged} delivered message(s)')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('Outbox processed'))
@@ -0,0 +1,61 @@
+import sys
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime, parse_date
+from django.utils import timezone
+from core.exports import EXPORTS, iter_export
+
+
+class Command(BaseCommand):
+    help = 'Stream lesson requests, availabilities or bookings as CSV or JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('export', choices=sorted(EXPORTS), help='What to export')
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            default='csv',
+            help='Output format (default: csv)',
+        )
+        parser.add_argument(
+            '--output',
+            '-o',
+            help='File to write to (default: standard output)',
+        )
+        parser.add_argument(
+            '--since',
+            help='Only rows updated at or after this date/datetime (ISO 8601)',
+        )
+        parser.add_argument(
+            '--status',
+            help='Only rows with this status (requests and bookings)',
+        )
+
+    def handle(self, *args, **options):
+        model, columns = EXPORTS[options['export']]
+        queryset = model.objects.all()
+
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                since_date = parse_date(options['since'])
+                if since_date is None:
+                    raise CommandError(f"Invalid --since value: {options['since']}")
+                since = datetime.combine(since_date, time.min)
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+            queryset = queryset.filter(updated_at__gte=since)
+
+        if options['status']:
+            if not any(field.name == 'status' for field in model._meta.fields):
+                raise CommandError(f"--status does not apply to {options['export']}")
+            queryset = queryset.filter(status=options['status'])
+
+        output = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        try:
+            for chunk in iter_export(queryset, columns, options['format']):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
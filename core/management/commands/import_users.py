@@ -0,0 +1,308 @@
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import DataError, IntegrityError, transaction
+from core import autocomplete
+from core.caching import bump_version
+from core.models import User, Specialization, LessonTopic, TeacherProfile
+
+
+USER_FIELDS = [
+    'username', 'email', 'first_name', 'last_name', 'user_type',
+    'phone_number', 'bio', 'address',
+]
+LIST_SEPARATOR = '|'
+
+
+def init_worker():
+    """Make sure spawned hashing processes have Django configured"""
+    import django
+    django.setup()
+
+
+def hash_password(raw_password):
+    # An empty password gives an unusable hash; the user resets it later
+    return make_password(raw_password or None)
+
+
+def read_rows(path, file_format):
+    """Yield ``(line_number, row)`` pairs without loading the whole file"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if file_format == 'csv':
+            # Header is line 1
+            for line_number, row in enumerate(csv.DictReader(f), start=2):
+                yield line_number, row
+        else:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield line_number, {'_error': f'Invalid JSON: {e}'}
+                    continue
+                yield line_number, row if isinstance(row, dict) else {'_error': 'Row is not an object'}
+
+
+def split_list(value):
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in str(value or '').split(LIST_SEPARATOR) if item.strip()]
+
+
+class Command(BaseCommand):
+    help = 'Bulk import students and teachers from a CSV or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with header) or JSONL file to import')
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help='Input format (default: guessed from the file extension)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows hashed and inserted per batch (default: 1000)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Processes used for password hashing (default: CPU count)',
+        )
+        parser.add_argument(
+            '--rejects',
+            help='Where rejected rows are written as JSONL (default: <path>.rejected.jsonl)',
+        )
+        parser.add_argument(
+            '--skip-password-validation',
+            action='store_true',
+            help='Do not run AUTH_PASSWORD_VALIDATORS on imported passwords',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'File not found: {path}')
+        file_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        self.validate_passwords = not options['skip_password_validation']
+        self.workers = max(1, options['workers'] or 1)
+
+        # Everything rows are checked against is loaded once up front
+        self.usernames = {
+            username.lower()
+            for username in User.objects.values_list('username', flat=True).iterator()
+        }
+        self.emails = {
+            email.lower()
+            for email in User.objects.exclude(email='').values_list('email', flat=True).iterator()
+        }
+        self.specializations = dict(Specialization.objects.values_list('name', 'id'))
+        self.topics = {
+            f'{specialization}:{name}': topic_id
+            for topic_id, name, specialization in LessonTopic.objects.values_list(
+                'id', 'name', 'specialization__name'
+            )
+        }
+
+        rejects_path = options['rejects'] or f'{path}.rejected.jsonl'
+        self.imported = 0
+        self.rejected = 0
+
+        rows = read_rows(path, file_format)
+        with open(rejects_path, 'w', encoding='utf-8') as self.rejects_file, \
+                ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker) as pool:
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                valid = []
+                for line_number, row in batch:
+                    cleaned, errors = self.clean_row(row)
+                    if errors:
+                        self.reject(line_number, row, errors)
+                    else:
+                        valid.append((line_number, row, cleaned))
+                if valid:
+                    self.insert_batch(valid, pool)
+                self.stdout.write(f'{self.imported} imported, {self.rejected} rejected')
+
+        # bulk_create sends no signals; invalidate what depends on profiles,
+        # including every worker's autocomplete index
+        bump_version('teacher_profiles')
+        bump_version(autocomplete.VERSION)
+        if not self.rejected:
+            os.remove(rejects_path)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.imported} users; {self.rejected} rows rejected'
+            + (f' (see {rejects_path})' if self.rejected else '')
+        ))
+
+    def reject(self, line_number, row, errors):
+        self.rejected += 1
+        row = {key: value for key, value in row.items() if key != 'password'}
+        self.rejects_file.write(json.dumps(
+            {'line': line_number, 'row': row, 'errors': errors}, ensure_ascii=False, default=str
+        ) + '\n')
+
+    def clean_row(self, row):
+        """Validate a row against the preloaded sets; returns (cleaned, errors)"""
+        if '_error' in row:
+            return None, [row['_error']]
+
+        errors = []
+        cleaned = {field: str(row.get(field) or '').strip() for field in USER_FIELDS}
+        cleaned['user_type'] = cleaned['user_type'] or 'student'
+        password = str(row.get('password') or '')
+
+        for field in ('username', 'email', 'first_name', 'last_name'):
+            if not cleaned[field]:
+                errors.append(f'{field} is required')
+        if cleaned['user_type'] not in dict(User.USER_TYPE_CHOICES):
+            errors.append(f"Unknown user_type '{cleaned['user_type']}'")
+
+        username = cleaned['username'].lower()
+        email = cleaned['email'].lower()
+        if username and username in self.usernames:
+            errors.append('A user with that username already exists.')
+        if email:
+            try:
+                validate_email(cleaned['email'])
+            except ValidationError:
+                errors.append('Enter a valid email address.')
+            if email in self.emails:
+                errors.append('This email address is already in use.')
+
+        if cleaned['phone_number']:
+            try:
+                User._meta.get_field('phone_number').run_validators(cleaned['phone_number'])
+            except ValidationError as e:
+                errors.extend(e.messages)
+
+        if password and self.validate_passwords:
+            try:
+                validate_password(password, User(
+                    username=cleaned['username'], email=cleaned['email'],
+                    first_name=cleaned['first_name'], last_name=cleaned['last_name'],
+                ))
+            except ValidationError as e:
+                errors.extend(e.messages)
+
+        if cleaned['user_type'] == 'teacher':
+            errors.extend(self.clean_teacher(row, cleaned))
+
+        if errors:
+            return None, errors
+
+        # Reserve the username/email so later rows in the file can't reuse them
+        self.usernames.add(username)
+        self.emails.add(email)
+        cleaned['password'] = password
+        return cleaned, []
+
+    def clean_teacher(self, row, cleaned):
+        errors = []
+        # Through the model fields, so values the column can't hold (too
+        # many digits, Infinity, NaN) become row errors, not failed batches
+        try:
+            cleaned['hourly_rate'] = TeacherProfile._meta.get_field('hourly_rate').clean(
+                str(row.get('hourly_rate') or '').strip(), None
+            )
+            if not cleaned['hourly_rate'].is_finite() or cleaned['hourly_rate'] < 0:
+                raise ValidationError('invalid')
+        except ValidationError:
+            errors.append('hourly_rate must be a positive number up to 999999.99, with at most 2 decimals')
+        try:
+            cleaned['experience_years'] = TeacherProfile._meta.get_field('experience_years').clean(
+                str(row.get('experience_years') or 0).strip(), None
+            )
+        except ValidationError:
+            errors.append('experience_years must be a positive integer')
+        cleaned['about'] = str(row.get('about') or '').strip()
+        if not cleaned['about']:
+            errors.append('about is required for teachers')
+
+        names = split_list(row.get('specializations'))
+        if not names:
+            errors.append('At least one specialization is required for teachers')
+        unknown = [name for name in names if name not in self.specializations]
+        if unknown:
+            errors.append(f"Unknown specializations: {', '.join(unknown)}")
+        cleaned['specialization_ids'] = [self.specializations.get(name) for name in names]
+
+        # Topics are given as "Specialization:Topic"
+        topics = split_list(row.get('lesson_topics'))
+        unknown = [topic for topic in topics if topic not in self.topics]
+        if unknown:
+            errors.append(f"Unknown lesson topics: {', '.join(unknown)}")
+        cleaned['topic_ids'] = [self.topics.get(topic) for topic in topics]
+        return errors
+
+    def insert_batch(self, valid, pool):
+        passwords = pool.map(
+            hash_password,
+            [cleaned['password'] for _, _, cleaned in valid],
+            chunksize=max(1, len(valid) // (self.workers * 4)),
+        )
+        users = [
+            User(**{field: cleaned[field] for field in USER_FIELDS}, password=password)
+            for (_, _, cleaned), password in zip(valid, passwords)
+        ]
+        for user in users:
+            user.phone_number = user.phone_number or None
+
+        try:
+            with transaction.atomic():
+                self.create_users(valid, users)
+        except (IntegrityError, DataError, ValidationError):
+            # Someone signed up with one of these usernames/emails since the
+            # sets were loaded, or a value slipped past clean_row(); retry row
+            # by row to find the culprits
+            for row_data, user in zip(valid, users):
+                user.pk = None
+                try:
+                    with transaction.atomic():
+                        self.create_users([row_data], [user])
+                except (IntegrityError, DataError, ValidationError) as e:
+                    self.reject(row_data[0], row_data[1], [str(e)])
+
+    def create_users(self, valid, users):
+        User.objects.bulk_create(users)
+        teachers = [
+            (cleaned, user) for (_, _, cleaned), user in zip(valid, users)
+            if cleaned['user_type'] == 'teacher'
+        ]
+        profiles = TeacherProfile.objects.bulk_create([
+            TeacherProfile(
+                user=user,
+                hourly_rate=cleaned['hourly_rate'],
+                experience_years=cleaned['experience_years'],
+                about=cleaned['about'],
+            )
+            for cleaned, user in teachers
+        ])
+        TeacherProfile.specializations.through.objects.bulk_create([
+            TeacherProfile.specializations.through(
+                teacherprofile_id=profile.pk, specialization_id=specialization_id
+            )
+            for (cleaned, _), profile in zip(teachers, profiles)
+            for specialization_id in set(cleaned['specialization_ids'])
+        ])
+        TeacherProfile.lesson_topics.through.objects.bulk_create([
+            TeacherProfile.lesson_topics.through(
+                teacherprofile_id=profile.pk, lessontopic_id=topic_id
+            )
+            for (cleaned, _), profile in zip(teachers, profiles)
+            for topic_id in set(cleaned['topic_ids'])
+        ])
+        self.imported += len(users)
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from core.caching import clear_cache
+from core.transfer import TransferError, load
+
+
+class Command(BaseCommand):
+    help = 'Load a dump made by dump_core_data into an empty, migrated database, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'directory',
+            help='Directory written by dump_core_data',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows per bulk insert and commit (default: 1000)',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Checkpoint file an interrupted load resumes from (default: .load-checkpoint in the directory)',
+        )
+        parser.add_argument(
+            '--database',
+            default='default',
+            help='Database alias (default: default)',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        def progress(label, rows):
+            self.stdout.write(f'{label}: {rows} rows')
+
+        start = time.perf_counter()
+        try:
+            inserted = load(
+                options['directory'], options['batch_size'], checkpoint_path=options['checkpoint'],
+                alias=options['database'], progress=progress,
+            )
+        except (TransferError, OSError) as error:
+            raise CommandError(str(error))
+
+        # No signals ran, so nothing cached reflects the loaded rows
+        shared = clear_cache()
+        seconds = time.perf_counter() - start
+        self.stdout.write(
+            f'Loaded {inserted} rows in {seconds:.2f} s ({inserted / max(seconds, 1e-9):.0f} rows/s); cache cleared'
+        )
+        if not shared:
+            self.stdout.write(self.style.WARNING(
+                'The cache is local to each process: restart the running workers so they drop their cached pages'
+            ))
+        self.stdout.write(self.style.SUCCESS('Load complete'))
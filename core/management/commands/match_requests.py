@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from core.matching import run_matching
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the eligible teachers of every pending lesson request'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=settings.MATCH_LIMIT,
+            help=f'Teachers stored per request, cheapest first (default: {settings.MATCH_LIMIT})',
+        )
+
+    def handle(self, *args, **options):
+        if options['limit'] < 1:
+            raise CommandError('--limit must be at least 1')
+        result = run_matching(options['limit'])
+        self.stdout.write(
+            f"{result['requests']} pending request(s), {result['matches']} match(es), "
+            f"{result['unmatched']} without an eligible teacher"
+        )
+        self.stdout.write(self.style.SUCCESS('Matches are up to date'))
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from core.scheduling import confirm_schedule, propose_schedule
+
+
+class Command(BaseCommand):
+    help = 'Propose a conflict-free booking for as many pending requests as possible from the open availabilities'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--confirm',
+            action='store_true',
+            help='Create the proposed bookings instead of only listing them',
+        )
+        parser.add_argument(
+            '--show',
+            type=int,
+            default=20,
+            help='Number of proposed bookings to list (default: 20)',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        proposals, stats = propose_schedule()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{len(proposals)} of {stats['requests']} request(s) can be booked "
+            f"from {stats['offers']} open offer(s) (solved in {elapsed:.2f} s)"
+        )
+        for proposal in proposals[:options['show']]:
+            self.stdout.write(
+                f'  request {proposal.lesson_request_id} <- availability '
+                f'{proposal.teacher_availability_id} (teacher {proposal.teacher_id})'
+            )
+        if len(proposals) > options['show']:
+            self.stdout.write(f"  ... and {len(proposals) - options['show']} more")
+
+        if options['confirm']:
+            bookings = confirm_schedule()
+            self.stdout.write(self.style.SUCCESS(f'Created {len(bookings)} booking(s)'))
+        else:
+            self.stdout.write('Run again with --confirm to create the bookings')
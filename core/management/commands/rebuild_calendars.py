@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from core.freebusy import rebuild_all
+
+
+class Command(BaseCommand):
+    help = 'Recompute the teacher free/busy bitmaps from availabilities and bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Only days on or after this date (YYYY-MM-DD); default: every day',
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError(f"Invalid --since value: {options['since']}")
+        count = rebuild_all(since)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} teacher day(s)'))
@@ -0,0 +1,63 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from core.backup import BackupError, database_path, restore
+from core.caching import clear_cache
+
+
+class Command(BaseCommand):
+    help = 'Replace the SQLite database with a backup made by backup_database (plain or gzipped)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'source',
+            help='Backup file; "-" reads it from stdin (requires --noinput)',
+        )
+        parser.add_argument(
+            '--noinput', '--no-input',
+            action='store_false',
+            dest='interactive',
+            help='Do not ask for confirmation',
+        )
+        parser.add_argument(
+            '--database',
+            default='default',
+            help='Database alias (default: default)',
+        )
+
+    def handle(self, *args, **options):
+        from_stdin = options['source'] == '-'
+        if from_stdin and options['interactive']:
+            # The confirmation prompt would read the backup's first line
+            raise CommandError('Reading the backup from stdin requires --noinput')
+        try:
+            database = database_path(options['database'])
+        except BackupError as error:
+            raise CommandError(str(error))
+        if options['interactive']:
+            confirm = input(
+                f'This will replace every row in {database} with the backup.\n'
+                "Type 'yes' to continue, or 'no' to cancel: "
+            )
+            if confirm != 'yes':
+                self.stdout.write('Restore cancelled.')
+                return
+
+        try:
+            stats = restore(
+                options['source'], alias=options['database'],
+                input_stream=sys.stdin.buffer if from_stdin else None,
+            )
+        except (BackupError, OSError) as error:
+            raise CommandError(str(error))
+
+        # Cached fragments and version stamps describe the replaced data
+        shared = clear_cache()
+        self.stdout.write(
+            f"Restored {stats['bytes'] / 1024 / 1024:.1f} MB in {stats['seconds']:.2f} s; cache cleared"
+        )
+        if not shared:
+            self.stdout.write(self.style.WARNING(
+                'The cache is local to each process: restart the running workers so they drop their cached pages'
+            ))
+        self.stdout.write(self.style.SUCCESS('Restore complete'))
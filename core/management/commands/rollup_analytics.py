@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from core.analytics import run_rollup
+
+
+class Command(BaseCommand):
+    help = 'Update the daily analytics rollups from requests and bookings changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Rebuild every day instead of only the changed ones',
+        )
+        parser.add_argument(
+            '--recent-days',
+            type=int,
+            default=0,
+            help='Also rebuild the last N days (picks up deleted rows)',
+        )
+
+    def handle(self, *args, **options):
+        days = run_rollup(full=options['full'], recent_days=options['recent_days'])
+        if days:
+            self.stdout.write(f'Rebuilt {len(days)} day(s): {days[0]} to {days[-1]}')
+        self.stdout.write(self.style.SUCCESS('Analytics rollups are up to date'))
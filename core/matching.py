@@ -0,0 +1,145 @@
+"""
+Batch request-to-teacher matching.
+
+A teacher is eligible for a pending request when they teach its topic, are
+available, and charge at most the request's max_hourly_rate. Instead of one
+query per request, every (topic, rate) pair of the available teachers is
+encoded as one sortable integer key, ``topic << 32 | rate in cents``. The
+eligible teachers of a request are then the contiguous run of keys between
+``topic << 32`` and ``topic << 32 | max rate``, found for all requests at once
+with two ``np.searchsorted`` calls. Within the run teachers are ordered by
+rate, so the first MATCH_LIMIT are the cheapest.
+
+Matches are replaced one topic at a time, each topic in its own
+transaction, so no single transaction deletes and rewrites the whole
+table; a reader sees every topic either before or after its rebuild.
+
+Only used by the match_requests and benchmark_matching commands, so web
+workers never import NumPy.
+"""
+import time
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .models import TeacherProfile, LessonRequest, LessonRequestMatch
+
+
+WRITE_BATCH = 5000
+
+
+def to_cents(values):
+    """Decimal rates -> int64 cents"""
+    return np.fromiter((int(value * 100) for value in values), dtype=np.int64, count=len(values))
+
+
+def build_index(teacher_ids, topic_ids, rates):
+    """
+    Sort the (teacher, topic, rate in cents) rows of the available teachers
+    by topic, rate and teacher id. Returns ``(keys, teacher_ids, rates)``.
+    """
+    keys = (np.asarray(topic_ids, dtype=np.int64) << 32) | np.asarray(rates, dtype=np.int64)
+    teacher_ids = np.asarray(teacher_ids, dtype=np.int64)
+    order = np.lexsort((teacher_ids, keys))
+    return keys[order], teacher_ids[order], np.asarray(rates, dtype=np.int64)[order]
+
+
+def match_arrays(index, request_topics, request_max_rates, limit):
+    """
+    Eligible teachers of every request in one vectorized pass.
+
+    Returns ``(request_positions, teacher_ids, ranks, rates, eligible)``:
+    one entry per match (positions index the request arrays, ranks start at
+    1), plus the full number of eligible teachers of each request before
+    ``limit`` is applied.
+    """
+    keys, teacher_ids, rates = index
+    topics = np.asarray(request_topics, dtype=np.int64) << 32
+    low = np.searchsorted(keys, topics, side='left')
+    high = np.searchsorted(keys, topics | np.asarray(request_max_rates, dtype=np.int64), side='right')
+    eligible = high - low
+
+    counts = np.minimum(eligible, limit)
+    positions = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    matched = low[positions] + offsets
+    return positions, teacher_ids[matched], offsets + 1, rates[matched], eligible
+
+
+def load_index():
+    """Sorted index of the available teachers' topics and rates"""
+    rows = list(
+        TeacherProfile.lesson_topics.through.objects.filter(
+            teacherprofile__is_available=True
+        ).values_list('teacherprofile__user_id', 'lessontopic_id', 'teacherprofile__hourly_rate')
+    )
+    teacher_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    topic_ids = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+    return build_index(teacher_ids, topic_ids, to_cents([row[2] for row in rows]))
+
+
+def write_matches(topic_id, request_ids, teacher_ids, ranks, rates):
+    """Replace the matches of the pending requests of one topic"""
+    with transaction.atomic():
+        LessonRequestMatch.objects.filter(lesson_request__lesson_topic_id=topic_id).delete()
+        # Built and written one batch at a time, so memory stays bounded
+        for start in range(0, len(request_ids), WRITE_BATCH):
+            end = start + WRITE_BATCH
+            LessonRequestMatch.objects.bulk_create([
+                LessonRequestMatch(
+                    lesson_request_id=request_id,
+                    teacher_id=teacher_id,
+                    rank=rank,
+                    hourly_rate=Decimal(rate).scaleb(-2),
+                )
+                for request_id, teacher_id, rank, rate in zip(
+                    request_ids[start:end].tolist(), teacher_ids[start:end].tolist(),
+                    ranks[start:end].tolist(), rates[start:end].tolist(),
+                )
+            ])
+
+
+def run_matching(limit=None):
+    """
+    Rebuild LessonRequestMatch for every pending request. Returns
+    ``{'requests': n, 'matches': n, 'unmatched': n, 'seconds': {...}}``,
+    the seconds spent loading, matching and writing.
+    """
+    limit = limit or settings.MATCH_LIMIT
+    started = time.perf_counter()
+    index = load_index()
+    rows = list(
+        LessonRequest.objects.filter(status='pending')
+        .order_by('lesson_topic_id', 'pk').values_list('pk', 'lesson_topic_id', 'max_hourly_rate')
+    )
+    request_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    topic_ids = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+    loaded = time.perf_counter()
+    positions, teacher_ids, ranks, rates, eligible = match_arrays(
+        index, topic_ids, to_cents([row[2] for row in rows]), limit
+    )
+    matched = time.perf_counter()
+
+    # Requests are sorted by topic, so each topic's matches are one slice
+    match_topics = topic_ids[positions]
+    request_ids = request_ids[positions]
+    topics = np.unique(topic_ids)
+    bounds = np.searchsorted(match_topics, topics, side='left'), np.searchsorted(match_topics, topics, side='right')
+    for topic_id, low, high in zip(topics.tolist(), *bounds):
+        write_matches(
+            topic_id, request_ids[low:high], teacher_ids[low:high], ranks[low:high], rates[low:high]
+        )
+    # Requests no longer pending, in topics without pending ones too
+    LessonRequestMatch.objects.exclude(lesson_request__status='pending').delete()
+    return {
+        'requests': len(rows),
+        'matches': len(positions),
+        'unmatched': int((eligible == 0).sum()),
+        'seconds': {
+            'load': loaded - started,
+            'match': matched - loaded,
+            'write': time.perf_counter() - matched,
+        },
+    }
@@ -0,0 +1,313 @@
+"""
+Prometheus metrics shared by all worker processes.
+
+Each process adds its counts to its own file in METRICS_DIR, mapped into
+memory: an increment is a dict lookup and an 8-byte write, with no lock
+shared between processes. The /metrics view sums the files of every
+process, so counters survive worker restarts (clear the directory when the
+whole server restarts, as Prometheus handles counter resets). At scrape
+time the files of processes that have exited are added into one aggregate
+file and deleted, so the directory does not grow with every worker ever
+started; METRICS_DIR must therefore be local to the host the workers run
+on. Gauges such as the outbox depth are read from the database at scrape
+time instead.
+
+File layout: an 8-byte header holding the bytes in use, then one entry per
+series: the key length (4 bytes), the JSON key ``[name, [[label, value],
+...]]`` padded to 8 bytes, and the value as a double. Entries are written
+before the header is updated, so a reader never sees a partial one.
+"""
+import bisect
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, Min
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils import timezone
+
+from .throttling import get_client_ip
+
+try:
+    import fcntl
+except ImportError:  # Windows: dead processes' files are kept
+    fcntl = None
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    'dyschool_http_request_duration_seconds': (
+        'histogram', 'Request latency by URL name', LATENCY_BUCKETS,
+    ),
+    'dyschool_http_request_queries': (
+        'histogram', 'SQL queries per request by URL name', QUERY_BUCKETS,
+    ),
+    'dyschool_cache_lookups_total': ('counter', 'Cache keys looked up, by key area and result', None),
+    'dyschool_lesson_requests_created_total': ('counter', 'Lesson requests created', None),
+    'dyschool_bookings_confirmed_total': ('counter', 'Lesson bookings confirmed', None),
+}
+
+INITIAL_FILE_SIZE = 64 * 1024
+# Counts of the processes that have exited, merged at scrape time
+AGGREGATE_FILE = 'aggregate.db'
+MERGE_LOCK_FILE = 'merge.lock'
+HEADER = struct.Struct('q')
+KEY_LENGTH = struct.Struct('i')
+VALUE = struct.Struct('d')
+
+
+def padded(length):
+    return length + (-length % 8)
+
+
+def read_values(data):
+    """``{key: value}`` from the contents of a metrics file"""
+    values = {}
+    if len(data) < HEADER.size:
+        return values
+    used = HEADER.unpack_from(data, 0)[0]
+    position = HEADER.size
+    while position < used:
+        length = KEY_LENGTH.unpack_from(data, position)[0]
+        key = data[position + KEY_LENGTH.size:position + KEY_LENGTH.size + length].decode()
+        position += padded(KEY_LENGTH.size + length)
+        values[key] = VALUE.unpack_from(data, position)[0]
+        position += VALUE.size
+    return values
+
+
+def encode_values(values):
+    """Contents of a metrics file holding ``{key: value}``"""
+    entries = []
+    for key, value in values.items():
+        encoded = key.encode()
+        entry = KEY_LENGTH.pack(len(encoded)) + encoded
+        entries.append(entry.ljust(padded(len(entry)), b'\0') + VALUE.pack(value))
+    body = b''.join(entries)
+    return HEADER.pack(HEADER.size + len(body)) + body
+
+
+class MetricsFile:
+    """The memory-mapped counters of one process"""
+
+    def __init__(self, path):
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.file = open(path, 'a+b')
+        size = os.fstat(self.file.fileno()).st_size
+        if size < HEADER.size:
+            size = INITIAL_FILE_SIZE
+            self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+        self.used = HEADER.unpack_from(self.map, 0)[0] or HEADER.size
+        HEADER.pack_into(self.map, 0, self.used)
+        # (name, labels) -> offset of the value
+        self.positions = {}
+        position = HEADER.size
+        while position < self.used:
+            length = KEY_LENGTH.unpack_from(self.map, position)[0]
+            name, labels = json.loads(self.map[position + KEY_LENGTH.size:position + KEY_LENGTH.size + length])
+            position += padded(KEY_LENGTH.size + length)
+            self.positions[name, tuple(map(tuple, labels))] = position
+            position += VALUE.size
+
+    def add_series(self, key):
+        encoded = json.dumps([key[0], key[1]], separators=(',', ':')).encode()
+        size = padded(KEY_LENGTH.size + len(encoded)) + VALUE.size
+        if self.used + size > len(self.map):
+            capacity = len(self.map)
+            while self.used + size > capacity:
+                capacity *= 2
+            self.map.close()
+            self.file.truncate(capacity)
+            self.map = mmap.mmap(self.file.fileno(), capacity)
+        KEY_LENGTH.pack_into(self.map, self.used, len(encoded))
+        self.map[self.used + KEY_LENGTH.size:self.used + KEY_LENGTH.size + len(encoded)] = encoded
+        position = self.used + padded(KEY_LENGTH.size + len(encoded))
+        VALUE.pack_into(self.map, position, 0.0)
+        self.used = position + VALUE.size
+        HEADER.pack_into(self.map, 0, self.used)
+        self.positions[key] = position
+        return position
+
+    def add(self, increments):
+        """Add ``[((name, labels), amount), ...]``"""
+        with self.lock:
+            for key, amount in increments:
+                position = self.positions.get(key)
+                if position is None:
+                    position = self.add_series(key)
+                VALUE.pack_into(self.map, position, VALUE.unpack_from(self.map, position)[0] + amount)
+
+
+_file = None
+_file_lock = threading.Lock()
+
+
+def metrics_file():
+    """This process's file; a forked worker opens its own"""
+    global _file
+    if _file is None or _file.pid != os.getpid():
+        with _file_lock:
+            if _file is None or _file.pid != os.getpid():
+                directory = Path(settings.METRICS_DIR)
+                directory.mkdir(parents=True, exist_ok=True)
+                _file = MetricsFile(directory / f'{os.getpid()}.db')
+    return _file
+
+
+def inc(name, amount=1, **labels):
+    """Add ``amount`` to a counter"""
+    if settings.METRICS_ENABLED:
+        metrics_file().add([((name, tuple(sorted(labels.items()))), amount)])
+
+
+def histogram_increments(name, value, labels):
+    labels = tuple(sorted(labels.items()))
+    buckets = METRICS[name][2]
+    index = bisect.bisect_left(buckets, value)
+    le = str(buckets[index]) if index < len(buckets) else '+Inf'
+    return [
+        ((f'{name}_bucket', (*labels, ('le', le))), 1),
+        ((f'{name}_sum', labels), value),
+        ((f'{name}_count', labels), 1),
+    ]
+
+
+def observe_request(view_name, seconds, queries):
+    """Record a request's latency and query count (from core.timing)"""
+    if settings.METRICS_ENABLED:
+        labels = {'view': view_name or 'unresolved'}
+        metrics_file().add([
+            *histogram_increments('dyschool_http_request_duration_seconds', seconds, labels),
+            *histogram_increments('dyschool_http_request_queries', queries, labels),
+        ])
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def merge_dead_files(directory):
+    """Add the files of exited processes into AGGREGATE_FILE and delete them"""
+    dead = [
+        path for path in directory.glob('*.db')
+        if path.stem.isdigit() and int(path.stem) != os.getpid() and not process_alive(int(path.stem))
+    ]
+    if not dead or fcntl is None:
+        return
+    with open(directory / MERGE_LOCK_FILE, 'a') as lock:
+        # Concurrent scrapes merge one at a time
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        aggregate = directory / AGGREGATE_FILE
+        values = defaultdict(float, read_values(aggregate.read_bytes()) if aggregate.exists() else {})
+        merged = []
+        for path in dead:
+            try:
+                data = path.read_bytes()
+            except FileNotFoundError:
+                # Merged by another scrape meanwhile
+                continue
+            for key, value in read_values(data).items():
+                values[key] += value
+            merged.append(path)
+        if merged:
+            partial = directory / f'{AGGREGATE_FILE}.partial'
+            partial.write_bytes(encode_values(values))
+            os.replace(partial, aggregate)
+            for path in merged:
+                path.unlink()
+
+
+def collect():
+    """``{(name, labels): value}`` summed over the files of every process"""
+    totals = defaultdict(float)
+    directory = Path(settings.METRICS_DIR)
+    if directory.is_dir():
+        merge_dead_files(directory)
+        for path in directory.glob('*.db'):
+            for key, value in read_values(path.read_bytes()).items():
+                name, labels = json.loads(key)
+                totals[name, tuple(map(tuple, labels))] += value
+    return totals
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def outbox_gauges():
+    from .models import OutboxMessage
+
+    by_status = dict(
+        OutboxMessage.objects.order_by().values_list('status').annotate(Count('pk'))
+    )
+    oldest = OutboxMessage.objects.filter(status='pending').aggregate(oldest=Min('created_at'))['oldest']
+    return [
+        ('dyschool_outbox_messages', 'gauge', 'Outbox messages by status', [
+            ((('status', status),), by_status.get(status, 0))
+            for status, _ in OutboxMessage.STATUS_CHOICES
+        ]),
+        ('dyschool_outbox_oldest_pending_seconds', 'gauge', 'Age of the oldest pending outbox message', [
+            ((), (timezone.now() - oldest).total_seconds() if oldest else 0),
+        ]),
+    ]
+
+
+def render():
+    """All metrics in the Prometheus text format"""
+    totals = collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        if kind == 'counter':
+            for (series, labels), value in sorted(totals.items()):
+                if series == name:
+                    lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+            continue
+        # Buckets are stored per bucket and reported cumulatively
+        for (series, labels), count in sorted(totals.items()):
+            if series != f'{name}_count':
+                continue
+            cumulative = 0
+            for le in (*map(str, buckets), '+Inf'):
+                cumulative += totals.get((f'{name}_bucket', (*labels, ('le', le))), 0)
+                lines.append(f'{name}_bucket{format_labels((*labels, ("le", le)))} {format_value(cumulative)}')
+            total = totals[f'{name}_sum', labels]
+            lines.append(f'{name}_sum{format_labels(labels)} {format_value(total)}')
+            lines.append(f'{name}_count{format_labels(labels)} {format_value(count)}')
+    for name, kind, help_text, samples in outbox_gauges():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        lines += [f'{name}{format_labels(labels)} {format_value(value)}' for labels, value in samples]
+    return '\n'.join(lines) + '\n'
+
+
+def metrics(request):
+    """Prometheus scrape endpoint, for the addresses in METRICS_ALLOWED_IPS"""
+    if get_client_ip(request) not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0002_lessontopic_specialization_lessonrequest_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lessonbooking',
+            index=models.Index(fields=['created_at'], name='core_lesson_created_c56e46_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lessonrequest',
+            index=models.Index(fields=['created_at'], name='core_lesson_created_aa1f38_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teacheravailability',
+            index=models.Index(fields=['available_date', 'available_time'], name='core_teache_availab_73f331_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teacherprofile',
+            index=models.Index(fields=['created_at'], name='core_teache_created_f2c780_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['date_joined'], name='core_user_date_jo_a935f6_idx'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_changelist_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTopicStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('requests_created', models.PositiveIntegerField(default=0)),
+                ('requests_matched', models.PositiveIntegerField(default=0, help_text='Requests created this day that have been matched or completed')),
+                ('requests_cancelled', models.PositiveIntegerField(default=0)),
+                ('bookings_created', models.PositiveIntegerField(default=0)),
+                ('bookings_completed', models.PositiveIntegerField(default=0)),
+                ('bookings_cancelled', models.PositiveIntegerField(default=0)),
+                ('revenue_estimate', models.DecimalField(decimal_places=2, default=0, help_text='Sum of hourly rate x duration of the non-cancelled bookings', max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Daily Topic Stats',
+                'verbose_name_plural': 'Daily Topic Stats',
+                'ordering': ['-date', 'specialization', 'lesson_topic'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Watermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('value', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Watermark',
+                'verbose_name_plural': 'Watermarks',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='lessonbooking',
+            index=models.Index(fields=['updated_at'], name='core_lesson_updated_6b6b99_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lessonrequest',
+            index=models.Index(fields=['updated_at'], name='core_lesson_updated_c7d23d_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailytopicstats',
+            name='lesson_topic',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='core.lessontopic'),
+        ),
+        migrations.AddField(
+            model_name='dailytopicstats',
+            name='specialization',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='core.specialization'),
+        ),
+        migrations.AddIndex(
+            model_name='dailytopicstats',
+            index=models.Index(fields=['specialization', 'date'], name='core_dailyt_special_c2c8fa_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailytopicstats',
+            unique_together={('date', 'lesson_topic')},
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeacherNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('similar', 'Similar teachers'), ('also_booked', 'Students also booked')], max_length=12)),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Teacher Neighbor',
+                'verbose_name_plural': 'Teacher Neighbors',
+                'ordering': ['teacher', 'kind', 'rank'],
+                'unique_together': {('teacher', 'kind', 'rank')},
+            },
+        ),
+    ]
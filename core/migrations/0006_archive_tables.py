@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_teacher_neighbors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedLessonRequest',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('lesson_duration', models.PositiveIntegerField(help_text='Duration in minutes')),
+                ('max_hourly_rate', models.DecimalField(decimal_places=2, help_text='Maximum hourly rate student can pay', max_digits=8)),
+                ('additional_notes', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('matched', 'Matched'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('lesson_topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_lesson_requests', to='core.lessontopic')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_lesson_requests', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Archived Lesson Request',
+                'verbose_name_plural': 'Archived Lesson Requests',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTeacherAvailability',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('available_date', models.DateField()),
+                ('available_time', models.TimeField()),
+                ('duration', models.PositiveIntegerField(help_text='Duration in minutes')),
+                ('is_accepted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('lesson_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='teacher_availabilities', to='core.archivedlessonrequest')),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_availabilities', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Archived Teacher Availability',
+                'verbose_name_plural': 'Archived Teacher Availabilities',
+                'ordering': ['available_date', 'available_time'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedLessonBooking',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('confirmed', 'Confirmed'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to=settings.AUTH_USER_MODEL)),
+                ('lesson_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='core.archivedlessonrequest')),
+                ('teacher_availability', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking', to='core.archivedteacheravailability')),
+            ],
+            options={
+                'verbose_name': 'Archived Lesson Booking',
+                'verbose_name_plural': 'Archived Lesson Bookings',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedlessonrequest',
+            index=models.Index(fields=['created_at'], name='core_archiv_created_6eafe0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedlessonrequest',
+            index=models.Index(fields=['student', 'created_at'], name='core_archiv_student_63d4aa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedlessonbooking',
+            index=models.Index(fields=['created_at'], name='core_archiv_created_2611e7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedlessonbooking',
+            index=models.Index(fields=['teacher', 'created_at'], name='core_archiv_teacher_ab1dda_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonRequestMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('hourly_rate', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('lesson_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='core.lessonrequest')),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='request_matches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Lesson Request Match',
+                'verbose_name_plural': 'Lesson Request Matches',
+                'ordering': ['lesson_request', 'rank'],
+                'indexes': [models.Index(fields=['teacher', 'lesson_request'], name='core_lesson_teacher_56ecd9_idx')],
+                'unique_together': {('lesson_request', 'rank')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_lesson_request_matches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeacherDayCalendar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('booked', models.BinaryField(max_length=36)),
+                ('offered', models.BinaryField(max_length=36)),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='day_calendars', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Teacher Day Calendar',
+                'verbose_name_plural': 'Teacher Day Calendars',
+                'indexes': [models.Index(fields=['date'], name='core_teache_date_d6923f_idx')],
+                'unique_together': {('teacher', 'date')},
+            },
+        ),
+    ]
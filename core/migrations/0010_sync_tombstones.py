@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_teacher_day_calendars'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.CharField(choices=[('requests', 'Lesson request'), ('availabilities', 'Teacher availability'), ('bookings', 'Lesson booking')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('student_id', models.BigIntegerField(blank=True, null=True)),
+                ('teacher_id', models.BigIntegerField(blank=True, null=True)),
+                ('lesson_topic_id', models.BigIntegerField(blank=True, null=True)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Tombstone',
+                'verbose_name_plural': 'Tombstones',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='lessonbooking',
+            index=models.Index(fields=['teacher', 'updated_at'], name='core_lesson_teacher_0e870d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lessonrequest',
+            index=models.Index(fields=['student', 'updated_at'], name='core_lesson_student_2d6fca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lessonrequest',
+            index=models.Index(fields=['lesson_topic', 'updated_at'], name='core_lesson_lesson__3ea667_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teacheravailability',
+            index=models.Index(fields=['updated_at'], name='core_teache_updated_1a052b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teacheravailability',
+            index=models.Index(fields=['teacher', 'updated_at'], name='core_teache_teacher_b6df72_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['deleted_at'], name='core_tombst_deleted_51085d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['student_id', 'deleted_at'], name='core_tombst_student_2b1707_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['teacher_id', 'deleted_at'], name='core_tombst_teacher_70d575_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['lesson_topic_id', 'deleted_at'], name='core_tombst_lesson__7d31c4_idx'),
+        ),
+    ]
@@ -68,6 +68,9 @@ class User(AbstractUser):
     class Meta:
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        indexes = [
+            models.Index(fields=['date_joined']),
+        ]
     
     def __str__(self):
         return f"{self.get_full_name()} ({self.get_user_type_display()})"
@@ -164,6 +167,9 @@ class TeacherProfile(models.Model):
     class Meta:
         verbose_name = 'Teacher Profile'
         verbose_name_plural = 'Teacher Profiles'
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
     
     def __str__(self):
         return f"{self.user.get_full_name()} - Teacher Profile"
@@ -211,6 +217,13 @@ class LessonRequest(models.Model):
         verbose_name = 'Lesson Request'
         verbose_name_plural = 'Lesson Requests'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['updated_at']),
+            # Delta sync (core.sync) of a student's and a topic's requests
+            models.Index(fields=['student', 'updated_at']),
+            models.Index(fields=['lesson_topic', 'updated_at']),
+        ]
     
     def __str__(self):
         return f"{self.student.get_full_name()} - {self.lesson_topic.name}"
@@ -244,6 +257,11 @@ class TeacherAvailability(models.Model):
         verbose_name_plural = 'Teacher Availabilities'
         ordering = ['available_date', 'available_time']
         unique_together = ['teacher', 'lesson_request', 'available_date', 'available_time']
+        indexes = [
+            models.Index(fields=['available_date', 'available_time']),
+            models.Index(fields=['updated_at']),
+            models.Index(fields=['teacher', 'updated_at']),
+        ]
     
     def __str__(self):
         return f"{self.teacher.get_full_name()} - {self.available_date} {self.available_time}"
@@ -286,6 +304,396 @@ class LessonBooking(models.Model):
         verbose_name = 'Lesson Booking'
         verbose_name_plural = 'Lesson Bookings'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['updated_at']),
+            models.Index(fields=['teacher', 'updated_at']),
+        ]
     
     def __str__(self):
         return f"{self.lesson_request.student.get_full_name()} with {self.teacher.get_full_name()}"
+
+
+class Watermark(models.Model):
+    """
+    Position reached by an incremental batch job (e.g. the analytics rollup),
+    so the next run only processes rows changed after it
+    """
+    name = models.CharField(max_length=100, unique=True)
+    value = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Watermark'
+        verbose_name_plural = 'Watermarks'
+    
+    def __str__(self):
+        return f"{self.name} @ {self.value}"
+
+
+class DailyTopicStats(models.Model):
+    """
+    Pre-aggregated daily activity per lesson topic, maintained by the
+    rollup_analytics command. Requests are counted on the day they were
+    created, bookings on the day they were confirmed.
+    """
+    date = models.DateField()
+    lesson_topic = models.ForeignKey(
+        LessonTopic,
+        on_delete=models.CASCADE,
+        related_name='daily_stats'
+    )
+    specialization = models.ForeignKey(
+        Specialization,
+        on_delete=models.CASCADE,
+        related_name='daily_stats'
+    )
+    requests_created = models.PositiveIntegerField(default=0)
+    requests_matched = models.PositiveIntegerField(
+        default=0,
+        help_text='Requests created this day that have been matched or completed'
+    )
+    requests_cancelled = models.PositiveIntegerField(default=0)
+    bookings_created = models.PositiveIntegerField(default=0)
+    bookings_completed = models.PositiveIntegerField(default=0)
+    bookings_cancelled = models.PositiveIntegerField(default=0)
+    revenue_estimate = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        help_text='Sum of hourly rate x duration of the non-cancelled bookings'
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Daily Topic Stats'
+        verbose_name_plural = 'Daily Topic Stats'
+        ordering = ['-date', 'specialization', 'lesson_topic']
+        unique_together = ['date', 'lesson_topic']
+        indexes = [
+            models.Index(fields=['specialization', 'date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} - {self.lesson_topic_id}"
+    
+    @property
+    def conversion_rate(self):
+        """Share of the day's requests that were matched"""
+        if not self.requests_created:
+            return 0.0
+        return self.requests_matched / self.requests_created
+
+
+class TeacherNeighbor(models.Model):
+    """
+    Precomputed top-K related teachers, rebuilt by build_recommendations.
+    
+    'similar' ranks teachers by overlap of lesson topics and shared
+    students; 'also_booked' by how often the same students booked both.
+    """
+    KIND_CHOICES = [
+        ('similar', 'Similar teachers'),
+        ('also_booked', 'Students also booked'),
+    ]
+    
+    teacher = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES)
+    rank = models.PositiveSmallIntegerField()
+    neighbor = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    score = models.FloatField()
+    
+    class Meta:
+        verbose_name = 'Teacher Neighbor'
+        verbose_name_plural = 'Teacher Neighbors'
+        ordering = ['teacher', 'kind', 'rank']
+        unique_together = ['teacher', 'kind', 'rank']
+    
+    def __str__(self):
+        return f"{self.teacher_id} -> {self.neighbor_id} ({self.kind} #{self.rank})"
+
+
+class ArchivedLessonRequest(models.Model):
+    """
+    Closed lesson request moved out of LessonRequest by archive_requests.
+    
+    Archive models keep the original primary keys and field names, so
+    history pages and the rollups query them like the live tables.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    student = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_lesson_requests'
+    )
+    lesson_topic = models.ForeignKey(
+        LessonTopic,
+        on_delete=models.CASCADE,
+        related_name='archived_lesson_requests'
+    )
+    lesson_duration = models.PositiveIntegerField(
+        help_text='Duration in minutes'
+    )
+    max_hourly_rate = models.DecimalField(
+        max_digits=8,
+        decimal_places=2,
+        help_text='Maximum hourly rate student can pay'
+    )
+    additional_notes = models.TextField(blank=True)
+    status = models.CharField(
+        max_length=20,
+        choices=LessonRequest.STATUS_CHOICES
+    )
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = 'Archived Lesson Request'
+        verbose_name_plural = 'Archived Lesson Requests'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['student', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.student_id} - {self.lesson_topic_id} (archived)"
+
+
+class ArchivedTeacherAvailability(models.Model):
+    """
+    Availability of an archived lesson request
+    """
+    id = models.BigIntegerField(primary_key=True)
+    teacher = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_availabilities'
+    )
+    lesson_request = models.ForeignKey(
+        ArchivedLessonRequest,
+        on_delete=models.CASCADE,
+        related_name='teacher_availabilities'
+    )
+    available_date = models.DateField()
+    available_time = models.TimeField()
+    duration = models.PositiveIntegerField(
+        help_text='Duration in minutes'
+    )
+    is_accepted = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = 'Archived Teacher Availability'
+        verbose_name_plural = 'Archived Teacher Availabilities'
+        ordering = ['available_date', 'available_time']
+    
+    def __str__(self):
+        return f"{self.teacher_id} - {self.available_date} {self.available_time} (archived)"
+
+
+class ArchivedLessonBooking(models.Model):
+    """
+    Booking of an archived lesson request
+    """
+    id = models.BigIntegerField(primary_key=True)
+    lesson_request = models.ForeignKey(
+        ArchivedLessonRequest,
+        on_delete=models.CASCADE,
+        related_name='bookings'
+    )
+    teacher = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_bookings'
+    )
+    teacher_availability = models.ForeignKey(
+        ArchivedTeacherAvailability,
+        on_delete=models.CASCADE,
+        related_name='booking'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=LessonBooking.STATUS_CHOICES
+    )
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = 'Archived Lesson Booking'
+        verbose_name_plural = 'Archived Lesson Bookings'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['teacher', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.lesson_request_id} with {self.teacher_id} (archived)"
+
+
+class OutboxMessage(models.Model):
+    """
+    Notification written in the same transaction as the change that caused
+    it, and delivered later by the deliver_notifications worker. One row per
+    recipient, or one event row without a recipient that the worker expands
+    into those; ``dedup_key`` makes enqueueing the same notification twice a
+    no-op.
+    """
+    EVENT_CHOICES = [
+        ('lesson_request_direct', 'Lesson request sent to this teacher'),
+        ('lesson_request_created', 'New lesson request for a topic'),
+        ('availability_submitted', 'Availability submitted'),
+        ('booking_confirmed', 'Booking confirmed'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+        ('skipped', 'Skipped'),
+    ]
+    
+    event = models.CharField(max_length=30, choices=EVENT_CHOICES)
+    recipient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='outbox_messages',
+        blank=True,
+        null=True,
+        help_text='Empty for an event the worker expands into per-recipient messages'
+    )
+    dedup_key = models.CharField(max_length=100, unique=True)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='pending'
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(
+        help_text='When the message is next due; claim time while sending'
+    )
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        verbose_name = 'Outbox Message'
+        verbose_name_plural = 'Outbox Messages'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.event} -> {self.recipient_id} ({self.status})"
+
+
+class LessonRequestMatch(models.Model):
+    """
+    Teacher eligible for a pending lesson request (teaches the topic, is
+    available and charges at most the request's max_hourly_rate), written
+    by match_requests. Up to MATCH_LIMIT teachers per request, cheapest
+    first.
+    """
+    lesson_request = models.ForeignKey(
+        LessonRequest,
+        on_delete=models.CASCADE,
+        related_name='matches'
+    )
+    teacher = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='request_matches'
+    )
+    rank = models.PositiveSmallIntegerField()
+    hourly_rate = models.DecimalField(max_digits=8, decimal_places=2)
+    
+    class Meta:
+        verbose_name = 'Lesson Request Match'
+        verbose_name_plural = 'Lesson Request Matches'
+        ordering = ['lesson_request', 'rank']
+        unique_together = ['lesson_request', 'rank']
+        indexes = [
+            models.Index(fields=['teacher', 'lesson_request']),
+        ]
+    
+    def __str__(self):
+        return f"{self.lesson_request_id} -> {self.teacher_id} (#{self.rank})"
+
+
+class TeacherDayCalendar(models.Model):
+    """
+    Free/busy bitmaps of one teacher for one day in 5-minute slots: bit i
+    covers 00:00 + 5*i minutes. ``booked`` holds confirmed lessons,
+    ``offered`` availabilities not accepted yet. Kept in sync by signals;
+    see core.freebusy.
+    """
+    teacher = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='day_calendars'
+    )
+    date = models.DateField()
+    booked = models.BinaryField(max_length=36)
+    offered = models.BinaryField(max_length=36)
+    
+    class Meta:
+        verbose_name = 'Teacher Day Calendar'
+        verbose_name_plural = 'Teacher Day Calendars'
+        unique_together = ['teacher', 'date']
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.teacher_id} - {self.date}"
+
+
+class Tombstone(models.Model):
+    """
+    Record of a deleted (or archived) lesson request, availability or
+    booking, so delta-sync clients learn about deletes (see core.sync). Ids
+    are plain integers: the users and topics may be gone too. Purged after
+    SYNC_TOMBSTONE_RETENTION_DAYS.
+    """
+    RESOURCE_CHOICES = [
+        ('requests', 'Lesson request'),
+        ('availabilities', 'Teacher availability'),
+        ('bookings', 'Lesson booking'),
+    ]
+    
+    resource = models.CharField(max_length=20, choices=RESOURCE_CHOICES)
+    object_id = models.BigIntegerField()
+    student_id = models.BigIntegerField(blank=True, null=True)
+    teacher_id = models.BigIntegerField(blank=True, null=True)
+    lesson_topic_id = models.BigIntegerField(blank=True, null=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Tombstone'
+        verbose_name_plural = 'Tombstones'
+        indexes = [
+            models.Index(fields=['deleted_at']),
+            models.Index(fields=['student_id', 'deleted_at']),
+            models.Index(fields=['teacher_id', 'deleted_at']),
+            models.Index(fields=['lesson_topic_id', 'deleted_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.resource} #{self.object_id}"
@@ -0,0 +1,279 @@
+"""
+Transactional outbox for email notifications.
+
+Views call the ``*_created``/``*_submitted``/``*_confirmed`` helpers inside
+the same transaction as the write they describe, so a notification exists
+if and only if the change was committed. The deliver_notifications worker
+then claims due rows in batches, sends one digest email per recipient over
+a single mail connection, and retries failures with exponential backoff.
+
+Notifications to many users are written as one event row without a
+recipient, so the request stays O(1) however many teachers teach a topic;
+the worker expands it into one message per recipient (see EXPANDERS).
+
+Delivery is at-least-once: a worker that dies after sending but before
+marking its rows leaves them to be claimed again once OUTBOX_CLAIM_TIMEOUT
+has passed. That re-claim counts as an attempt, so a message that crashes
+the worker gives up after OUTBOX_MAX_ATTEMPTS like any other failure.
+"""
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import LessonRequest, OutboxMessage, User
+
+
+# Line shown in the email for each event
+EVENT_TEXT = {
+    'lesson_request_direct': '{student} pediu uma aula de {topic} com você ({duration} min, até R$ {max_hourly_rate}/h).',
+    'lesson_request_created': 'Nova solicitação de aula de {topic} ({duration} min, até R$ {max_hourly_rate}/h) de {student}.',
+    'availability_submitted': '{teacher} enviou disponibilidade para {topic}: {date} às {time}.',
+    'booking_confirmed': '{student} confirmou a aula de {topic} em {date} às {time}.',
+}
+
+
+def enqueue(event, recipient_ids, key, payload):
+    """
+    Write one pending message per recipient. ``key`` identifies the
+    notification (e.g. ``lesson_request:42``); a recipient already queued
+    for it is skipped.
+    """
+    now = timezone.now()
+    OutboxMessage.objects.bulk_create(
+        [
+            OutboxMessage(
+                event=event,
+                recipient_id=recipient_id,
+                dedup_key=f'{key}:{recipient_id}',
+                payload=payload,
+                next_attempt_at=now,
+            )
+            for recipient_id in recipient_ids
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+def enqueue_event(event, key, payload):
+    """Write one event row for the worker to expand into per-recipient messages"""
+    OutboxMessage.objects.bulk_create(
+        [OutboxMessage(
+            event=event,
+            dedup_key=f'{key}:all',
+            payload={**payload, 'key': key},
+            next_attempt_at=timezone.now(),
+        )],
+        ignore_conflicts=True,
+    )
+
+
+def lesson_request_created(lesson_request, teacher):
+    """Notify the chosen teacher now and every other eligible teacher through an event"""
+    payload = {
+        'lesson_request_id': lesson_request.pk,
+        'student': lesson_request.student.get_full_name_or_username(),
+        'topic': lesson_request.lesson_topic.name,
+        'duration': lesson_request.lesson_duration,
+        'max_hourly_rate': str(lesson_request.max_hourly_rate),
+        'path': reverse('teacher_dashboard'),
+    }
+    key = f'lesson_request:{lesson_request.pk}'
+    # The topic fan-out shares the key, so it skips the chosen teacher
+    enqueue('lesson_request_direct', [teacher.pk], key, payload)
+    enqueue_event('lesson_request_created', key, payload)
+
+
+def lesson_request_recipients(payload):
+    """Teachers eligible for a still-pending request, at delivery time"""
+    lesson_request = LessonRequest.objects.filter(
+        pk=payload['lesson_request_id'], status='pending'
+    ).first()
+    if lesson_request is None:
+        return User.objects.none()
+    return User.objects.filter(
+        teacher_profile__lesson_topics=lesson_request.lesson_topic_id,
+        teacher_profile__is_available=True,
+        teacher_profile__hourly_rate__lte=lesson_request.max_hourly_rate,
+    ).exclude(
+        email=''
+    ).exclude(
+        pk=lesson_request.student_id
+    ).values_list('pk', flat=True)
+
+
+# Event -> function returning the recipient ids of an event row's payload
+EXPANDERS = {
+    'lesson_request_created': lesson_request_recipients,
+}
+
+
+def availability_submitted(availability):
+    """Tell the student a teacher answered their request"""
+    lesson_request = availability.lesson_request
+    enqueue('availability_submitted', [lesson_request.student_id], f'availability:{availability.pk}', {
+        'teacher': availability.teacher.get_full_name_or_username(),
+        'topic': lesson_request.lesson_topic.name,
+        'date': availability.available_date.strftime('%d/%m/%Y'),
+        'time': availability.available_time.strftime('%H:%M'),
+        'path': reverse('student_dashboard'),
+    })
+
+
+def booking_confirmed(booking):
+    """Tell the teacher the student accepted their availability"""
+    availability = booking.teacher_availability
+    lesson_request = booking.lesson_request
+    enqueue('booking_confirmed', [booking.teacher_id], f'booking:{booking.pk}', {
+        'student': lesson_request.student.get_full_name_or_username(),
+        'topic': lesson_request.lesson_topic.name,
+        'date': availability.available_date.strftime('%d/%m/%Y'),
+        'time': availability.available_time.strftime('%H:%M'),
+        'path': reverse('teacher_dashboard'),
+    })
+
+
+def claim_batch(batch_size):
+    """
+    Mark up to ``batch_size`` due messages as sending and return them.
+
+    The claim time doubles as the claim token: only rows this call updated
+    carry it, so concurrent workers never send the same row twice. Rows
+    re-claimed from a worker that died count that send as an attempt.
+    """
+    now = timezone.now()
+    pending = Q(status='pending', next_attempt_at__lte=now)
+    stale = Q(status='sending', next_attempt_at__lte=now - timedelta(seconds=settings.OUTBOX_CLAIM_TIMEOUT))
+    with transaction.atomic():
+        ids = list(
+            OutboxMessage.objects.filter(pending | stale).order_by('next_attempt_at')
+            .select_for_update(skip_locked=True).values_list('pk', flat=True)[:batch_size]
+        )
+        OutboxMessage.objects.filter(
+            stale, pk__in=ids, attempts__gte=settings.OUTBOX_MAX_ATTEMPTS - 1
+        ).update(
+            status='failed', attempts=F('attempts') + 1, next_attempt_at=now,
+            last_error='The worker stopped while sending',
+        )
+        OutboxMessage.objects.filter(stale, pk__in=ids).update(
+            status='sending', attempts=F('attempts') + 1, next_attempt_at=now
+        )
+        OutboxMessage.objects.filter(pending, pk__in=ids).update(status='sending', next_attempt_at=now)
+    return list(
+        OutboxMessage.objects.filter(pk__in=ids, status='sending', next_attempt_at=now)
+        .select_related('recipient').order_by('recipient_id', 'created_at')
+    )
+
+
+def expand_events(events):
+    """
+    Replace claimed event rows by one message per recipient; a row that
+    fails is retried like a failed send. Returns the number expanded.
+    """
+    expanded = 0
+    for event in events:
+        payload = {name: value for name, value in event.payload.items() if name != 'key'}
+        try:
+            with transaction.atomic():
+                recipients = EXPANDERS[event.event](payload)
+                enqueue(event.event, recipients.iterator(), event.payload['key'], payload)
+                OutboxMessage.objects.filter(pk=event.pk).update(
+                    status='sent', sent_at=timezone.now(), last_error=''
+                )
+        except Exception as error:
+            mark_failed([event], repr(error))
+        else:
+            expanded += 1
+    return expanded
+
+
+def build_email(recipient, messages):
+    """One digest email with a line per message"""
+    lines = [EVENT_TEXT[message.event].format(**message.payload) for message in messages]
+    paths = sorted({message.payload.get('path') for message in messages if message.payload.get('path')})
+    if len(lines) == 1:
+        subject = f'Dyschool: {lines[0]}'
+    else:
+        subject = f'Dyschool: {len(lines)} novas notificações'
+    body = render_to_string('core/emails/notifications.txt', {
+        'recipient': recipient,
+        'lines': lines,
+        'links': [settings.SITE_URL.rstrip('/') + path for path in paths],
+    })
+    return EmailMessage(subject[:150], body, to=[recipient.email])
+
+
+def mark_failed(messages, error):
+    """Schedule a retry with exponential backoff, or give up after OUTBOX_MAX_ATTEMPTS"""
+    now = timezone.now()
+    for message in messages:
+        attempts = message.attempts + 1
+        if attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            status, next_attempt_at = 'failed', now
+        else:
+            delay = settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+            status, next_attempt_at = 'pending', now + timedelta(seconds=delay)
+        OutboxMessage.objects.filter(pk=message.pk).update(
+            status=status, attempts=attempts, next_attempt_at=next_attempt_at, last_error=error[:2000]
+        )
+
+
+def deliver_batch(batch_size=None):
+    """
+    Claim and deliver one batch. Returns ``{'sent': n, 'retry': n,
+    'skipped': n, 'expanded': n}``, counted in messages (events for
+    ``expanded``).
+    """
+    messages = claim_batch(batch_size or settings.OUTBOX_BATCH_SIZE)
+    result = {'sent': 0, 'retry': 0, 'skipped': 0, 'expanded': 0}
+    result['expanded'] = expand_events([message for message in messages if message.recipient_id is None])
+    messages = [message for message in messages if message.recipient_id is not None]
+    if not messages:
+        return result
+
+    skipped = [message.pk for message in messages if not message.recipient.email]
+    OutboxMessage.objects.filter(pk__in=skipped).update(status='skipped', last_error='Recipient has no email')
+    result['skipped'] = len(skipped)
+
+    sent = []
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as error:
+        mark_failed([message for message in messages if message.pk not in skipped], repr(error))
+        result['retry'] = len(messages) - len(skipped)
+        return result
+    try:
+        for _, group in groupby(messages, key=lambda message: message.recipient_id):
+            group = [message for message in group if message.recipient.email]
+            if not group:
+                continue
+            try:
+                connection.send_messages([build_email(group[0].recipient, group)])
+            except Exception as error:
+                mark_failed(group, repr(error))
+                result['retry'] += len(group)
+            else:
+                sent.extend(message.pk for message in group)
+    finally:
+        connection.close()
+
+    OutboxMessage.objects.filter(pk__in=sent).update(status='sent', sent_at=timezone.now(), last_error='')
+    result['sent'] = len(sent)
+    return result
+
+
+def purge_delivered(days):
+    """Delete sent and skipped messages older than ``days``; returns the count"""
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = OutboxMessage.objects.filter(
+        status__in=['sent', 'skipped'], created_at__lt=cutoff
+    ).delete()
+    return deleted
@@ -0,0 +1,121 @@
+"""
+Hourly-rate distribution of available teachers per lesson topic and per
+specialization, used to suggest realistic maximum rates to students.
+
+All groups are summarised in one vectorized NumPy pass and the result is
+cached under the taxonomy and teacher-profile versions, so pages and the
+AJAX endpoints read it without touching the database until a profile or
+the taxonomy changes. NumPy is only imported when the stats are rebuilt.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .caching import get_versions
+from .models import TeacherProfile
+
+
+def summarize(group_ids, rates, edges):
+    """
+    Count, min/max, p10/p50/p90 and histogram of ``rates`` per group.
+
+    ``group_ids`` and ``rates`` are parallel arrays; returns a dict keyed by
+    group id.
+    """
+    import numpy as np
+
+    if not len(rates):
+        return {}
+    order = np.lexsort((rates, group_ids))
+    groups = group_ids[order]
+    rates = rates[order]
+    keys, starts, counts = np.unique(groups, return_index=True, return_counts=True)
+
+    def percentile(q):
+        # Linear interpolation between the closest ranks, like np.percentile
+        position = starts + q * (counts - 1)
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        return rates[low] + (rates[high] - rates[low]) * (position - low)
+
+    p10, p50, p90 = percentile(0.1), percentile(0.5), percentile(0.9)
+    minimum = rates[starts]
+    maximum = rates[starts + counts - 1]
+
+    bins = np.clip(np.searchsorted(edges, rates, side='right') - 1, 0, len(edges) - 2)
+    histogram = np.zeros((len(keys), len(edges) - 1), dtype=np.int64)
+    np.add.at(histogram, (np.repeat(np.arange(len(keys)), counts), bins), 1)
+
+    return {
+        int(key): {
+            'count': int(counts[i]),
+            'min': round(float(minimum[i]), 2),
+            'p10': round(float(p10[i]), 2),
+            'p50': round(float(p50[i]), 2),
+            'p90': round(float(p90[i]), 2),
+            'max': round(float(maximum[i]), 2),
+            'histogram': histogram[i].tolist(),
+        }
+        for i, key in enumerate(keys.tolist())
+    }
+
+
+def compute_price_stats():
+    import numpy as np
+
+    available = TeacherProfile.objects.filter(is_available=True)
+    by_topic = np.array(
+        list(TeacherProfile.lesson_topics.through.objects.filter(
+            teacherprofile__in=available
+        ).values_list('lessontopic_id', 'teacherprofile__hourly_rate')),
+        dtype=np.float64,
+    ).reshape(-1, 2)
+    by_specialization = np.array(
+        list(TeacherProfile.specializations.through.objects.filter(
+            teacherprofile__in=available
+        ).values_list('specialization_id', 'teacherprofile__hourly_rate')),
+        dtype=np.float64,
+    ).reshape(-1, 2)
+
+    # Shared bin edges so histograms of different topics are comparable
+    all_rates = np.concatenate([by_topic[:, 1], by_specialization[:, 1]])
+    if len(all_rates):
+        edges = np.linspace(all_rates.min(), all_rates.max(), settings.PRICE_HISTOGRAM_BINS + 1)
+        if edges[0] == edges[-1]:
+            edges = np.linspace(edges[0], edges[0] + 1, settings.PRICE_HISTOGRAM_BINS + 1)
+    else:
+        edges = np.zeros(settings.PRICE_HISTOGRAM_BINS + 1)
+
+    return {
+        'bins': [round(float(edge), 2) for edge in edges],
+        'topics': summarize(by_topic[:, 0].astype(np.int64), by_topic[:, 1], edges),
+        'specializations': summarize(
+            by_specialization[:, 0].astype(np.int64), by_specialization[:, 1], edges
+        ),
+    }
+
+
+def get_price_stats():
+    """
+    Cached rate distribution: ``{'bins': [...], 'topics': {id: stats},
+    'specializations': {id: stats}}``
+    """
+    versions = get_versions(['taxonomy', 'teacher_profiles'])
+    key = 'price_stats:{taxonomy}:{teacher_profiles}'.format(**versions)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_price_stats()
+        cache.set(key, stats, settings.PRICE_STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def price_stats_for(lesson_topic_id=None, specialization_id=None):
+    """Stats for a topic, falling back to the specialization; None if unknown"""
+    stats = get_price_stats()
+    for group, group_id in (('topics', lesson_topic_id), ('specializations', specialization_id)):
+        try:
+            found = stats[group].get(int(group_id)) if group_id else None
+        except (TypeError, ValueError):
+            found = None
+        if found:
+            return found
+    return None
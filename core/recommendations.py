@@ -0,0 +1,101 @@
+"""
+Related-teacher recommendations.
+
+A batch job (build_recommendations) turns the teacher/topic assignments and
+the booking history into matrices, scores teacher pairs with NumPy and keeps
+only the top K neighbours of each teacher in TeacherNeighbor. Pages then
+read the neighbours with a single indexed query.
+
+Scores:
+
+* topic similarity - cosine similarity of the teachers' topic vectors,
+  counted from sparse teacher/topic index arrays;
+* co-booking - cosine similarity of the teachers' student vectors, built
+  from the pairs of teachers each student booked;
+* 'similar' mixes both, 'also_booked' uses co-booking only.
+
+The scoring itself lives in core.similarity.
+"""
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .caching import bump_version
+from .models import TeacherProfile, LessonBooking, TeacherNeighbor, Watermark
+
+
+WATERMARK_NAME = 'recommendations'
+
+# Rows per DELETE when replacing the neighbours of many teachers
+DELETE_BATCH = 500
+
+
+def build_recommendations(k=10, full=False):
+    """
+    Refresh TeacherNeighbor. Incremental runs only rewrite the teachers
+    affected by changes since the last run. Returns the number of teachers
+    whose neighbour lists were rewritten.
+    """
+    from .similarity import build_neighbors, changed_teacher_rows, load_matrices
+
+    started = timezone.now()
+    watermark = Watermark.objects.filter(name=WATERMARK_NAME).first()
+    full = full or watermark is None
+
+    teacher_ids, topics, cobook, degree = load_matrices()
+    if full:
+        rows = range(len(teacher_ids))
+    else:
+        rows = changed_teacher_rows(teacher_ids, topics, watermark.value)
+
+    neighbors = build_neighbors(teacher_ids, topics, cobook, degree, rows, k)
+    with transaction.atomic():
+        if full:
+            TeacherNeighbor.objects.all().delete()
+        else:
+            # Teachers without a profile any more
+            TeacherNeighbor.objects.exclude(
+                teacher_id__in=TeacherProfile.objects.values('user_id')
+            ).delete()
+            stale_ids = teacher_ids[rows].tolist()
+            for start in range(0, len(stale_ids), DELETE_BATCH):
+                TeacherNeighbor.objects.filter(
+                    teacher_id__in=stale_ids[start:start + DELETE_BATCH]
+                ).delete()
+        TeacherNeighbor.objects.bulk_create(neighbors, batch_size=2000)
+        Watermark.objects.update_or_create(name=WATERMARK_NAME, defaults={'value': started})
+    # Pages showing recommendations (and their ETags) are keyed on this
+    bump_version('recommendations')
+    return len(rows)
+
+
+def similar_teachers(teacher, limit=5):
+    """Teachers similar to ``teacher``, with their profiles, in one query"""
+    return [
+        row.neighbor for row in TeacherNeighbor.objects.filter(
+            teacher=teacher, kind='similar', neighbor__teacher_profile__is_available=True
+        ).select_related('neighbor__teacher_profile').order_by('rank')[:limit]
+    ]
+
+
+def also_booked_for_student(student, limit=5):
+    """
+    Teachers booked by students who booked the same teachers as ``student``,
+    excluding teachers the student already booked, in one query
+    """
+    booked = LessonBooking.objects.filter(lesson_request__student=student).values('teacher_id')
+    rows = TeacherNeighbor.objects.filter(
+        teacher_id__in=booked, kind='also_booked', neighbor__teacher_profile__is_available=True
+    ).exclude(
+        Q(neighbor_id__in=booked)
+    ).select_related('neighbor__teacher_profile').order_by('rank', '-score')
+
+    teachers = []
+    seen = set()
+    for row in rows[:limit * 4]:
+        if row.neighbor_id not in seen:
+            seen.add(row.neighbor_id)
+            teachers.append(row.neighbor)
+        if len(teachers) == limit:
+            break
+    return teachers
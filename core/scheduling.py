@@ -0,0 +1,247 @@
+"""
+Schedule optimizer for pending lesson requests.
+
+Every open availability is an offer for one request at a fixed time. The
+solver picks at most one offer per request so that no teacher and no
+student ends up with two overlapping lessons (confirmed bookings count as
+fixed), maximizing the number of requests booked.
+
+It is a bipartite matching between requests and offers, solved with
+augmenting paths (Kuhn's algorithm) in which an offer is free when its
+interval does not overlap any interval already assigned to its teacher or
+student. An augmenting step may displace the one assigned offer it overlaps
+and re-route that request. The result is exact when overlapping offers of
+a teacher share the same slot, and a maximal near-optimal schedule
+otherwise. Requests with the fewest offers go first and offers are tried by
+earliest end, the greedy order that is optimal for a single teacher.
+"""
+from bisect import bisect_right, insort
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import outbox
+from .freebusy import is_free
+from .models import User, LessonRequest, TeacherAvailability, LessonBooking
+
+
+# Depth of displacement chains followed by one augmenting search
+MAX_DEPTH = 25
+
+Offer = namedtuple('Offer', 'id request_id teacher_id student_id start end')
+
+
+class BookingConflict(Exception):
+    """The availability can no longer be booked; the message says why"""
+
+
+def to_minutes(day, at):
+    """Minutes since 0001-01-01 of a date and time"""
+    return day.toordinal() * 1440 + at.hour * 60 + at.minute
+
+
+class Timeline:
+    """Non-overlapping intervals of one teacher or student, sorted by start"""
+
+    def __init__(self):
+        self.intervals = []  # (start, end, offer index, or -1 for fixed)
+
+    def overlapping(self, start, end):
+        """Owners of the intervals overlapping [start, end)"""
+        intervals = self.intervals
+        # Intervals never overlap, so ends are sorted like starts
+        position = bisect_right(intervals, (start, float('inf'), 0)) - 1
+        position = max(position, 0)
+        owners = []
+        while position < len(intervals) and intervals[position][0] < end:
+            if intervals[position][1] > start:
+                owners.append(intervals[position][2])
+            position += 1
+        return owners
+
+    def add(self, start, end, owner):
+        insort(self.intervals, (start, end, owner))
+
+    def remove(self, start, end, owner):
+        self.intervals.remove((start, end, owner))
+
+
+def solve(offers, busy=()):
+    """
+    Conflict-free assignment of offers to requests.
+
+    ``offers`` is a list of Offer; ``busy`` yields ``(person id, start, end)``
+    intervals that are already taken (teacher and student ids share one
+    namespace, as both are users). Returns the chosen offers.
+    """
+    timelines = defaultdict(Timeline)
+    # Fixed intervals are merged, as a timeline must never overlap itself
+    for person_id, start, end in sorted(busy):
+        intervals = timelines[person_id].intervals
+        if intervals and start <= intervals[-1][1]:
+            intervals[-1] = (intervals[-1][0], max(end, intervals[-1][1]), -1)
+        else:
+            intervals.append((start, end, -1))
+
+    by_request = defaultdict(list)
+    for index, offer in enumerate(offers):
+        by_request[offer.request_id].append(index)
+    for indexes in by_request.values():
+        indexes.sort(key=lambda index: (offers[index].end, offers[index].start))
+    assigned = {}  # request id -> offer index
+
+    def take(index):
+        offer = offers[index]
+        assigned[offer.request_id] = index
+        timelines[offer.teacher_id].add(offer.start, offer.end, index)
+        timelines[offer.student_id].add(offer.start, offer.end, index)
+
+    def release(index):
+        offer = offers[index]
+        del assigned[offer.request_id]
+        timelines[offer.teacher_id].remove(offer.start, offer.end, index)
+        timelines[offer.student_id].remove(offer.start, offer.end, index)
+
+    def augment(request_id, visited, depth):
+        for index in by_request[request_id]:
+            if index in visited:
+                continue
+            visited.add(index)
+            offer = offers[index]
+            conflicts = set(timelines[offer.teacher_id].overlapping(offer.start, offer.end))
+            conflicts.update(timelines[offer.student_id].overlapping(offer.start, offer.end))
+            if not conflicts:
+                take(index)
+                return True
+            if len(conflicts) > 1 or -1 in conflicts or depth >= MAX_DEPTH:
+                continue
+            # Displace the single overlapping offer and re-route its request
+            displaced = conflicts.pop()
+            release(displaced)
+            take(index)
+            if augment(offers[displaced].request_id, visited, depth + 1):
+                return True
+            release(index)
+            take(displaced)
+        return False
+
+    for request_id in sorted(by_request, key=lambda request_id: (len(by_request[request_id]), request_id)):
+        augment(request_id, set(), 0)
+    return [offers[index] for index in sorted(assigned.values())]
+
+
+def load_offers(availabilities=None):
+    """
+    Open offers (not accepted, for pending requests, not in the past) and the
+    intervals of the confirmed upcoming bookings.
+    """
+    today = timezone.localdate()
+    if availabilities is None:
+        availabilities = TeacherAvailability.objects.all()
+    rows = availabilities.filter(
+        is_accepted=False,
+        lesson_request__status='pending',
+        available_date__gte=today,
+    ).values_list(
+        'pk', 'lesson_request_id', 'teacher_id', 'lesson_request__student_id',
+        'available_date', 'available_time', 'duration',
+    ).order_by().iterator(chunk_size=5000)
+    offers = []
+    for pk, request_id, teacher_id, student_id, day, at, duration in rows:
+        start = to_minutes(day, at)
+        offers.append(Offer(pk, request_id, teacher_id, student_id, start, start + duration))
+
+    busy = []
+    bookings = LessonBooking.objects.filter(
+        status='confirmed',
+        teacher_availability__available_date__gte=today,
+    ).values_list(
+        'teacher_id', 'lesson_request__student_id', 'teacher_availability__available_date',
+        'teacher_availability__available_time', 'teacher_availability__duration',
+    ).order_by().iterator(chunk_size=5000)
+    for teacher_id, student_id, day, at, duration in bookings:
+        start = to_minutes(day, at)
+        busy.append((teacher_id, start, start + duration))
+        busy.append((student_id, start, start + duration))
+    return offers, busy
+
+
+def propose_schedule(availabilities=None):
+    """
+    Proposed, unsaved LessonBookings for the open offers (all of them, or
+    those in the ``availabilities`` queryset), plus ``{'requests': n,
+    'offers': n}`` for the requests and offers considered
+    """
+    offers, busy = load_offers(availabilities)
+    chosen = solve(offers, busy)
+    proposals = [
+        LessonBooking(
+            lesson_request_id=offer.request_id,
+            teacher_id=offer.teacher_id,
+            teacher_availability_id=offer.id,
+        )
+        for offer in chosen
+    ]
+    stats = {'requests': len({offer.request_id for offer in offers}), 'offers': len(offers)}
+    return proposals, stats
+
+
+def book_availability(availability):
+    """
+    Book an availability: create the booking, mark the availability as
+    accepted and the request as matched, and queue the teacher's
+    notification, in one transaction. The teacher, request and availability
+    rows are locked first and BookingConflict is raised when the request is
+    no longer pending, the availability was already accepted or the teacher
+    was booked at that time meanwhile.
+    """
+    with transaction.atomic():
+        # The teacher's row serializes the bookings of one teacher
+        User.objects.select_for_update().filter(pk=availability.teacher_id).exists()
+        status = LessonRequest.objects.select_for_update().filter(
+            pk=availability.lesson_request_id
+        ).values_list('status', flat=True).get()
+        if status != 'pending':
+            raise BookingConflict('This lesson request is no longer pending.')
+        accepted = TeacherAvailability.objects.select_for_update().filter(
+            pk=availability.pk
+        ).values_list('is_accepted', flat=True).get()
+        if accepted:
+            raise BookingConflict('This availability was already accepted.')
+        if not is_free(availability.teacher_id, availability.available_date,
+                       availability.available_time, availability.duration):
+            raise BookingConflict('This time slot is no longer available.')
+
+        booking = LessonBooking.objects.create(
+            lesson_request=availability.lesson_request,
+            teacher=availability.teacher,
+            teacher_availability=availability
+        )
+        availability.is_accepted = True
+        availability.save()
+        lesson_request = availability.lesson_request
+        lesson_request.status = 'matched'
+        lesson_request.save()
+        outbox.booking_confirmed(booking)
+    return booking
+
+
+def confirm_schedule(availabilities=None):
+    """
+    Solve again against the current state and book the result, so offers
+    taken or conflicting since the proposal was shown are left out, as are
+    offers booked concurrently while it runs. Returns the created bookings.
+    """
+    proposals, _ = propose_schedule(availabilities)
+    chosen = TeacherAvailability.objects.select_related(
+        'teacher', 'lesson_request__student', 'lesson_request__lesson_topic'
+    ).in_bulk([proposal.teacher_availability_id for proposal in proposals])
+    bookings = []
+    with transaction.atomic():
+        for proposal in proposals:
+            try:
+                bookings.append(book_availability(chosen[proposal.teacher_availability_id]))
+            except BookingConflict:
+                pass
+    return bookings
@@ -0,0 +1,278 @@
+"""
+Signal handlers that keep cached data in sync with model writes
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import autocomplete, metrics
+from .caching import (
+    bump_version, bump_versions, dashboard_topic_version_name,
+    dashboard_user_version_name,
+)
+from .freebusy import affected_days, rebuild_day
+from .models import (
+    User, Specialization, LessonTopic, TeacherProfile,
+    LessonRequest, TeacherAvailability, LessonBooking, Tombstone
+)
+
+
+# Set while a bulk operation applies the per-row side effects itself
+row_handlers_paused = ContextVar('row_handlers_paused', default=False)
+
+
+@contextmanager
+def pause_row_handlers():
+    """
+    Skip the per-row lesson handlers (dashboards, calendars, tombstones);
+    the caller must apply their effects for the whole batch
+    """
+    token = row_handlers_paused.set(True)
+    try:
+        yield
+    finally:
+        row_handlers_paused.reset(token)
+
+
+def row_handler(handler):
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        if not row_handlers_paused.get():
+            return handler(*args, **kwargs)
+    return wrapper
+
+
+def touch_teacher_profile(user_id):
+    """Bump a teacher profile's updated_at so its cached fragments go stale"""
+    TeacherProfile.objects.filter(user_id=user_id).update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=TeacherProfile.specializations.through)
+@receiver(m2m_changed, sender=TeacherProfile.lesson_topics.through)
+def teacher_profile_m2m_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Invalidate teacher cards when their specializations or topics change"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    bump_version('teacher_profiles')
+    if reverse:
+        # Changed from the Specialization/LessonTopic side
+        profiles = TeacherProfile.objects.all()
+        if pk_set:
+            profiles = profiles.filter(pk__in=pk_set)
+        profiles.update(updated_at=timezone.now())
+        if sender is TeacherProfile.lesson_topics.through:
+            invalidate_dashboards(user_ids=profiles.values_list('user_id', flat=True))
+    else:
+        touch_teacher_profile(instance.user_id)
+        if sender is TeacherProfile.lesson_topics.through:
+            invalidate_dashboards(user_ids=[instance.user_id])
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    """Invalidate cards and dashboards that show a user's name or picture"""
+    # Logins only touch last_login, which no fragment renders
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    if created:
+        invalidate_dashboards(user_ids=[instance.pk])
+    else:
+        invalidate_dashboards(**dashboard_counterparts(instance.pk, instance.is_teacher))
+    if instance.is_teacher:
+        touch_teacher_profile(instance.pk)
+        # Search results (and their API ETags) show the teacher's name
+        bump_version('teacher_profiles')
+
+
+@receiver(post_save, sender=Specialization)
+@receiver(post_delete, sender=Specialization)
+@receiver(post_save, sender=LessonTopic)
+@receiver(post_delete, sender=LessonTopic)
+def taxonomy_changed(sender, **kwargs):
+    """Invalidate everything that renders specialization or topic names"""
+    bump_version('taxonomy')
+
+
+def invalidate_dashboards(user_ids=(), topic_ids=()):
+    """Bump the dashboard versions of the given users and request topics"""
+    bump_versions(
+        [dashboard_user_version_name(user_id) for user_id in user_ids if user_id is not None]
+        + [dashboard_topic_version_name(topic_id) for topic_id in topic_ids]
+    )
+
+
+def dashboard_counterparts(user_id, is_teacher):
+    """Users and topics whose dashboards display the given user"""
+    user_ids = {user_id}
+    topic_ids = set()
+    if is_teacher:
+        # Students who received availabilities from this teacher
+        user_ids.update(
+            LessonRequest.objects.filter(
+                teacher_availabilities__teacher_id=user_id
+            ).values_list('student_id', flat=True)
+        )
+    else:
+        # Teachers who answered this student, and every teacher who sees
+        # the student's pending requests
+        user_ids.update(
+            TeacherAvailability.objects.filter(
+                lesson_request__student_id=user_id
+            ).values_list('teacher_id', flat=True)
+        )
+        topic_ids.update(
+            LessonRequest.objects.filter(
+                student_id=user_id, status='pending'
+            ).values_list('lesson_topic_id', flat=True)
+        )
+    return {'user_ids': user_ids, 'topic_ids': topic_ids}
+
+
+@receiver(post_save, sender=LessonRequest)
+@receiver(post_delete, sender=LessonRequest)
+@row_handler
+def lesson_request_changed(sender, instance, **kwargs):
+    invalidate_dashboards(
+        user_ids=[instance.student_id],
+        topic_ids=[instance.lesson_topic_id],
+    )
+
+
+@receiver(post_save, sender=TeacherAvailability)
+@receiver(post_delete, sender=TeacherAvailability)
+@row_handler
+def teacher_availability_changed(sender, instance, **kwargs):
+    student_id = LessonRequest.objects.filter(
+        pk=instance.lesson_request_id
+    ).values_list('student_id', flat=True).first()
+    invalidate_dashboards(user_ids=[instance.teacher_id, student_id])
+
+
+@receiver(post_save, sender=LessonBooking)
+@receiver(post_delete, sender=LessonBooking)
+@row_handler
+def lesson_booking_changed(sender, instance, **kwargs):
+    student_id = LessonRequest.objects.filter(
+        pk=instance.lesson_request_id
+    ).values_list('student_id', flat=True).first()
+    invalidate_dashboards(user_ids=[instance.teacher_id, student_id])
+
+
+@receiver(post_save, sender=TeacherProfile)
+@receiver(post_delete, sender=TeacherProfile)
+def teacher_profile_changed(sender, instance, **kwargs):
+    """Profiles are shown to the teacher and to the students they answered"""
+    bump_version('teacher_profiles')
+    invalidate_dashboards(
+        user_ids=dashboard_counterparts(instance.user_id, is_teacher=True)['user_ids']
+    )
+
+
+@receiver(pre_save, sender=TeacherAvailability)
+def teacher_availability_moving(sender, instance, raw=False, **kwargs):
+    """Remember where an edited availability was, to clear its old slots"""
+    if raw or instance.pk is None:
+        return
+    instance._previous_slot = TeacherAvailability.objects.filter(
+        pk=instance.pk
+    ).values_list('teacher_id', 'available_date', 'available_time', 'duration').first()
+
+
+@receiver(post_save, sender=TeacherAvailability)
+@receiver(post_delete, sender=TeacherAvailability)
+@row_handler
+def teacher_availability_calendar(sender, instance, raw=False, **kwargs):
+    """Rebuild the free/busy bitmaps of the days the availability covers"""
+    if raw:
+        return
+    # Values may still be strings when the instance was built from raw input
+    fields = TeacherAvailability._meta
+    slots = [(
+        instance.teacher_id,
+        fields.get_field('available_date').to_python(instance.available_date),
+        fields.get_field('available_time').to_python(instance.available_time),
+        int(instance.duration),
+    )]
+    previous = getattr(instance, '_previous_slot', None)
+    if previous and previous != slots[0]:
+        slots.append(previous)
+    days = {
+        (teacher_id, day)
+        for teacher_id, start_day, at, duration in slots
+        for day in affected_days(start_day, at, duration)
+    }
+    for teacher_id, day in days:
+        rebuild_day(teacher_id, day)
+
+
+@receiver(post_save, sender=LessonBooking)
+@receiver(post_delete, sender=LessonBooking)
+@row_handler
+def lesson_booking_calendar(sender, instance, raw=False, **kwargs):
+    """Bookings move slots from offered to booked (and back when cancelled)"""
+    if raw:
+        return
+    slot = TeacherAvailability.objects.filter(
+        pk=instance.teacher_availability_id
+    ).values_list('available_date', 'available_time', 'duration').first()
+    if slot is None:
+        # Deleted together with its availability, whose handler rebuilds
+        return
+    for day in affected_days(*slot):
+        rebuild_day(instance.teacher_id, day)
+
+
+@receiver(post_delete, sender=LessonRequest)
+@row_handler
+def lesson_request_tombstone(sender, instance, **kwargs):
+    """Tell delta-sync clients (core.sync) about deleted and archived rows"""
+    Tombstone.objects.create(
+        resource='requests', object_id=instance.pk,
+        student_id=instance.student_id, lesson_topic_id=instance.lesson_topic_id,
+    )
+
+
+@receiver(post_delete, sender=TeacherAvailability)
+@receiver(post_delete, sender=LessonBooking)
+@row_handler
+def lesson_tombstone(sender, instance, **kwargs):
+    # Cascades delete availabilities and bookings before their request
+    student_id = LessonRequest.objects.filter(
+        pk=instance.lesson_request_id
+    ).values_list('student_id', flat=True).first()
+    Tombstone.objects.create(
+        resource='availabilities' if sender is TeacherAvailability else 'bookings',
+        object_id=instance.pk, student_id=student_id, teacher_id=instance.teacher_id,
+    )
+
+
+@receiver(post_save, sender=LessonRequest)
+@receiver(post_save, sender=LessonBooking)
+def count_created(sender, instance, created=False, raw=False, **kwargs):
+    """Business counters of core.metrics, once the row is committed"""
+    if created and not raw:
+        name = (
+            'dyschool_lesson_requests_created_total' if sender is LessonRequest
+            else 'dyschool_bookings_confirmed_total'
+        )
+        transaction.on_commit(lambda: metrics.inc(name))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=TeacherProfile)
+@receiver(post_delete, sender=TeacherProfile)
+def teacher_name_changed(sender, instance, update_fields=None, **kwargs):
+    """Keep the autocomplete index (core.autocomplete) in step, once committed"""
+    if sender is User:
+        if not instance.is_teacher or (update_fields is not None and set(update_fields) <= {'last_login'}):
+            return
+        teacher_id = instance.pk
+    else:
+        teacher_id = instance.user_id
+    transaction.on_commit(lambda: autocomplete.teacher_changed(teacher_id))
@@ -0,0 +1,194 @@
+"""
+NumPy scoring step of the related-teacher recommendations.
+
+Kept apart from core.recommendations so that web workers, which only read
+the precomputed neighbours, never import NumPy.
+
+The teacher/topic assignments are held as sparse matrices in compressed
+sparse row form, ``(indptr, indices)`` pairs of arrays: the topics of each
+teacher and, transposed, the teachers of each topic. The topics two teachers
+share (their co-occurrence in topics) are counted by gathering the teachers
+of one teacher's topics, so the work and memory follow the number of
+assignments rather than teachers x topics.
+"""
+import numpy as np
+
+from .models import TeacherProfile, LessonBooking, ArchivedLessonBooking, TeacherNeighbor
+
+
+TOPIC_WEIGHT = 0.6
+
+
+def sparse_rows(rows, columns, n_rows):
+    """Compressed sparse rows of the ``(row, column)`` pairs: ``(indptr, indices)``"""
+    order = np.lexsort((columns, rows))
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    return indptr, columns[order]
+
+
+def row_values(matrix, row):
+    indptr, indices = matrix
+    return indices[indptr[row]:indptr[row + 1]]
+
+
+class TopicMatrix:
+    """
+    Sparse teacher x topic 0/1 matrix, stored by teacher and by topic
+    """
+
+    def __init__(self, teacher_rows, topic_columns, n_teachers, n_topics):
+        self.by_teacher = sparse_rows(teacher_rows, topic_columns, n_teachers)
+        self.by_topic = sparse_rows(topic_columns, teacher_rows, n_topics)
+        self.counts = np.diff(self.by_teacher[0]).astype(np.float32)
+
+    def shared_topics(self, row):
+        """Number of topics each teacher shares with the teacher at ``row``"""
+        topics = row_values(self.by_teacher, row)
+        if not len(topics):
+            return np.zeros(len(self.counts), dtype=np.float32)
+        teachers = np.concatenate([row_values(self.by_topic, topic) for topic in topics.tolist()])
+        return np.bincount(teachers, minlength=len(self.counts)).astype(np.float32)
+
+    def cosine(self, row):
+        """Cosine similarity of every teacher's topic vector with the one at ``row``"""
+        norms = np.sqrt(self.counts * self.counts[row])
+        norms[norms == 0] = 1.0
+        return self.shared_topics(row) / norms
+
+    def teachers_sharing_topics(self, rows):
+        """Rows of the teachers with a topic in common with any of ``rows``"""
+        topics = np.unique(np.concatenate(
+            [row_values(self.by_teacher, row) for row in rows] or [np.zeros(0, dtype=np.int64)]
+        ))
+        teachers = [row_values(self.by_topic, topic) for topic in topics.tolist()]
+        return np.unique(np.concatenate(teachers or [np.zeros(0, dtype=np.int64)]))
+
+
+def load_matrices():
+    """
+    Load the inputs of the scoring step.
+
+    Returns ``(teacher_ids, topics, cobook, degree)``: sorted teacher user
+    ids, the sparse teacher x topic TopicMatrix, a dict mapping ``(i, j)``
+    teacher index pairs to their number of shared students, and the number
+    of distinct students per teacher.
+    """
+    teacher_ids = np.array(
+        sorted(TeacherProfile.objects.values_list('user_id', flat=True)), dtype=np.int64
+    )
+    index = {teacher_id: i for i, teacher_id in enumerate(teacher_ids.tolist())}
+
+    pairs = np.array(
+        list(TeacherProfile.lesson_topics.through.objects.values_list(
+            'teacherprofile__user_id', 'lessontopic_id'
+        )),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    topic_ids, topic_columns = np.unique(pairs[:, 1], return_inverse=True)
+    rows = np.array([index[teacher_id] for teacher_id in pairs[:, 0].tolist()], dtype=np.int64)
+    topics = TopicMatrix(rows, topic_columns.astype(np.int64), len(teacher_ids), len(topic_ids))
+
+    # Distinct (student, teacher) pairs of non-cancelled bookings, live or
+    # archived
+    booked = np.unique(np.array(
+        [
+            pair
+            for model in (LessonBooking, ArchivedLessonBooking)
+            for pair in model.objects.exclude(status='cancelled')
+            .values_list('lesson_request__student_id', 'teacher_id')
+            .distinct().order_by()
+        ],
+        dtype=np.int64,
+    ).reshape(-1, 2), axis=0)
+    booked = booked[np.isin(booked[:, 1], teacher_ids)]
+    booked[:, 1] = np.searchsorted(teacher_ids, booked[:, 1])
+    booked = booked[np.lexsort((booked[:, 1], booked[:, 0]))]
+
+    degree = np.bincount(booked[:, 1], minlength=len(teacher_ids)).astype(np.float32)
+
+    # Every ordered pair of teachers booked by the same student, counted
+    # with one np.unique over encoded pair keys
+    keys = []
+    if len(booked):
+        starts = np.flatnonzero(np.r_[True, booked[1:, 0] != booked[:-1, 0]])
+        bounds = np.r_[starts, len(booked)]
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            if end - start < 2:
+                continue
+            group = booked[start:end, 1]
+            left, right = np.meshgrid(group, group, indexing='ij')
+            mask = left != right
+            keys.append(left[mask] * len(teacher_ids) + right[mask])
+    cobook = {}
+    if keys:
+        unique_keys, counts = np.unique(np.concatenate(keys), return_counts=True)
+        cobook = dict(zip(
+            zip((unique_keys // len(teacher_ids)).tolist(), (unique_keys % len(teacher_ids)).tolist()),
+            counts.tolist(),
+        ))
+    return teacher_ids, topics, cobook, degree
+
+
+def top_k(scores, k):
+    """Indices of the k best positive scores, best first"""
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def build_neighbors(teacher_ids, topics, cobook, degree, rows, k):
+    """Unsaved TeacherNeighbor objects for the teachers at the given row indices"""
+    by_teacher = {}
+    for (i, j), count in cobook.items():
+        by_teacher.setdefault(i, []).append((j, count))
+
+    neighbors = []
+    for i in sorted(int(row) for row in rows):
+        also_booked = np.zeros(len(teacher_ids), dtype=np.float32)
+        for j, count in by_teacher.get(i, ()):
+            also_booked[j] = count / np.sqrt(degree[i] * degree[j])
+
+        similar = TOPIC_WEIGHT * topics.cosine(i) + (1 - TOPIC_WEIGHT) * also_booked
+        similar[i] = 0
+        also_booked[i] = 0
+        for kind, scores in (('similar', similar), ('also_booked', also_booked)):
+            for rank, j in enumerate(top_k(scores, k).tolist(), start=1):
+                neighbors.append(TeacherNeighbor(
+                    teacher_id=int(teacher_ids[i]),
+                    kind=kind,
+                    rank=rank,
+                    neighbor_id=int(teacher_ids[j]),
+                    score=float(scores[j]),
+                ))
+    return neighbors
+
+
+def changed_teacher_rows(teacher_ids, topics, since):
+    """
+    Row indices whose neighbour lists may have changed since ``since``:
+    teachers whose profile (including topics) or bookings changed, every
+    teacher sharing a topic with them, and every teacher whose stored list
+    holds one of them (e.g. after they dropped the topic they shared).
+    """
+    changed = set(
+        TeacherProfile.objects.filter(updated_at__gte=since).values_list('user_id', flat=True)
+    )
+    changed.update(
+        LessonBooking.objects.filter(updated_at__gte=since).values_list('teacher_id', flat=True)
+    )
+    # Teachers co-booked by the students of the changed bookings
+    changed.update(
+        LessonBooking.objects.filter(
+            lesson_request__student__lesson_requests__bookings__updated_at__gte=since
+        ).values_list('teacher_id', flat=True).distinct().order_by()
+    )
+    listing = set(
+        TeacherNeighbor.objects.filter(neighbor_id__in=changed)
+        .values_list('teacher_id', flat=True).distinct().order_by()
+    ) if changed else set()
+    rows = np.flatnonzero(np.isin(teacher_ids, np.array(sorted(changed), dtype=np.int64)))
+    if len(rows):
+        rows = np.union1d(rows, topics.teachers_sharing_topics(rows.tolist()))
+    return np.union1d(rows, np.flatnonzero(np.isin(teacher_ids, np.array(sorted(listing), dtype=np.int64))))
@@ -0,0 +1,129 @@
+"""
+Delta sync of a user's lesson requests, availabilities and bookings.
+
+A client keeps the opaque token of its last sync and asks for what changed
+since then: rows whose indexed ``updated_at`` is newer, and the ids of rows
+deleted (or archived) since, from the Tombstone table the delete signals
+write. When nothing changed, that is a single ``UNION ALL ... LIMIT 1`` over
+the user-scoped ``(owner, updated_at)`` indexes.
+
+Each sync reaches SYNC_OVERLAP seconds behind its token, so rows saved by
+transactions that were still open at the last sync are not missed; clients
+apply rows by id, so seeing one twice is harmless. A ``reset`` tells the
+client to reload its lists from the regular endpoints instead: there was no
+token, it predates the tombstones still kept, a teacher's profile (and with
+it the set of requests they are eligible for) changed, or there are more
+than SYNC_MAX_CHANGES changes.
+"""
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import TeacherProfile, LessonRequest, TeacherAvailability, LessonBooking, Tombstone
+from .views import eligible_lesson_requests
+
+
+RESOURCES = ('requests', 'availabilities', 'bookings')
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+def encode_token(moment):
+    micros = int(moment.timestamp() * 1_000_000)
+    return base64.urlsafe_b64encode(str(micros).encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    try:
+        micros = int(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode())
+        return datetime.fromtimestamp(micros / 1_000_000, tz=dt_timezone.utc)
+    except (binascii.Error, UnicodeDecodeError, ValueError, OverflowError, OSError):
+        raise InvalidToken(token)
+
+
+def user_scopes(user):
+    """
+    ``({resource: queryset}, tombstone filter, teacher profile)``: the rows a
+    user syncs and the tombstones that concern them. A teacher syncs the
+    requests they are eligible for in any status, so requests leaving
+    ``pending`` show up as changed; a teacher without a profile syncs no
+    requests.
+    """
+    if user.is_teacher:
+        profile = TeacherProfile.objects.filter(user=user).first()
+        if profile is None:
+            requests = LessonRequest.objects.none()
+            tombstones = Q(teacher_id=user.pk)
+        else:
+            requests = eligible_lesson_requests(profile, status=None)
+            tombstones = Q(teacher_id=user.pk) | Q(
+                resource='requests', lesson_topic_id__in=profile.lesson_topics.values('pk')
+            )
+        scopes = {
+            'requests': requests,
+            'availabilities': TeacherAvailability.objects.filter(teacher=user),
+            'bookings': LessonBooking.objects.filter(teacher=user),
+        }
+        return scopes, tombstones, profile
+    scopes = {
+        'requests': LessonRequest.objects.filter(student=user),
+        'availabilities': TeacherAvailability.objects.filter(lesson_request__student=user),
+        'bookings': LessonBooking.objects.filter(lesson_request__student=user),
+    }
+    return scopes, Q(student_id=user.pk), None
+
+
+def changes_since(user, token):
+    """
+    What changed for ``user`` since ``token``. Returns ``(changed, deleted,
+    next_token, reset)``: querysets of the changed rows ordered by
+    ``updated_at``, lists of deleted ids, both keyed by resource (empty when
+    nothing changed or on reset), the token for the next sync, and whether
+    the client must reload instead.
+    """
+    now = timezone.now()
+    next_token = encode_token(now)
+    if not token:
+        return {}, {}, next_token, True
+    since = decode_token(token) - timedelta(seconds=settings.SYNC_OVERLAP)
+    if since < now - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS):
+        return {}, {}, next_token, True
+
+    scopes, tombstone_scope, profile = user_scopes(user)
+    if profile is not None and profile.updated_at > since:
+        return {}, {}, next_token, True
+
+    changed = {
+        resource: queryset.filter(updated_at__gt=since).order_by('updated_at', 'pk')
+        for resource, queryset in scopes.items()
+    }
+    tombstones = Tombstone.objects.filter(tombstone_scope, deleted_at__gt=since)
+    # One indexed probe for the common case of nothing new
+    probes = [queryset.order_by().values_list('pk') for queryset in changed.values()]
+    probe = tombstones.order_by().values_list('pk').union(*probes, all=True)
+    if not probe[:1]:
+        return {}, {}, next_token, False
+
+    # Read one tombstone past the limit to tell an overflow from a full list
+    rows = list(
+        tombstones.order_by('deleted_at', 'pk').values_list('resource', 'object_id')[:settings.SYNC_MAX_CHANGES + 1]
+    )
+    if len(rows) > settings.SYNC_MAX_CHANGES:
+        return {}, {}, next_token, True
+    deleted = {resource: [] for resource in RESOURCES}
+    for resource, object_id in rows:
+        deleted[resource].append(object_id)
+    return changed, deleted, next_token, False
+
+
+def purge_tombstones(days=None):
+    """Delete tombstones older than ``days``; returns the count"""
+    days = settings.SYNC_TOMBSTONE_RETENTION_DAYS if days is None else days
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=timezone.now() - timedelta(days=days)).delete()
+    return deleted
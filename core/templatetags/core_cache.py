@@ -0,0 +1,18 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.caching import render_teacher_card, render_teacher_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def teacher_card(teacher):
+    """Render a teacher result card from the fragment cache"""
+    return mark_safe(render_teacher_card(teacher))
+
+
+@register.simple_tag
+def teacher_cards(teachers):
+    """Render a list of teacher result cards from the fragment cache"""
+    return [mark_safe(html) for html in render_teacher_cards(teachers)]
@@ -0,0 +1,28 @@
+"""
+Test runner keeping the test run's side effects out of the checkout.
+"""
+import shutil
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from core import metrics
+
+
+class TestRunner(DiscoverRunner):
+    """DiscoverRunner with METRICS_DIR in a temporary directory, removed afterwards"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.metrics_dir = tempfile.mkdtemp(prefix='dyschool-metrics-')
+        self.metrics_settings = override_settings(METRICS_DIR=self.metrics_dir)
+        self.metrics_settings.enable()
+        # A file opened before the override would keep receiving counts
+        metrics._file = None
+
+    def teardown_test_environment(self, **kwargs):
+        self.metrics_settings.disable()
+        metrics._file = None
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
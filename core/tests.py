@@ -1,3 +1,743 @@
-from django.test import TestCase
+import io
+import itertools
+import json
+import os
+import sqlite3
+import tempfile
+import types
+from contextlib import closing
+from datetime import time, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import NoReverseMatch, get_resolver, resolve, reverse
+from django.utils import timezone
+
+from . import autocomplete, outbox, sync, transfer
+from .analytics import run_rollup
+from .archive import archive_requests
+from .backup import BackupError, backup, restore
+from .facets import search_facets
+from .freebusy import affected_days, free_windows, is_free, rebuild_all
+from .lazyurls import LazyURLResolver, lazy_include
+from .matching import run_matching
+from .models import (
+    User, Specialization, LessonTopic, TeacherProfile,
+    LessonRequest, TeacherAvailability, LessonBooking, TeacherDayCalendar, OutboxMessage,
+    LessonRequestMatch, DailyTopicStats,
+)
+from .scheduling import BookingConflict, book_availability, confirm_schedule
+from .transfer import column_names, dump, load, transfer_models
+
+
+LAZY_NAMESPACES = ('admin', 'api')
+
+# Tried for each URL parameter until reverse() accepts one
+SAMPLE_VALUES = ('1', 'core', 'x')
+
+
+def lazy_urlconf():
+    """A root URLconf with new, never populated lazy includes"""
+    module = types.ModuleType('lazy_urlconf')
+    module.urlpatterns = [
+        lazy_include('admin/', 'dyschool.admin_urls', 'admin'),
+        lazy_include('api/v1/', 'core.api_urls', 'api'),
+    ]
+    return module
+
+
+class LazyIncludeTests(SimpleTestCase):
+    """
+    core.lazyurls hooks into URLResolver internals; these pin that every name
+    of a lazy namespace reverses and resolves, whichever comes first.
+    """
+
+    def url_names(self, namespace, urlconf=None):
+        _, resolver = get_resolver(urlconf).namespace_dict[namespace]
+        return sorted(name for name in resolver.reverse_dict if isinstance(name, str))
+
+    def reverse_any(self, view_name, urlconf=None):
+        """Reverse ``view_name`` with the first sample values it accepts"""
+        _, resolver = get_resolver(urlconf).namespace_dict[view_name.split(':')[0]]
+        for possibilities, *_ in resolver.reverse_dict.getlist(view_name.split(':')[1]):
+            for _, params in possibilities:
+                for values in itertools.product(SAMPLE_VALUES, repeat=len(params)):
+                    try:
+                        return reverse(view_name, urlconf=urlconf, kwargs=dict(zip(params, values)))
+                    except NoReverseMatch:
+                        pass
+        self.fail(f'Cannot reverse {view_name}')
+
+    def assert_round_trip(self, namespace, urlconf=None):
+        names = self.url_names(namespace, urlconf)
+        self.assertTrue(names)
+        for name in names:
+            url = self.reverse_any(f'{namespace}:{name}', urlconf)
+            self.assertEqual(resolve(url, urlconf).namespace, namespace, url)
+
+    def test_root_urlconf(self):
+        lazy = [pattern for pattern in get_resolver().url_patterns if isinstance(pattern, LazyURLResolver)]
+        self.assertEqual([pattern.namespace for pattern in lazy], ['admin'])
+        for namespace in LAZY_NAMESPACES:
+            self.assert_round_trip(namespace)
+        self.assertEqual(reverse('admin:index'), '/admin/')
+        self.assertEqual(reverse('api:search'), '/api/v1/search/')
+        self.assertEqual(reverse('home'), '/')
+
+    def test_reverse_before_resolve(self):
+        urlconf = lazy_urlconf()
+        with override_settings(ROOT_URLCONF=urlconf):
+            self.assertEqual(reverse('api:changes'), '/api/v1/changes/')
+            self.assertEqual(resolve('/admin/').view_name, 'admin:index')
+            for namespace in LAZY_NAMESPACES:
+                self.assert_round_trip(namespace, urlconf)
+
+    def test_resolve_before_reverse(self):
+        urlconf = lazy_urlconf()
+        with override_settings(ROOT_URLCONF=urlconf):
+            self.assertEqual(resolve('/api/v1/bookings/').view_name, 'api:bookings')
+            self.assertEqual(reverse('admin:core_user_changelist'), '/admin/core/user/')
+            for namespace in LAZY_NAMESPACES:
+                self.assert_round_trip(namespace, urlconf)
+
+
+class LessonDataMixin:
+    """Builders for the users, requests and offers the tests below need"""
+
+    @classmethod
+    def setUpTestData(cls):
+        specialization = Specialization.objects.create(name='Piano')
+        cls.topic = LessonTopic.objects.create(specialization=specialization, name='Basics')
+        cls.day = timezone.localdate() + timedelta(days=7)
+
+    def teacher(self, username):
+        teacher = User.objects.create_user(username, user_type='teacher')
+        profile = TeacherProfile.objects.create(user=teacher, hourly_rate=50, experience_years=1, about='-')
+        profile.lesson_topics.add(self.topic)
+        return teacher
+
+    def student(self, username):
+        return User.objects.create_user(username, user_type='student')
+
+    def lesson_request(self, student):
+        return LessonRequest.objects.create(
+            student=student, lesson_topic=self.topic, lesson_duration=60, max_hourly_rate=80,
+        )
+
+    def offer(self, teacher, lesson_request, at, day=None, duration=60):
+        return TeacherAvailability.objects.create(
+            teacher=teacher, lesson_request=lesson_request,
+            available_date=day or self.day, available_time=at, duration=duration,
+        )
+
+
+class SchedulingTests(LessonDataMixin, TestCase):
+    """Bookings never overlap for a teacher, whichever path creates them"""
+
+    def assert_no_overlap(self, teacher):
+        slots = sorted(
+            (booking.teacher_availability.available_time, booking.teacher_availability.duration)
+            for booking in LessonBooking.objects.filter(teacher=teacher).select_related('teacher_availability')
+        )
+        for (start, duration), (next_start, _) in zip(slots, slots[1:]):
+            end = start.hour * 60 + start.minute + duration
+            self.assertLessEqual(end, next_start.hour * 60 + next_start.minute)
+
+    def test_confirm_schedule_books_overlapping_offers_once(self):
+        teacher = self.teacher('teacher')
+        first, second = self.lesson_request(self.student('first')), self.lesson_request(self.student('second'))
+        self.offer(teacher, first, time(10))
+        self.offer(teacher, second, time(10, 30))
+        # The second request can move to a later slot
+        self.offer(teacher, second, time(11))
+
+        bookings = confirm_schedule()
+
+        self.assertEqual(sorted(booking.lesson_request_id for booking in bookings), [first.pk, second.pk])
+        self.assert_no_overlap(teacher)
+        self.assertEqual(confirm_schedule(), [])
+
+    def test_booking_an_overlapping_offer_conflicts(self):
+        teacher = self.teacher('teacher')
+        booked = self.offer(teacher, self.lesson_request(self.student('first')), time(10))
+        clashing = self.offer(teacher, self.lesson_request(self.student('second')), time(10, 30))
+        book_availability(booked)
+
+        with self.assertRaisesMessage(BookingConflict, 'no longer available'):
+            book_availability(clashing)
+        self.assertEqual(LessonBooking.objects.count(), 1)
+        self.assert_no_overlap(teacher)
+
+    def test_request_is_booked_once(self):
+        lesson_request = self.lesson_request(self.student('student'))
+        first = self.offer(self.teacher('first'), lesson_request, time(10))
+        second = self.offer(self.teacher('second'), lesson_request, time(12))
+        book_availability(first)
+
+        for availability in (first, second):
+            with self.assertRaisesMessage(BookingConflict, 'no longer pending'):
+                book_availability(availability)
+        self.assertEqual(list(LessonBooking.objects.values_list('teacher_availability', flat=True)), [first.pk])
+
+
+class FreeBusyTests(LessonDataMixin, TestCase):
+    """The day bitmaps follow availability and booking writes"""
+
+    def setUp(self):
+        self.teacher_user = self.teacher('teacher')
+        self.availability = self.offer(self.teacher_user, self.lesson_request(self.student('student')), time(10))
+
+    def test_affected_days_cross_midnight(self):
+        next_day = self.day + timedelta(days=1)
+        self.assertEqual(affected_days(self.day, time(23, 30), 60), [self.day, next_day])
+        self.assertEqual(affected_days(self.day, time(23), 60), [self.day])
+
+    def test_booking_and_cancelling(self):
+        self.assertTrue(is_free(self.teacher_user.pk, self.day, time(10), 60))
+        self.assertFalse(is_free(self.teacher_user.pk, self.day, time(10), 60, include_offered=True))
+        booking = book_availability(self.availability)
+        self.assertFalse(is_free(self.teacher_user.pk, self.day, time(10, 55), 30))
+        self.assertTrue(is_free(self.teacher_user.pk, self.day, time(11), 30))
+
+        booking.status = 'cancelled'
+        booking.save()
+        self.assertTrue(is_free(self.teacher_user.pk, self.day, time(10), 60))
+
+    def test_edit_clears_the_old_slot(self):
+        book_availability(self.availability)
+        # Moved to another day, past its midnight
+        moved = self.day + timedelta(days=2)
+        self.availability.available_date = moved
+        self.availability.available_time = time(23, 30)
+        self.availability.save()
+
+        self.assertTrue(is_free(self.teacher_user.pk, self.day, time(10), 60))
+        self.assertFalse(is_free(self.teacher_user.pk, moved, time(23, 30), 30))
+        self.assertFalse(is_free(self.teacher_user.pk, moved + timedelta(days=1), time(0), 30))
+        self.assertNotIn(time(23), free_windows(self.teacher_user.pk, moved, 60))
+
+    def test_delete_drops_empty_days(self):
+        book_availability(self.availability)
+        self.availability.delete()
+
+        self.assertFalse(TeacherDayCalendar.objects.exists())
+        self.assertEqual(free_windows(self.teacher_user.pk, self.day, 60, time(10), time(11)), [time(10)])
+
+    def test_rebuild_all_matches_the_signals(self):
+        book_availability(self.availability)
+        self.offer(self.teacher_user, self.lesson_request(self.student('other')), time(23, 30))
+        stored = set(TeacherDayCalendar.objects.values_list('teacher_id', 'date', 'booked', 'offered'))
+        TeacherDayCalendar.objects.all().delete()
+
+        rebuild_all()
+        self.assertEqual(set(TeacherDayCalendar.objects.values_list('teacher_id', 'date', 'booked', 'offered')), stored)
+
+
+@override_settings(SYNC_OVERLAP=0)
+class SyncTombstoneTests(LessonDataMixin, TestCase):
+    """Deleted and archived rows reach the delta sync of both sides"""
+
+    def setUp(self):
+        self.teacher_user = self.teacher('teacher')
+        self.student_user = self.student('student')
+        self.request = self.lesson_request(self.student_user)
+        # delete() clears the instance's pk
+        self.request_id = self.request.pk
+        self.availability = self.offer(self.teacher_user, self.request, time(10))
+        self.booking = book_availability(self.availability)
+        # Everything above happened before the clients' last sync
+        past = timezone.now() - timedelta(hours=1)
+        for model in (LessonRequest, TeacherAvailability, LessonBooking):
+            model.objects.update(updated_at=past)
+        TeacherProfile.objects.update(updated_at=past)
+        self.token = sync.encode_token(timezone.now() - timedelta(minutes=1))
+
+    def deleted(self, user):
+        changed, deleted, _, reset = sync.changes_since(user, self.token)
+        self.assertFalse(reset)
+        return {resource: ids for resource, ids in deleted.items() if ids}
+
+    def expected(self):
+        return {
+            'requests': [self.request_id],
+            'availabilities': [self.availability.pk],
+            'bookings': [self.booking.pk],
+        }
+
+    def test_nothing_changed(self):
+        changed, deleted, _, reset = sync.changes_since(self.student_user, self.token)
+        self.assertEqual((changed, deleted, reset), ({}, {}, False))
+
+    def test_deleted_request(self):
+        self.request.delete()
+        self.assertEqual(self.deleted(self.student_user), self.expected())
+        self.assertEqual(self.deleted(self.teacher_user), self.expected())
+
+    def test_archived_request(self):
+        LessonRequest.objects.update(status='completed', updated_at=timezone.now() - timedelta(days=400))
+        TeacherAvailability.objects.update(available_date=self.day - timedelta(days=400))
+        archive_requests(retention_days=30)
+
+        self.assertFalse(LessonRequest.objects.exists())
+        self.assertEqual(self.deleted(self.student_user), self.expected())
+        self.assertEqual(self.deleted(self.teacher_user), self.expected())
+
+    def test_too_many_deletions_reset(self):
+        self.request.delete()
+        with self.settings(SYNC_MAX_CHANGES=2):
+            _, deleted, _, reset = sync.changes_since(self.student_user, self.token)
+            self.assertEqual((deleted, reset), ({}, True))
+        with self.settings(SYNC_MAX_CHANGES=3):
+            self.assertEqual(self.deleted(self.student_user), self.expected())
+
+    def test_reset_without_a_usable_token(self):
+        self.assertTrue(sync.changes_since(self.student_user, None)[3])
+        expired = sync.encode_token(timezone.now() - timedelta(days=365))
+        self.assertTrue(sync.changes_since(self.student_user, expired)[3])
+        with self.assertRaises(sync.InvalidToken):
+            sync.changes_since(self.student_user, '@@')
+
+
+@override_settings(OUTBOX_MAX_ATTEMPTS=3, OUTBOX_RETRY_DELAY=60, OUTBOX_CLAIM_TIMEOUT=600)
+class OutboxTests(LessonDataMixin, TestCase):
+    """Each teacher gets one email per request, retried with backoff"""
+
+    def setUp(self):
+        self.chosen, self.other = self.teacher('chosen'), self.teacher('other')
+        for teacher in (self.chosen, self.other):
+            User.objects.filter(pk=teacher.pk).update(email=f'{teacher.username}@example.com')
+        self.request = self.lesson_request(self.student('student'))
+
+    def make_due(self):
+        OutboxMessage.objects.filter(status='pending').update(next_attempt_at=timezone.now())
+
+    def test_fan_out_is_deduplicated(self):
+        outbox.lesson_request_created(self.request, self.chosen)
+        outbox.lesson_request_created(self.request, self.chosen)
+        self.assertEqual(OutboxMessage.objects.count(), 2)
+
+        # The chosen teacher's message goes out with the expansion; the
+        # expanded one for them is skipped as a duplicate
+        self.assertEqual(outbox.deliver_batch(), {'sent': 1, 'retry': 0, 'skipped': 0, 'expanded': 1})
+        self.assertEqual(outbox.deliver_batch()['sent'], 1)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['chosen@example.com', 'other@example.com'])
+        self.assertEqual(outbox.deliver_batch(), {'sent': 0, 'retry': 0, 'skipped': 0, 'expanded': 0})
+
+    def test_failed_sends_back_off_then_give_up(self):
+        outbox.enqueue('booking_confirmed', [self.chosen.pk], 'booking:1', {
+            'student': 'S', 'topic': 'T', 'date': 'd', 'time': 'h', 'path': '/',
+        })
+        failing = mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')
+        )
+        delays = []
+        with failing:
+            for _ in range(3):
+                before = timezone.now()
+                self.assertEqual(outbox.deliver_batch()['retry'], 1)
+                message = OutboxMessage.objects.get()
+                delays.append(round((message.next_attempt_at - before).total_seconds() / 60))
+                self.make_due()
+        self.assertEqual(delays, [1, 2, 0])
+        self.assertEqual((message.status, message.attempts), ('failed', 3))
+        self.assertEqual(outbox.deliver_batch()['retry'], 0)
+
+    def test_stale_claims_count_as_attempts(self):
+        outbox.enqueue('booking_confirmed', [self.chosen.pk], 'booking:1', {
+            'student': 'S', 'topic': 'T', 'date': 'd', 'time': 'h', 'path': '/',
+        })
+        # A worker claims the row and dies before marking it
+        for attempts in (1, 2):
+            self.assertEqual(len(outbox.claim_batch(10)), 1)
+            OutboxMessage.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=601))
+            self.assertEqual(len(outbox.claim_batch(10)), 1)
+            self.assertEqual(OutboxMessage.objects.get().attempts, attempts)
+            OutboxMessage.objects.update(status='pending')
+        OutboxMessage.objects.update(status='sending', next_attempt_at=timezone.now() - timedelta(seconds=601))
+
+        self.assertEqual(outbox.claim_batch(10), [])
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.status, message.attempts), ('failed', 3))
+
+
+class MatchingTests(LessonDataMixin, TestCase):
+    """run_matching stores the cheapest eligible teachers of each pending request"""
+
+    def setUp(self):
+        self.by_rate = {}
+        for rate in (90, 40, 60):
+            teacher = self.teacher(f'teacher{rate}')
+            TeacherProfile.objects.filter(user=teacher).update(hourly_rate=rate)
+            self.by_rate[rate] = teacher
+        away = self.teacher('away')
+        TeacherProfile.objects.filter(user=away).update(is_available=False)
+        other_topic = LessonTopic.objects.create(specialization=self.topic.specialization, name='Jazz')
+        TeacherProfile.objects.create(
+            user=User.objects.create_user('jazz', user_type='teacher'), hourly_rate=10, experience_years=1, about='-',
+        ).lesson_topics.add(other_topic)
+        student = self.student('student')
+        self.requests = {
+            max_rate: LessonRequest.objects.create(
+                student=student, lesson_topic=self.topic, lesson_duration=60, max_hourly_rate=max_rate,
+            )
+            for max_rate in (70, 30, 100)
+        }
+
+    def matches(self, max_rate):
+        return list(
+            LessonRequestMatch.objects.filter(lesson_request=self.requests[max_rate])
+            .order_by('rank').values_list('teacher_id', 'rank', 'hourly_rate')
+        )
+
+    def expected(self, *rates):
+        return [(self.by_rate[rate].pk, rank, rate) for rank, rate in enumerate(rates, start=1)]
+
+    def test_cheapest_eligible_teachers(self):
+        result = run_matching(limit=2)
+
+        self.assertEqual((result['requests'], result['matches'], result['unmatched']), (3, 4, 1))
+        self.assertEqual(self.matches(70), self.expected(40, 60))
+        self.assertEqual(self.matches(30), [])
+        self.assertEqual(self.matches(100), self.expected(40, 60))
+
+    def test_rerun_follows_changes(self):
+        run_matching(limit=5)
+        TeacherProfile.objects.filter(user=self.by_rate[40]).update(hourly_rate=95)
+        self.by_rate[95] = self.by_rate.pop(40)
+        LessonRequest.objects.filter(pk=self.requests[70].pk).update(status='cancelled')
+
+        run_matching(limit=5)
+        self.assertEqual(self.matches(70), [])
+        self.assertEqual(self.matches(100), self.expected(60, 90, 95))
+
+
+class AnalyticsTests(LessonDataMixin, TestCase):
+    """The daily rollups count requests and bookings and estimate revenue"""
+
+    def book(self, rate, duration, status='confirmed'):
+        teacher = self.teacher(f'teacher{LessonBooking.objects.count()}')
+        TeacherProfile.objects.filter(user=teacher).update(hourly_rate=rate)
+        lesson_request = self.lesson_request(self.student(f'student{LessonBooking.objects.count()}'))
+        availability = self.offer(teacher, lesson_request, time(10), duration=duration)
+        booking = book_availability(availability)
+        LessonBooking.objects.filter(pk=booking.pk).update(status=status)
+
+    def test_revenue_keeps_fractions(self):
+        self.book(50, 45)
+        self.book(Decimal('33.33'), 20)
+        self.book(80, 60, status='cancelled')
+
+        run_rollup(full=True)
+        stats = DailyTopicStats.objects.get(date=timezone.localdate(), lesson_topic=self.topic)
+        # 37.50 + 11.11; the cancelled booking earns nothing
+        self.assertEqual(stats.revenue_estimate, Decimal('48.61'))
+        self.assertEqual(
+            (stats.requests_created, stats.requests_matched, stats.bookings_created, stats.bookings_cancelled),
+            (3, 3, 3, 1),
+        )
+
+
+@override_settings(
+    AUTH_THROTTLE_ENABLED=True,
+    AUTH_THROTTLE_IP_RATE=(100, 60),
+    AUTH_THROTTLE_USERNAME_RATE=(3, 300),
+    AUTH_THROTTLE_ACCOUNT_RATE=(5, 3600),
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class ThrottleTests(TestCase):
+    """Sign-in attempts are limited per IP, per username and IP, and per account"""
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('victim', password='right-password')
+
+    def sign_in(self, password, ip):
+        response = self.client.post(
+            reverse('sign_in'), {'username': 'victim', 'password': password}, REMOTE_ADDR=ip,
+        )
+        self.client.logout()
+        return response.status_code
+
+    def test_username_limit_is_per_ip(self):
+        self.assertEqual([self.sign_in('wrong', '10.0.0.1') for _ in range(4)], [200, 200, 200, 429])
+        self.assertEqual(self.sign_in('right-password', '10.0.0.1'), 429)
+        self.assertEqual(self.sign_in('right-password', '10.0.0.2'), 302)
+
+    def test_success_resets_the_username_counters(self):
+        for _ in range(2):
+            self.sign_in('wrong', '10.0.0.1')
+        self.assertEqual(self.sign_in('right-password', '10.0.0.1'), 302)
+        self.assertEqual([self.sign_in('wrong', '10.0.0.1') for _ in range(4)], [200, 200, 200, 429])
+
+    def test_account_limit_counts_every_ip(self):
+        statuses = [self.sign_in('wrong', f'10.0.1.{number}') for number in range(6)]
+        self.assertEqual(statuses, [200] * 5 + [429])
+        self.assertEqual(self.sign_in('right-password', '10.0.2.1'), 429)
+
+    def test_ip_limit(self):
+        with self.settings(AUTH_THROTTLE_IP_RATE=(2, 60)):
+            statuses = [
+                self.client.post(reverse('sign_in'), {'username': name, 'password': 'x'}).status_code
+                for name in ('a', 'b', 'c')
+            ]
+        self.assertEqual(statuses, [200, 200, 429])
+
+
+class FacetTests(LessonDataMixin, TestCase):
+    """Each facet count is what the search returns with that value picked"""
+
+    def setUp(self):
+        cache.clear()
+        piano = self.topic.specialization
+        guitar = Specialization.objects.create(name='Guitar')
+        advanced = LessonTopic.objects.create(specialization=piano, name='Advanced')
+        chords = LessonTopic.objects.create(specialization=guitar, name='Chords')
+        solos = LessonTopic.objects.create(specialization=guitar, name='Solos')
+        self.profile('ana', 40, [piano], [self.topic])
+        self.profile('bia', 60, [piano, guitar], [self.topic, advanced, chords])
+        self.profile('caio', 90, [guitar], [chords, solos])
+        self.profile('davi', 75, [piano], [advanced])
+        self.profile('edu', 30, [guitar], [solos], is_available=False)
+        self.specializations = [piano, guitar]
+
+    def profile(self, username, rate, specializations, topics, is_available=True):
+        profile = TeacherProfile.objects.create(
+            user=User.objects.create_user(username, user_type='teacher'),
+            hourly_rate=rate, experience_years=1, about='-', is_available=is_available,
+        )
+        profile.specializations.set(specializations)
+        profile.lesson_topics.set(topics)
+
+    def found(self, specialization=None, lesson_topic=None, max_hourly_rate=None):
+        """How many teachers the search form returns for these filters"""
+        profiles = TeacherProfile.objects.filter(is_available=True)
+        if specialization:
+            profiles = profiles.filter(specializations=specialization)
+        if lesson_topic:
+            profiles = profiles.filter(lesson_topics=lesson_topic)
+        if max_hourly_rate:
+            profiles = profiles.filter(hourly_rate__lte=max_hourly_rate)
+        return profiles.count()
+
+    def assert_facets(self, specialization, lesson_topic, max_hourly_rate):
+        facets = search_facets(specialization, lesson_topic, max_hourly_rate)
+        counts = {entry['id']: entry['count'] for entry in facets['specializations']}
+        expected = {
+            other.pk: self.found(other, None, max_hourly_rate) for other in self.specializations
+        }
+        self.assertEqual(counts, {pk: count for pk, count in expected.items() if count})
+
+        counts = {entry['id']: entry['count'] for entry in facets['topics']}
+        expected = {
+            topic.pk: self.found(specialization, topic, max_hourly_rate)
+            for topic in (specialization.lesson_topics.all() if specialization else [])
+        }
+        self.assertEqual(counts, {pk: count for pk, count in expected.items() if count})
+
+        rates = [(entry['max'], entry['count']) for entry in facets['rates']]
+        self.assertEqual(rates, [(rate, self.found(specialization, lesson_topic, rate)) for rate, _ in rates])
+        self.assertEqual(rates[-1][1], self.found(specialization, lesson_topic))
+
+    def test_counts_match_the_search(self):
+        piano, guitar = self.specializations
+        for specialization in (None, piano, guitar):
+            topics = [None, *specialization.lesson_topics.all()] if specialization else [None]
+            for lesson_topic in topics:
+                for max_hourly_rate in (None, Decimal('60'), Decimal('80')):
+                    with self.subTest(
+                        specialization=specialization, lesson_topic=lesson_topic, max_hourly_rate=max_hourly_rate,
+                    ):
+                        self.assert_facets(specialization, lesson_topic, max_hourly_rate)
+
+    def test_selected_entries(self):
+        piano = self.specializations[0]
+        facets = search_facets(piano, self.topic, None)
+        self.assertEqual([entry['name'] for entry in facets['specializations'] if entry['selected']], ['Piano'])
+        self.assertEqual([entry['name'] for entry in facets['topics'] if entry['selected']], ['Basics'])
+        self.assertEqual([entry['name'] for entry in facets['topics']], ['Advanced', 'Basics'])
+
+
+@override_settings(AUTOCOMPLETE_VERSION_CHECK_INTERVAL=0)
+class AutocompleteTests(LessonDataMixin, TestCase):
+    """The name index follows renames, deletes and bulk imports"""
+
+    def setUp(self):
+        autocomplete._index = None
+        self.addCleanup(setattr, autocomplete, '_index', None)
+        self.teacher_user = self.teacher('jsilva')
+        self.teacher_user.first_name, self.teacher_user.last_name = 'José', 'Silva'
+        self.teacher_user.save()
+
+    def names(self, query):
+        return [teacher['name'] for teacher in autocomplete.search_teachers(query)]
+
+    def test_rename_and_delete(self):
+        self.assertEqual(self.names('jose si'), ['José Silva'])
+        # The handlers update the index once the write is committed
+        with self.captureOnCommitCallbacks(execute=True):
+            self.teacher_user.last_name = 'Souza'
+            self.teacher_user.save()
+        self.assertEqual(self.names('silva'), [])
+        self.assertEqual(self.names('SOU'), ['José Souza'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.teacher_user.delete()
+        self.assertEqual(self.names('jose'), [])
+
+    def test_imported_teachers_are_found(self):
+        self.assertEqual(self.names('maria'), [])
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as f:
+            f.write(json.dumps({
+                'username': 'mlima', 'email': 'mlima@example.com', 'first_name': 'Maria',
+                'last_name': 'Lima', 'user_type': 'teacher', 'hourly_rate': '45.50',
+                'about': '-', 'specializations': self.topic.specialization.name,
+            }) + '\n')
+        self.addCleanup(os.remove, f.name)
+        call_command('import_users', f.name, '--workers', '1', stdout=io.StringIO())
+        self.assertEqual(self.names('maria'), ['Maria Lima'])
+
+
+class BackupTests(SimpleTestCase):
+    """A backup restores the database as it was, plain or gzipped"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.database = os.path.join(self.directory, 'live.sqlite3')
+        # The test database is in memory, which core.backup refuses
+        patcher = mock.patch('core.backup.database_path', return_value=self.database)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with closing(sqlite3.connect(self.database)) as connection, connection:
+            connection.execute('CREATE TABLE django_migrations (id INTEGER PRIMARY KEY, name TEXT)')
+            connection.execute('CREATE TABLE note (id INTEGER PRIMARY KEY, body TEXT)')
+            connection.executemany(
+                'INSERT INTO note (body) VALUES (?)', [(f'note {number} ' * 20,) for number in range(500)],
+            )
+
+    def notes(self):
+        with closing(sqlite3.connect(self.database)) as connection:
+            return connection.execute('SELECT id, body FROM note ORDER BY id').fetchall()
+
+    def overwrite(self):
+        with closing(sqlite3.connect(self.database)) as connection, connection:
+            connection.execute('DELETE FROM note WHERE id % 2 = 0')
+            connection.execute("UPDATE note SET body = 'changed'")
+
+    def test_round_trip(self):
+        original = self.notes()
+        for name, compress in (('backup.sqlite3', False), ('backup.sqlite3.gz', True)):
+            with self.subTest(compress=compress):
+                target = os.path.join(self.directory, name)
+                stats = backup(target, pages=5, sleep=0, max_restarts=5, compress=compress)
+                self.assertGreater(stats['steps'], 1)
+                with open(target, 'rb') as backup_file:
+                    self.assertEqual(backup_file.read(2) == b'\x1f\x8b', compress)
+
+                self.overwrite()
+                self.assertNotEqual(self.notes(), original)
+                restore(target)
+                self.assertEqual(self.notes(), original)
+
+    def test_stream_round_trip(self):
+        original = self.notes()
+        stream = io.BytesIO()
+        backup(None, pages=100, sleep=0, max_restarts=5, compress=True, output=stream)
+        self.overwrite()
+        stream.seek(0)
+        restore(None, input_stream=stream)
+        self.assertEqual(self.notes(), original)
+
+    def test_damaged_backup_is_refused(self):
+        target = os.path.join(self.directory, 'backup.sqlite3.gz')
+        backup(target, pages=100, sleep=0, max_restarts=5, compress=True)
+        with open(target, 'r+b') as backup_file:
+            backup_file.truncate(os.path.getsize(target) // 2)
+        self.overwrite()
+        changed = self.notes()
+        with self.assertRaises(BackupError):
+            restore(target)
+        self.assertEqual(self.notes(), changed)
+
+
+class Interrupted(Exception):
+    pass
+
+
+class TransferTests(LessonDataMixin, TestCase):
+    """A dump loads back into an empty database row for row, also when resumed"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        teacher = self.teacher('teacher')
+        teacher.teacher_profile.specializations.add(self.topic.specialization)
+        for number in range(3):
+            lesson_request = self.lesson_request(self.student(f'student{number}'))
+            book_availability(self.offer(teacher, lesson_request, time(9 + number)))
+        self.models, _ = transfer_models()
+        self.original = self.rows()
+        dump(self.directory, chunk_size=2, compress=True)
+        self.empty()
+
+    def rows(self):
+        return {
+            model._meta.label_lower: list(model._base_manager.order_by('pk').values_list(*column_names(model)))
+            for model in self.models
+        }
+
+    def empty(self):
+        """Delete every core row without sending signals"""
+        with connection.cursor() as cursor:
+            for model in reversed(self.models):
+                cursor.execute(f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)}')
+
+    def interrupt_after(self, label, batches):
+        """Make the load stop once ``batches`` batches of ``label`` are committed"""
+        read = transfer.read_batches
+
+        def read_batches(path, skip, batch_size):
+            for number, batch in enumerate(read(path, skip, batch_size)):
+                if Path(path).name.startswith(f'{label}.') and number == batches:
+                    raise Interrupted
+                yield batch
+
+        return mock.patch('core.transfer.read_batches', read_batches)
+
+    def checkpoint(self):
+        return json.loads((Path(self.directory) / '.load-checkpoint').read_text())
+
+    def test_round_trip(self):
+        self.assertTrue(all(self.original[label] for label in ('core.user', 'core.lessonbooking')))
+        load(self.directory, batch_size=2)
+        self.assertEqual(self.rows(), self.original)
+        self.assertFalse((Path(self.directory) / '.load-checkpoint').exists())
+
+    def test_resumed_load(self):
+        with self.interrupt_after('core.user', 2), self.assertRaises(Interrupted):
+            load(self.directory, batch_size=1)
+        self.assertEqual(self.checkpoint()['model'], 'core.user')
+        self.assertEqual(self.checkpoint()['rows'], 2)
+
+        load(self.directory, batch_size=1)
+        self.assertEqual(self.rows(), self.original)
+
+    def test_resume_after_a_lost_checkpoint_write(self):
+        with self.interrupt_after('core.user', 1), self.assertRaises(Interrupted):
+            load(self.directory, batch_size=1)
+        # As if the process died between committing the first user and
+        # recording it
+        checkpoint = self.checkpoint()
+        checkpoint.update(model=None, rows=0)
+        (Path(self.directory) / '.load-checkpoint').write_text(json.dumps(checkpoint))
+
+        load(self.directory, batch_size=1)
+        self.assertEqual(self.rows(), self.original)
@@ -0,0 +1,98 @@
+"""
+Fixed-window throttling for the authentication views.
+
+Each attempt is counted with ``cache.add()`` and ``cache.incr()``, which are
+atomic on the Redis and Memcached backends, so parallel attempts cannot all
+see the same remaining budget. A counter covers one window of ``seconds``
+and expires with it. The counters must be shared by every worker: while
+throttling is enabled, the ``core.E002`` deploy check (core.checks) rejects
+the per-process cache and ``core.W001`` warns about caches whose ``incr()``
+is not atomic (the file backend), where parallel attempts can overshoot.
+"""
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+
+def window_key(key, seconds, now):
+    return f'{key}:{int(now // seconds)}'
+
+
+def hit(key, limit, seconds):
+    """
+    Count one attempt against ``key``, allowing ``limit`` per window of
+    ``seconds``. Returns ``(allowed, retry_after)``, ``retry_after`` being
+    the seconds until the window ends when the limit is reached.
+    """
+    now = time.time()
+    counter = window_key(key, seconds, now)
+    cache.add(counter, 0, int(seconds) + 1)
+    try:
+        count = cache.incr(counter)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.add(counter, 1, int(seconds) + 1)
+        count = 1
+    if count > limit:
+        return False, seconds - now % seconds
+    return True, 0
+
+
+def reset(key, seconds):
+    """Forget the attempts counted against ``key`` in the current window"""
+    cache.delete(window_key(key, seconds, time.time()))
+
+
+def get_client_ip(request):
+    """Client address used for throttling"""
+    # Behind a reverse proxy, configure it to set REMOTE_ADDR (e.g. with
+    # uwsgi/gunicorn forwarded-allow-ips) instead of trusting headers here
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def throttle_auth(scope):
+    """
+    Throttle POSTs to an authentication view by client IP, by username from
+    that IP, and by username from any IP.
+    
+    Rejected attempts get a 429 before the form is validated, so they never
+    reach the password hasher or the database. The tight username limit is
+    keyed on the client IP too, so nobody can lock a user out from
+    elsewhere with it; the account limit counts every IP, to slow down
+    attacks on one account spread over many addresses, and is set high
+    since whoever exhausts it does lock the account out until its window
+    ends. A successful sign-in or sign-up clears both username counters.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped(request, *args, **kwargs):
+            if request.method != 'POST' or not settings.AUTH_THROTTLE_ENABLED:
+                return view_func(request, *args, **kwargs)
+            ip = get_client_ip(request)
+            counters = [(f'throttle:{scope}:ip:{ip}', *settings.AUTH_THROTTLE_IP_RATE)]
+            username = request.POST.get('username', '').strip().lower()[:150]
+            if username:
+                counters += [
+                    (f'throttle:{scope}:user:{username}:{ip}', *settings.AUTH_THROTTLE_USERNAME_RATE),
+                    (f'throttle:{scope}:account:{username}', *settings.AUTH_THROTTLE_ACCOUNT_RATE),
+                ]
+            for key, limit, seconds in counters:
+                allowed, retry_after = hit(key, limit, seconds)
+                if not allowed:
+                    response = HttpResponse(
+                        'Too many attempts. Please wait and try again.',
+                        status=429,
+                        content_type='text/plain; charset=utf-8',
+                    )
+                    response['Retry-After'] = str(int(retry_after) + 1)
+                    return response
+            response = view_func(request, *args, **kwargs)
+            if username and request.user.is_authenticated:
+                for key, _, seconds in counters[1:]:
+                    reset(key, seconds)
+            return response
+        return wrapped
+    return decorator
@@ -0,0 +1,256 @@
+"""
+Per-request latency breakdown: database, template, cache and view time.
+
+ServerTimingMiddleware opens a RequestTimer for each request. Queries are
+timed with ``connection.execute_wrapper``; template rendering and cache
+calls by the template backend and cache backends below, which settings
+select in place of Django's. Times are exclusive: a query run while a
+template renders counts as database time, not template time, and ``view``
+is what is left of the total (view code, forms, middleware).
+
+The breakdown goes out as a ``Server-Timing`` header, which browser dev
+tools show next to the request, and as a JSON line on the ``core.timing``
+logger for a SERVER_TIMING_SAMPLE_RATE fraction of requests and for every
+request slower than SERVER_TIMING_SLOW_MS, and the total and query count
+feed the request histograms of core.metrics. Work done while a streaming
+response is iterated (exports) happens after the middleware returns and is
+not measured.
+"""
+import json
+import logging
+import random
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+# The timer of the request being handled, None outside of requests
+current_timer = ContextVar('current_timer', default=None)
+
+# Reported in this order; 'view' is whatever the others leave of the total
+CATEGORIES = ('db', 'template', 'cache', 'view')
+
+DESCRIPTIONS = {
+    'db': 'queries',
+    'template': 'renders',
+    'cache': 'calls',
+}
+
+
+class RequestTimer:
+    """Exclusive time and number of calls per category for one request"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.seconds = defaultdict(float)
+        self.counts = defaultdict(int)
+        # [category, time spent in measurements nested in it] per open one
+        self.open = []
+
+    @contextmanager
+    def measure(self, category):
+        outer = self.open[-1] if self.open else None
+        current = [category, 0.0]
+        self.open.append(current)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.open.pop()
+            self.seconds[category] += elapsed - current[1]
+            if outer is not None:
+                outer[1] += elapsed
+            # A cache.get_many() running cache.get() is one call
+            if outer is None or outer[0] != category:
+                self.counts[category] += 1
+
+    def breakdown(self):
+        """``{category: milliseconds}`` including ``view`` and ``total``"""
+        total = (time.perf_counter() - self.start) * 1000
+        milliseconds = {category: self.seconds[category] * 1000 for category in CATEGORIES[:-1]}
+        milliseconds['view'] = max(total - sum(milliseconds.values()), 0.0)
+        milliseconds['total'] = total
+        return milliseconds
+
+
+@contextmanager
+def measure(category):
+    """Count the enclosed block towards ``category`` of the current request, if any"""
+    timer = current_timer.get()
+    if timer is None:
+        yield
+    else:
+        with timer.measure(category):
+            yield
+
+
+def time_query(execute, sql, params, many, context):
+    with measure('db'):
+        return execute(sql, params, many, context)
+
+
+def server_timing_header(milliseconds, counts):
+    metrics = []
+    for name in (*CATEGORIES, 'total'):
+        metric = f'{name};dur={milliseconds[name]:.1f}'
+        if name in DESCRIPTIONS:
+            metric += f';desc="{DESCRIPTIONS[name]}: {counts[name]}"'
+        metrics.append(metric)
+    return ', '.join(metrics)
+
+
+def should_log(total_ms):
+    return total_ms >= settings.SERVER_TIMING_SLOW_MS or random.random() < settings.SERVER_TIMING_SAMPLE_RATE
+
+
+class ServerTimingMiddleware:
+    """
+    Times each request (see the module docstring); list it first in
+    MIDDLEWARE so the total covers the other middleware too.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = RequestTimer()
+        token = current_timer.set(timer)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(time_query))
+                response = self.get_response(request)
+        finally:
+            current_timer.reset(token)
+
+        milliseconds = timer.breakdown()
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        metrics.observe_request(view_name, milliseconds['total'] / 1000, timer.counts['db'])
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = server_timing_header(milliseconds, timer.counts)
+        if should_log(milliseconds['total']):
+            logger.info(json.dumps({
+                'url_name': view_name,
+                'method': request.method,
+                'status': response.status_code,
+                **{f'{name}_ms': round(value, 2) for name, value in milliseconds.items()},
+                **{f'{name}_count': timer.counts[name] for name in DESCRIPTIONS},
+            }))
+        return response
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        with measure('template'):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Django template engine whose renders count as template time"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+MISSING = object()
+
+
+def key_area(key):
+    """
+    Metrics label of a cache key: its prefix before the first colon, or the
+    fragment name of a {% cache %} key (``template.cache.<name>.<hash>``)
+    """
+    if key.startswith('template.cache.'):
+        return key.split('.')[2]
+    return key.split(':', 1)[0] if ':' in key else 'other'
+
+
+def count_lookups(keys, found):
+    for key in keys:
+        metrics.inc('dyschool_cache_lookups_total', area=key_area(key), result='hit' if key in found else 'miss')
+
+
+class TimedCacheMixin:
+    """
+    Counts the calls of a cache backend as cache time, and its lookups as
+    hits or misses by key area in the metrics (get_many() runs get() for
+    each key, except on Redis).
+    """
+
+    def add(self, *args, **kwargs):
+        with measure('cache'):
+            return super().add(*args, **kwargs)
+
+    def get(self, key, default=None, version=None):
+        with measure('cache'):
+            value = super().get(key, MISSING, version)
+        count_lookups([key], () if value is MISSING else (key,))
+        return default if value is MISSING else value
+
+    def set(self, *args, **kwargs):
+        with measure('cache'):
+            return super().set(*args, **kwargs)
+
+    def touch(self, *args, **kwargs):
+        with measure('cache'):
+            return super().touch(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with measure('cache'):
+            return super().delete(*args, **kwargs)
+
+    def get_many(self, *args, **kwargs):
+        with measure('cache'):
+            return super().get_many(*args, **kwargs)
+
+    def set_many(self, *args, **kwargs):
+        with measure('cache'):
+            return super().set_many(*args, **kwargs)
+
+    def delete_many(self, *args, **kwargs):
+        with measure('cache'):
+            return super().delete_many(*args, **kwargs)
+
+    def has_key(self, *args, **kwargs):
+        with measure('cache'):
+            return super().has_key(*args, **kwargs)
+
+    def incr(self, *args, **kwargs):
+        with measure('cache'):
+            return super().incr(*args, **kwargs)
+
+
+class TimedLocMemCache(TimedCacheMixin, LocMemCache):
+    pass
+
+
+class TimedFileBasedCache(TimedCacheMixin, FileBasedCache):
+    pass
+
+
+class TimedRedisCache(TimedCacheMixin, RedisCache):
+
+    def get_many(self, keys, version=None):
+        # One MGET, without going through get()
+        keys = list(keys)
+        found = super().get_many(keys, version)
+        count_lookups(keys, found)
+        return found
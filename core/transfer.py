@@ -0,0 +1,305 @@
+"""
+Chunked JSONL dump and load of the core tables, for moving the data to
+another database.
+
+dumpdata/loaddata hold a whole table in memory and save it row by row. Here
+the dump writes one file per model, many-to-many tables included, reading
+``chunk_size`` rows at a time in primary-key order with keyset queries
+(``pk > last seen``), so every chunk is an index range scan however deep in
+the table it starts. A line is a JSON array of the row's column values in
+the column order listed in ``manifest.json``. The manifest is rewritten
+after each finished model and marked complete at the end; it also gives the
+load order, every model after the models its foreign keys point to.
+
+The load inserts ``batch_size`` rows per ``bulk_create()`` in that order,
+keeping primary keys and timestamps (auto_now/auto_now_add are switched off
+while it runs). Each batch is committed on its own and then recorded in a
+checkpoint file, so an interrupted load resumes after the last committed
+batch; the first batch after a resume ignores rows that already exist, in
+case the checkpoint write after its commit was lost. bulk_create() sends no
+signals, so nothing is queued, tombstoned or counted on the way in.
+
+Membership of auth groups and permissions lives in tables pointing outside
+core and is not transferred. Dump a quiet database (or a copy made by
+backup_database): the chunks are separate queries and do not form one
+consistent snapshot.
+"""
+import base64
+import gzip
+import json
+import os
+from contextlib import contextmanager
+from datetime import date, datetime, time, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+
+from django.apps import apps
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.utils import timezone
+
+
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+
+
+class TransferError(Exception):
+    pass
+
+
+def encode_value(value):
+    # Full precision and UTC, unlike DjangoJSONEncoder, which drops
+    # microseconds; field.to_python() reads all of these back
+    if isinstance(value, datetime):
+        return value.astimezone(dt_timezone.utc).isoformat() if timezone.is_aware(value) else value.isoformat()
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (bytes, memoryview)):
+        return base64.b64encode(value).decode('ascii')
+    raise TypeError(f'Cannot encode {type(value).__name__}')
+
+
+def related_models(model):
+    return {
+        field.related_model for field in model._meta.local_concrete_fields
+        if field.is_relation and field.related_model is not model
+    }
+
+
+def transfer_models():
+    """
+    The core models, many-to-many tables included, parents before the models
+    whose foreign keys point to them. Returns ``(models, skipped)``: tables
+    with foreign keys outside core are skipped.
+    """
+    candidates = list(apps.get_app_config('core').get_models(include_auto_created=True))
+    skipped = [
+        model for model in candidates
+        if any(related._meta.app_label != 'core' for related in related_models(model))
+    ]
+    remaining = [model for model in candidates if model not in skipped]
+    ordered = []
+    while remaining:
+        ready = [model for model in remaining if related_models(model) <= set(ordered)]
+        if not ready:
+            names = ', '.join(model._meta.label for model in remaining)
+            raise TransferError(f'Circular foreign keys between {names}')
+        ordered.extend(ready)
+        remaining = [model for model in remaining if model not in ready]
+    return ordered, skipped
+
+
+def column_names(model):
+    return [field.attname for field in model._meta.local_concrete_fields]
+
+
+def file_name(model, compress):
+    return f'{model._meta.label_lower}.jsonl' + ('.gz' if compress else '')
+
+
+def open_data_file(path, mode):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def write_json(path, data):
+    """Replace the JSON file at ``path`` in one step"""
+    partial = Path(f'{path}.partial')
+    partial.write_text(json.dumps(data, indent=2))
+    os.replace(partial, path)
+
+
+def read_manifest(directory):
+    path = Path(directory) / MANIFEST
+    try:
+        manifest = json.loads(path.read_text())
+    except FileNotFoundError:
+        raise TransferError(f'No {MANIFEST} in {directory}')
+    if manifest.get('format') != FORMAT_VERSION:
+        raise TransferError(f"Unsupported dump format {manifest.get('format')!r}")
+    return manifest
+
+
+def dump_model(model, path, chunk_size, alias):
+    """Write every row of ``model`` to ``path``; returns the number of rows"""
+    columns = column_names(model)
+    pk_name = model._meta.pk.attname
+    pk_index = columns.index(pk_name)
+    queryset = model._base_manager.using(alias).order_by(pk_name)
+    partial = path.with_name(f'partial-{path.name}')
+    rows = 0
+    last = None
+    with open_data_file(partial, 'w') as output:
+        while True:
+            chunk = queryset if last is None else queryset.filter(**{f'{pk_name}__gt': last})
+            chunk = list(chunk.values_list(*columns)[:chunk_size])
+            if not chunk:
+                break
+            output.writelines(
+                json.dumps(row, default=encode_value, ensure_ascii=False, separators=(',', ':')) + '\n'
+                for row in chunk
+            )
+            rows += len(chunk)
+            last = chunk[-1][pk_index]
+    os.replace(partial, path)
+    return rows
+
+
+def dump(directory, chunk_size, compress=False, resume=False, alias='default', progress=None):
+    """
+    Dump the core tables into ``directory``. With ``resume``, models already
+    finished by an earlier, interrupted dump into the same directory are
+    kept. ``progress(label, rows)`` is called after each model. Returns the
+    manifest.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    models, skipped = transfer_models()
+    done = {}
+    if resume and (directory / MANIFEST).exists():
+        done = {entry['model']: entry for entry in read_manifest(directory)['models']}
+
+    manifest = {
+        'format': FORMAT_VERSION,
+        'complete': False,
+        'skipped': [model._meta.label_lower for model in skipped],
+        'models': [],
+    }
+    for model in models:
+        label = model._meta.label_lower
+        entry = done.get(label)
+        if entry is None or entry['columns'] != column_names(model) or not (directory / entry['file']).exists():
+            name = file_name(model, compress)
+            entry = {
+                'model': label,
+                'file': name,
+                'columns': column_names(model),
+                'rows': dump_model(model, directory / name, chunk_size, alias),
+            }
+        manifest['models'].append(entry)
+        write_json(directory / MANIFEST, manifest)
+        if progress:
+            progress(label, entry['rows'])
+    manifest['complete'] = True
+    write_json(directory / MANIFEST, manifest)
+    return manifest
+
+
+@contextmanager
+def keep_timestamps(model):
+    """Let bulk_create() insert the stored auto_now/auto_now_add values"""
+    fields = [
+        field for field in model._meta.local_concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def read_batches(path, skip, batch_size):
+    """Lists of up to ``batch_size`` decoded rows, after the first ``skip``"""
+    batch = []
+    with open_data_file(path, 'r') as data:
+        for number, line in enumerate(data):
+            if number < skip:
+                continue
+            batch.append(json.loads(line))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def load_model(model, path, columns, batch_size, checkpoint, checkpoint_path, alias, ignore_conflicts=False):
+    """
+    Insert the rows of ``path`` not loaded yet; returns the rows inserted.
+    ``ignore_conflicts`` skips the rows of the first batch that already exist.
+    """
+    by_attname = {field.attname: field for field in model._meta.local_concrete_fields}
+    missing = [column for column in columns if column not in by_attname]
+    if missing:
+        raise TransferError(f"{model._meta.label_lower} has no columns {', '.join(missing)}; migrate the database first")
+    fields = [by_attname[column] for column in columns]
+    label = model._meta.label_lower
+    loaded = checkpoint['rows'] if checkpoint['model'] == label else 0
+    inserted = 0
+    with keep_timestamps(model):
+        for batch in read_batches(path, loaded, batch_size):
+            objects = [
+                model(**{field.attname: field.to_python(value) for field, value in zip(fields, row)})
+                for row in batch
+            ]
+            with transaction.atomic(using=alias):
+                model._base_manager.using(alias).bulk_create(objects, ignore_conflicts=ignore_conflicts)
+            ignore_conflicts = False
+            loaded += len(batch)
+            inserted += len(batch)
+            checkpoint.update(model=label, rows=loaded)
+            write_json(checkpoint_path, checkpoint)
+    return inserted
+
+
+def load(directory, batch_size, checkpoint_path=None, alias='default', progress=None):
+    """
+    Load a dump made by :func:`dump` into the (migrated, empty) database
+    ``alias``, resuming from ``checkpoint_path`` (default: ``.load-checkpoint``
+    in the dump directory) if it exists. The checkpoint is removed once the
+    load completes. ``progress(label, rows)`` is called after each model.
+    Returns the number of rows inserted.
+    """
+    directory = Path(directory)
+    manifest = read_manifest(directory)
+    if not manifest['complete']:
+        raise TransferError('The dump is incomplete; finish it with dump_core_data --resume')
+    checkpoint_path = Path(checkpoint_path or directory / '.load-checkpoint')
+    entries = [(apps.get_model(entry['model']), entry) for entry in manifest['models']]
+
+    # The checkpoint may trail the last commit by one batch, which can be the
+    # first batch of the next model
+    resumed = checkpoint_path.exists()
+    if resumed:
+        checkpoint = json.loads(checkpoint_path.read_text())
+    else:
+        checkpoint = {'done': [], 'model': None, 'rows': 0}
+        filled = [
+            model._meta.label_lower for model, _ in entries
+            if model._base_manager.using(alias).exists()
+        ]
+        if filled:
+            raise TransferError(f"The target database already has rows in {', '.join(filled)}")
+
+    inserted = 0
+    for model, entry in entries:
+        label = model._meta.label_lower
+        if label in checkpoint['done']:
+            continue
+        inserted += load_model(
+            model, directory / entry['file'], entry['columns'],
+            batch_size, checkpoint, checkpoint_path, alias, ignore_conflicts=resumed,
+        )
+        resumed = False
+        checkpoint['done'].append(label)
+        checkpoint.update(model=None, rows=0)
+        write_json(checkpoint_path, checkpoint)
+        if progress:
+            progress(label, entry['rows'])
+
+    # Explicit primary keys leave PostgreSQL's sequences behind (no-op on SQLite)
+    connection = connections[alias]
+    statements = connection.ops.sequence_reset_sql(no_style(), [model for model, _ in entries])
+    if statements:
+        with transaction.atomic(using=alias), connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    checkpoint_path.unlink()
+    return inserted
@@ -1,5 +1,6 @@
 from django.urls import path
-from . import views
+from . import metrics, views
+from .lazyurls import lazy_include
 
 urlpatterns = [
     path('', views.home, name='home'),
@@ -20,4 +21,12 @@ urlpatterns = [
     
     # AJAX views
     path('ajax/lesson-topics/', views.get_lesson_topics, name='get_lesson_topics'),
+    path('ajax/price-stats/', views.get_price_stats, name='get_price_stats'),
+    path('ajax/teachers/', views.teacher_autocomplete, name='teacher_autocomplete'),
+    
+    # Prometheus scrape endpoint
+    path('metrics', metrics.metrics, name='metrics'),
+    
+    # JSON API (see api_urls.py; imported on first use)
+    lazy_include('api/v1/', 'core.api_urls', 'api'),
 ] 
\ No newline at end of file
@@ -1,21 +1,169 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.contrib.auth.forms import AuthenticationForm
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django.http import JsonResponse
-from django.db.models import Q
-from .forms import (
-    UserRegistrationForm, TeacherProfileForm, LessonRequestForm, 
-    TeacherAvailabilityForm, LessonSearchForm
-)
+from django.db import transaction
+from django.db.models import Max, Q
 from .models import (
     User, TeacherProfile, LessonRequest, TeacherAvailability, 
     LessonBooking, Specialization, LessonTopic
 )
+from .archive import request_history, booking_history
+from .autocomplete import search_teachers
+from .caching import dashboard_versions, dashboard_user_version_name, get_versions
+from .facets import search_facets
+from .freebusy import free_teachers
+from . import outbox, pricing
+from .recommendations import similar_teachers, also_booked_for_student
+from .scheduling import BookingConflict, book_availability
+from .throttling import throttle_auth
+
+# Forms are imported by the views that use them: building the form classes
+# (and the choice querysets declared on them) is left out of worker startup
+
+
+def page_etag(*parts):
+    """ETag from version stamps; RELEASE is mixed in so a deploy changes every page"""
+    raw = ':'.join(str(part) for part in (settings.RELEASE, *parts))
+    return hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+
+
+def has_messages(request):
+    # Pages with pending flash messages are always rendered, otherwise the
+    # message would be shown on a later page instead
+    return bool(len(messages.get_messages(request)))
+
+
+def dashboard_etag(request, *args, **kwargs):
+    """ETag for a dashboard, derived from the user's dashboard versions"""
+    if not request.user.is_authenticated or has_messages(request):
+        return None
+    versions = dashboard_versions(request.user)
+    return page_etag(request.user.pk, request.user.user_type, versions['requests'])
+
+
+def home_etag(request, *args, **kwargs):
+    """The home page only shows the user's own details"""
+    if has_messages(request):
+        return None
+    if not request.user.is_authenticated:
+        return page_etag('home', 'anonymous')
+    return page_etag('home', request.user.pk, request.user.updated_at.timestamp())
+
+
+def home_last_modified(request, *args, **kwargs):
+    if not request.user.is_authenticated or has_messages(request):
+        return None
+    return request.user.updated_at
+
+
+def search_etag(request, *args, **kwargs):
+    """
+    ETag for a search: the results depend on the teacher profiles, the
+    taxonomy, the recommendations and the student's own bookings. Searches
+    filtered by free/busy depend on every teacher's bookings, so get none.
+    Results can also lose rows (a profile deleted or made unavailable), which
+    a max(updated_at) cannot express, so there is no Last-Modified.
+    """
+    user = request.user
+    if (not user.is_authenticated or not user.is_student or has_messages(request)
+            or request.GET.get('available_date') or request.GET.get('available_time')):
+        return None
+    user_version = dashboard_user_version_name(user.pk)
+    versions = get_versions(['teacher_profiles', 'taxonomy', 'recommendations', user_version])
+    return page_etag(
+        'search', user.pk, user.updated_at.timestamp(), request.get_full_path(),
+        versions['teacher_profiles'], versions['taxonomy'], versions['recommendations'],
+        versions[user_version],
+    )
+
+
+def teacher_profile_last_modified(request, *args, **kwargs):
+    """
+    The profile form shows the user, their profile and the specialization
+    and topic choices
+    """
+    user = request.user
+    if request.method != 'GET' or not user.is_authenticated or not user.is_teacher or has_messages(request):
+        return None
+    # Shared by the ETag, so the queries run once per request
+    if not hasattr(request, '_teacher_profile_last_modified'):
+        stamps = [user.updated_at]
+        stamps.extend(TeacherProfile.objects.filter(user=user).values_list('updated_at', flat=True))
+        stamps.extend(stamp for stamp in (
+            Specialization.objects.aggregate(stamp=Max('updated_at'))['stamp'],
+            LessonTopic.objects.aggregate(stamp=Max('updated_at'))['stamp'],
+        ) if stamp)
+        request._teacher_profile_last_modified = max(stamps)
+    return request._teacher_profile_last_modified
+
+
+def teacher_profile_etag(request, *args, **kwargs):
+    last_modified = teacher_profile_last_modified(request)
+    if last_modified is None:
+        return None
+    # The form embeds the CSRF token, which changes with the CSRF cookie;
+    # the taxonomy version also covers deleted choices
+    return page_etag(
+        'teacher_profile', request.user.pk, last_modified.timestamp(), get_versions(['taxonomy'])['taxonomy'],
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    )
+
+
+def public_cache_control(view):
+    """
+    Let browsers and shared caches keep the anonymous version of a page for
+    PUBLIC_PAGE_MAX_AGE seconds; signed-in users (and pages with flash
+    messages) must revalidate, and only get private copies
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        private = request.user.is_authenticated or has_messages(request)
+        response = view(request, *args, **kwargs)
+        if private or response.cookies:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, public=True, max_age=settings.PUBLIC_PAGE_MAX_AGE)
+        # Whether the user is signed in is only known from the cookies
+        patch_vary_headers(response, ['Cookie'])
+        return response
+    return wrapper
+
+
+def eligible_lesson_requests(teacher_profile, status='pending'):
+    """
+    Requests a teacher is eligible for: same topic, within the student's
+    budget, and only while the teacher is available (the same rule
+    match_requests applies in batch). Pending ones unless ``status`` says
+    otherwise (None for any).
+    """
+    if not teacher_profile.is_available:
+        return LessonRequest.objects.none()
+    lesson_requests = LessonRequest.objects.filter(
+        lesson_topic__in=teacher_profile.lesson_topics.all(),
+        max_hourly_rate__gte=teacher_profile.hourly_rate,
+    ).exclude(
+        student_id=teacher_profile.user_id
+    )
+    if status is not None:
+        lesson_requests = lesson_requests.filter(status=status)
+    return lesson_requests
 
+
+@throttle_auth('sign_in')
 def sign_in(request):
     """Sign in view"""
+    from django.contrib.auth.forms import AuthenticationForm
+    
     if request.user.is_authenticated:
         return redirect('home')
     
@@ -38,8 +186,11 @@ def sign_in(request):
     
     return render(request, 'core/sign_in.html', {'form': form})
 
+@throttle_auth('sign_up')
 def sign_up(request):
     """Sign up view"""
+    from .forms import UserRegistrationForm
+    
     if request.user.is_authenticated:
         return redirect('home')
     
@@ -64,13 +215,19 @@ def sign_out(request):
     messages.info(request, 'You have been successfully signed out.')
     return redirect('sign_in')
 
+@public_cache_control
+@condition(etag_func=home_etag, last_modified_func=home_last_modified)
 def home(request):
     """Home page view"""
     return render(request, 'core/home.html')
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=teacher_profile_etag, last_modified_func=teacher_profile_last_modified)
 def teacher_profile(request):
     """Teacher profile creation/editing view"""
+    from .forms import TeacherProfileForm
+    
     if not request.user.is_teacher:
         messages.error(request, 'Only teachers can access this page.')
         return redirect('home')
@@ -97,8 +254,12 @@ def teacher_profile(request):
     return render(request, 'core/teacher_profile.html', {'form': form})
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=search_etag)
 def lesson_search(request):
     """Lesson search view for students"""
+    from .forms import LessonSearchForm
+    
     if not request.user.is_student:
         messages.error(request, 'Only students can search for lessons.')
         return redirect('home')
@@ -107,33 +268,41 @@ def lesson_search(request):
     teachers = []
     
     if form.is_valid():
-        specialization = form.cleaned_data.get('specialization')
-        lesson_topic = form.cleaned_data.get('lesson_topic')
-        max_hourly_rate = form.cleaned_data.get('max_hourly_rate')
         lesson_duration = form.cleaned_data.get('lesson_duration')
         
-        # Build query for teachers
-        teacher_profiles = TeacherProfile.objects.filter(is_available=True)
-        
-        if specialization:
-            teacher_profiles = teacher_profiles.filter(specializations=specialization)
-        
-        if lesson_topic:
-            teacher_profiles = teacher_profiles.filter(lesson_topics=lesson_topic)
-        
-        if max_hourly_rate:
-            teacher_profiles = teacher_profiles.filter(hourly_rate__lte=max_hourly_rate)
-        
+        # Cards are rendered from the fragment cache; the specializations
+        # are fetched in one query for the cards that miss it
+        teacher_profiles = form.get_teacher_profiles().select_related('user').prefetch_related('specializations')
         teachers = [profile.user for profile in teacher_profiles]
+        
+        # Only teachers with no lesson booked at the requested time
+        available_date = form.cleaned_data.get('available_date')
+        available_time = form.cleaned_data.get('available_time')
+        if available_date and available_time:
+            free = free_teachers(
+                [teacher.pk for teacher in teachers], available_date, available_time,
+                lesson_duration or 60,
+            )
+            teachers = [teacher for teacher in teachers if teacher.pk in free]
+    
+    # Counts for the filters that validated, or for all teachers before a search
+    filters = form.cleaned_data if form.is_bound else {}
+    facets = search_facets(
+        filters.get('specialization'), filters.get('lesson_topic'), filters.get('max_hourly_rate'),
+    )
     
     return render(request, 'core/lesson_search.html', {
         'form': form,
-        'teachers': teachers
+        'teachers': teachers,
+        'facets': facets,
+        'also_booked': also_booked_for_student(request.user),
     })
 
 @login_required
 def lesson_request(request, teacher_id):
     """Create a lesson request for a specific teacher"""
+    from .forms import LessonRequestForm
+    
     if not request.user.is_student:
         messages.error(request, 'Only students can create lesson requests.')
         return redirect('home')
@@ -145,7 +314,10 @@ def lesson_request(request, teacher_id):
         if form.is_valid():
             lesson_request = form.save(commit=False)
             lesson_request.student = request.user
-            lesson_request.save()
+            # Teachers are notified from the outbox, after the commit
+            with transaction.atomic():
+                lesson_request.save()
+                outbox.lesson_request_created(lesson_request, teacher)
             messages.success(request, f'Lesson request sent to {teacher.get_full_name()}!')
             return redirect('student_dashboard')
         else:
@@ -155,10 +327,13 @@ def lesson_request(request, teacher_id):
     
     return render(request, 'core/lesson_request.html', {
         'form': form,
-        'teacher': teacher
+        'teacher': teacher,
+        'similar_teachers': similar_teachers(teacher),
     })
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=dashboard_etag)
 def teacher_dashboard(request):
     """Dashboard for teachers"""
     if not request.user.is_teacher:
@@ -170,32 +345,41 @@ def teacher_dashboard(request):
     except TeacherProfile.DoesNotExist:
         return redirect('teacher_profile')
     
-    # Get lesson requests that match teacher's specializations
-    lesson_requests = LessonRequest.objects.filter(
-        lesson_topic__in=teacher_profile.lesson_topics.all(),
-        status='pending'
-    ).exclude(
-        student=request.user
+    # Querysets are lazy: sections served from the fragment cache never
+    # run them
+    
+    # Get lesson requests the teacher is eligible for
+    lesson_requests = eligible_lesson_requests(teacher_profile).select_related(
+        'student', 'lesson_topic'
     ).order_by('-created_at')
     
-    # Get teacher's availabilities
+    # Get teacher's availabilities (archived ones are in booking_history)
     availabilities = TeacherAvailability.objects.filter(
         teacher=request.user
+    ).select_related(
+        'lesson_request__student', 'lesson_request__lesson_topic'
     ).order_by('-created_at')
     
     # Get bookings
     bookings = LessonBooking.objects.filter(
         teacher=request.user
+    ).select_related(
+        'lesson_request__student', 'lesson_request__lesson_topic', 'teacher_availability'
     ).order_by('-created_at')
     
     return render(request, 'core/teacher_dashboard.html', {
         'teacher_profile': teacher_profile,
         'lesson_requests': lesson_requests,
         'availabilities': availabilities,
-        'bookings': bookings
+        'bookings': bookings,
+        'booking_history': booking_history(request.user),
+        'dashboard_versions': dashboard_versions(request.user),
+        'dashboard_cache_timeout': settings.DASHBOARD_CACHE_TIMEOUT,
     })
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=dashboard_etag)
 def student_dashboard(request):
     """Dashboard for students"""
     if not request.user.is_student:
@@ -205,21 +389,31 @@ def student_dashboard(request):
     # Get student's lesson requests
     lesson_requests = LessonRequest.objects.filter(
         student=request.user
+    ).select_related('lesson_topic').prefetch_related(
+        'bookings__teacher__teacher_profile',
+        'bookings__teacher_availability',
     ).order_by('-created_at')
     
     # Get availabilities for student's requests
     availabilities = TeacherAvailability.objects.filter(
         lesson_request__student=request.user
+    ).select_related(
+        'teacher__teacher_profile', 'lesson_request__lesson_topic'
     ).order_by('-created_at')
     
     return render(request, 'core/student_dashboard.html', {
         'lesson_requests': lesson_requests,
-        'availabilities': availabilities
+        'availabilities': availabilities,
+        'request_history': request_history(request.user),
+        'dashboard_versions': dashboard_versions(request.user),
+        'dashboard_cache_timeout': settings.DASHBOARD_CACHE_TIMEOUT,
     })
 
 @login_required
 def submit_availability(request, lesson_request_id):
     """Submit availability for a lesson request"""
+    from .forms import TeacherAvailabilityForm
+    
     if not request.user.is_teacher:
         messages.error(request, 'Only teachers can submit availability.')
         return redirect('home')
@@ -227,12 +421,14 @@ def submit_availability(request, lesson_request_id):
     lesson_request = get_object_or_404(LessonRequest, id=lesson_request_id)
     
     if request.method == 'POST':
-        form = TeacherAvailabilityForm(request.POST)
+        form = TeacherAvailabilityForm(request.POST, teacher=request.user)
         if form.is_valid():
             availability = form.save(commit=False)
             availability.teacher = request.user
             availability.lesson_request = lesson_request
-            availability.save()
+            with transaction.atomic():
+                availability.save()
+                outbox.availability_submitted(availability)
             messages.success(request, 'Availability submitted successfully!')
             return redirect('teacher_dashboard')
         else:
@@ -259,21 +455,12 @@ def accept_availability(request, availability_id):
         messages.error(request, 'You can only accept availability for your own lesson requests.')
         return redirect('student_dashboard')
     
-    # Create booking
-    booking = LessonBooking.objects.create(
-        lesson_request=availability.lesson_request,
-        teacher=availability.teacher,
-        teacher_availability=availability
-    )
-    
-    # Mark availability as accepted
-    availability.is_accepted = True
-    availability.save()
-    
-    # Update lesson request status
-    lesson_request = availability.lesson_request
-    lesson_request.status = 'matched'
-    lesson_request.save()
+    # The request may be matched, or the slot booked, meanwhile
+    try:
+        book_availability(availability)
+    except BookingConflict as error:
+        messages.error(request, str(error))
+        return redirect('student_dashboard')
     
     messages.success(request, f'Lesson booked with {availability.teacher.get_full_name()}!')
     return redirect('student_dashboard')
@@ -283,6 +470,32 @@ def get_lesson_topics(request):
     specialization_id = request.GET.get('specialization_id')
     if specialization_id:
         lesson_topics = LessonTopic.objects.filter(specialization_id=specialization_id)
-        data = [{'id': topic.id, 'name': topic.name} for topic in lesson_topics]
-        return JsonResponse({'lesson_topics': data})
+        topic_stats = pricing.get_price_stats()['topics']
+        data = [
+            {'id': topic.id, 'name': topic.name, 'price_stats': topic_stats.get(topic.id)}
+            for topic in lesson_topics
+        ]
+        return JsonResponse({
+            'lesson_topics': data,
+            'price_stats': pricing.price_stats_for(specialization_id=specialization_id),
+        })
     return JsonResponse({'lesson_topics': []})
+
+@login_required
+def teacher_autocomplete(request):
+    """AJAX view with the teachers whose names start like ?q= (core.autocomplete)"""
+    query = request.GET.get('q', '')[:100]
+    return JsonResponse({'teachers': [
+        {**teacher, 'url': reverse('lesson_request', args=[teacher['id']])}
+        for teacher in search_teachers(query)
+    ]})
+
+def get_price_stats(request):
+    """AJAX view with the hourly-rate distribution of a topic or specialization"""
+    return JsonResponse({
+        'price_stats': pricing.price_stats_for(
+            lesson_topic_id=request.GET.get('lesson_topic_id'),
+            specialization_id=request.GET.get('specialization_id'),
+        ),
+        'bins': pricing.get_price_stats()['bins'],
+    })
@@ -0,0 +1,85 @@
+"""
+Optional warm-up of a new worker, run by dyschool/wsgi.py when
+WARMUP_ON_STARTUP is set, before the worker accepts traffic.
+
+It imports the modules the URLconfs load lazily (except the admin), compiles
+the common templates, primes the version stamps and the price statistics
+(importing NumPy if they have to be rebuilt) and sends WARMUP_PATHS through
+the whole WSGI stack once. Database connections opened meanwhile are closed,
+so none is shared with workers forked from a preloaded application.
+"""
+import importlib
+import sys
+import time
+from io import BytesIO
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.db import connections
+from django.template.loader import get_template
+
+
+MODULES = ['core.views', 'core.forms', 'core.api_urls']
+
+TEMPLATES = [
+    'core/base.html',
+    'core/home.html',
+    'core/sign_in.html',
+    'core/lesson_search.html',
+    'core/student_dashboard.html',
+    'core/teacher_dashboard.html',
+    'core/includes/teacher_card.html',
+]
+
+
+def warmup_host():
+    """A host name ALLOWED_HOSTS accepts"""
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+def wsgi_request(application, path):
+    """GET ``path`` through the WSGI application; returns ``(status code, body size)``"""
+    path, _, query = path.partition('?')
+    environ = {
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'HTTP_HOST': warmup_host(),
+        'wsgi.input': BytesIO(),
+        'wsgi.errors': sys.stderr,
+    }
+    setup_testing_defaults(environ)
+    statuses = []
+    response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        size = sum(len(chunk) for chunk in response)
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
+    return int(statuses[0].split()[0]), size
+
+
+def warm_up(application):
+    """Run every warm-up step; returns ``{step: milliseconds}``"""
+    from . import pricing
+    from .caching import get_versions
+
+    timings = {}
+
+    def step(name, function):
+        start = time.perf_counter()
+        function()
+        timings[name] = (time.perf_counter() - start) * 1000
+
+    step('imports', lambda: [importlib.import_module(module) for module in MODULES])
+    step('templates', lambda: [get_template(name) for name in TEMPLATES])
+    step('caches', lambda: (
+        get_versions(['taxonomy', 'teacher_profiles', 'recommendations']),
+        pricing.get_price_stats(),
+    ))
+    for path in settings.WARMUP_PATHS:
+        step(f'GET {path}', lambda: wsgi_request(application, path))
+    connections.close_all()
+    return timings
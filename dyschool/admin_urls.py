@@ -0,0 +1,10 @@
+"""
+Admin URLconf, a lazy include of dyschool/urls.py: it is only imported (and
+the admin modules registered) when an admin URL is first resolved or
+reversed; see dyschool.apps.LazyAdminConfig and core.lazyurls.
+"""
+from django.contrib import admin
+
+admin.autodiscover()
+
+urlpatterns = admin.site.get_urls()
@@ -0,0 +1,24 @@
+from django.contrib.admin.apps import SimpleAdminConfig
+from django.contrib.admin.checks import check_admin_app, check_dependencies
+from django.core import checks
+
+
+def check_lazy_admin(app_configs, **kwargs):
+    """Admin checks, after loading the ModelAdmins they would otherwise miss"""
+    from django.contrib import admin
+
+    admin.autodiscover()
+    return check_admin_app(app_configs, **kwargs)
+
+
+class LazyAdminConfig(SimpleAdminConfig):
+    """
+    The admin without autodiscovery at startup: the admin modules (and
+    everything they import) are loaded with the admin URLconf, on the first
+    /admin/ request or reverse() of an admin URL (see dyschool/admin_urls.py),
+    so web workers that never serve the admin do not load it.
+    """
+
+    def ready(self):
+        checks.register(check_dependencies, checks.Tags.admin)
+        checks.register(check_lazy_admin, checks.Tags.admin)
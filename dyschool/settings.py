@@ -32,7 +32,7 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    'dyschool.apps.LazyAdminConfig',  # django.contrib.admin, registered on first use
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.timing.ServerTimingMiddleware',  # first, so its total covers the rest
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,7 +56,7 @@ ROOT_URLCONF = 'dyschool.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.timing.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -82,6 +83,142 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory is per process: with several workers use Redis (the redis
+# package is in requirements.txt), the one backend here that is shared and
+# has the atomic incr() sign-in throttling counts with. The file backend is
+# shared too, but its incr() is not atomic (check warns, core.W001), so it
+# only suits throttling disabled or a single host with light traffic. These
+# are Django's backends with their calls timed per request (core.timing).
+
+CACHE_BACKEND = os.environ.get('DYSCHOOL_CACHE_BACKEND', 'locmem')
+
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.timing.TimedRedisCache',
+            'LOCATION': os.environ.get('DYSCHOOL_CACHE_LOCATION', 'redis://127.0.0.1:6379/0'),
+        }
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.timing.TimedFileBasedCache',
+            'LOCATION': os.environ.get('DYSCHOOL_CACHE_LOCATION', BASE_DIR / 'cache'),
+            'OPTIONS': {'MAX_ENTRIES': 50000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.timing.TimedLocMemCache',
+            'LOCATION': 'dyschool',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Warm new workers up before they accept traffic (core.warmup): lazily
+# loaded modules, templates, caches and one request to each WARMUP_PATHS
+WARMUP_ON_STARTUP = os.environ.get('DYSCHOOL_WARMUP') == '1'
+WARMUP_PATHS = ['/']
+
+# Per-request latency breakdown (core.timing): database, template, cache and
+# view time, sent as a Server-Timing header and logged as a JSON line for a
+# SERVER_TIMING_SAMPLE_RATE fraction of requests and every slow request
+SERVER_TIMING_HEADER = True
+SERVER_TIMING_SAMPLE_RATE = float(os.environ.get('DYSCHOOL_TIMING_SAMPLE_RATE', 0.01))
+SERVER_TIMING_SLOW_MS = 500
+
+# Prometheus metrics (core.metrics) at /metrics, for METRICS_ALLOWED_IPS only;
+# each worker process keeps its counts in a memory-mapped file in METRICS_DIR
+METRICS_ENABLED = True
+METRICS_DIR = os.environ.get('DYSCHOOL_METRICS_DIR', BASE_DIR / 'metrics')
+METRICS_ALLOWED_IPS = os.environ.get('DYSCHOOL_METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
+# Runs the tests with METRICS_DIR in a temporary directory, so they do not
+# leave per-process files in the one above
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'timing': {'class': 'logging.StreamHandler', 'formatter': 'message'},
+    },
+    'loggers': {
+        'core.timing': {'handlers': ['timing'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# Mixed into every page ETag; set DYSCHOOL_RELEASE per deploy so browsers
+# revalidate pages whose templates changed
+RELEASE = os.environ.get('DYSCHOOL_RELEASE', '')
+
+# Seconds browsers and shared caches may reuse anonymous pages (the home
+# page) without asking; signed-in pages always revalidate with their ETag
+PUBLIC_PAGE_MAX_AGE = 5 * 60
+
+# Rendered teacher cards on the search page
+TEACHER_CARD_CACHE_TIMEOUT = 60 * 60 * 24  # 24 hours
+
+# Rendered dashboard sections, invalidated by signals on every relevant write.
+# The versions behind them and the dashboard ETags are in the default cache:
+# with locmem and several workers, the others keep serving the old sections
+# and 304s (check --deploy fails, core.E003), so run them on Redis
+DASHBOARD_CACHE_TIMEOUT = 60 * 60  # 1 hour
+
+# Hourly-rate distribution per topic/specialization (core.pricing); keyed by
+# the taxonomy and teacher-profile versions, so the timeout is only a backstop
+PRICE_STATS_CACHE_TIMEOUT = 60 * 60 * 24  # 24 hours
+PRICE_HISTOGRAM_BINS = 10
+
+# Teacher name autocomplete (core.autocomplete): matches per query, teachers
+# kept in each worker's in-memory index, and how often (seconds) a worker
+# checks whether another one changed a teacher
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_TEACHERS = 50000
+AUTOCOMPLETE_VERSION_CHECK_INTERVAL = 5
+
+# Search facet counts (core.facets) per filter combination; keyed by the same
+# versions, so the timeout only bounds how long rare combinations are kept
+SEARCH_FACETS_CACHE_TIMEOUT = 60 * 60  # 1 hour
+
+# Closed requests untouched for this many days are moved to the archive
+# tables by archive_requests, in transactions of ARCHIVE_BATCH_SIZE requests
+ARCHIVE_RETENTION_DAYS = int(os.environ.get('DYSCHOOL_ARCHIVE_RETENTION_DAYS', 180))
+ARCHIVE_BATCH_SIZE = 500
+
+# Archived requests/bookings shown in the dashboards' history sections
+DASHBOARD_HISTORY_LIMIT = 20
+
+# Eligible teachers stored per pending request by match_requests (cheapest first)
+MATCH_LIMIT = 20
+
+# JSON API page sizes (?limit= is capped at API_MAX_PAGE_SIZE)
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+# Batches of ?limit= rows a search filtered by free/busy reads to fill a
+# page; past that it returns a short page and a cursor
+API_PAGE_PASSES = 4
+
+# Delta sync (/api/v1/changes/): each sync re-reads SYNC_OVERLAP seconds
+# before its token to catch late commits; more than SYNC_MAX_CHANGES changed
+# rows of one kind or deletions, or a token older than the tombstones kept,
+# make the client reload
+SYNC_OVERLAP = 2
+SYNC_MAX_CHANGES = 500
+SYNC_TOMBSTONE_RETENTION_DAYS = 30
+
+
+# Unfiltered admin changelists at or above this many rows (per the database
+# statistics) show an estimated count instead of running COUNT(*)
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -101,6 +238,29 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+PASSWORD_HASHERS = [
+    'core.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+# PBKDF2 iteration count; None keeps Django's default.
+# Tune with: python manage.py benchmark_hashing --target-ms 150
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('DYSCHOOL_PASSWORD_HASH_ITERATIONS', 0)) or None
+
+# Sign-in/sign-up throttling as (attempts, per window of seconds); the
+# username limit is per client IP, the account limit counts a username from
+# every IP and is kept high, as anyone reaching it locks the account out for
+# the rest of its window. A successful sign-in clears both.
+# DYSCHOOL_AUTH_THROTTLE=0 turns it off (e.g. on a cache without atomic incr)
+AUTH_THROTTLE_ENABLED = os.environ.get('DYSCHOOL_AUTH_THROTTLE', '1') == '1'
+AUTH_THROTTLE_IP_RATE = (20, 60)  # 20 per minute
+AUTH_THROTTLE_USERNAME_RATE = (5, 300)  # 5 per 5 minutes
+AUTH_THROTTLE_ACCOUNT_RATE = (50, 3600)  # 50 per hour
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -140,12 +300,51 @@ LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'sign_in'
 
 # Message settings
-MESSAGE_STORAGE = 'django.contrib.messages.storage.session.SessionStorage'
+# 'fallback' keeps messages in a signed cookie and only spills over to the
+# session when they do not fit, so POST-redirect flows don't write sessions.
+MESSAGE_STORAGE_BACKENDS = {
+    'fallback': 'django.contrib.messages.storage.fallback.FallbackStorage',
+    'cookie': 'django.contrib.messages.storage.cookie.CookieStorage',
+    'session': 'django.contrib.messages.storage.session.SessionStorage',
+}
+MESSAGE_STORAGE = MESSAGE_STORAGE_BACKENDS[
+    os.environ.get('DYSCHOOL_MESSAGE_STORAGE', 'fallback')
+]
 
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 
 # Session settings
+# 'cached_db' serves session reads from the cache and only writes the DB when
+# the session changes; 'signed_cookies' avoids the session table entirely.
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_ENGINE = SESSION_ENGINES[os.environ.get('DYSCHOOL_SESSION_STORAGE', 'cached_db')]
 SESSION_COOKIE_AGE = 86400  # 24 hours
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
+
+# Email: written to files under EMAIL_FILE_PATH by default; switch with
+# DYSCHOOL_EMAIL_BACKEND ('file', 'locmem', 'console', 'smtp')
+EMAIL_BACKENDS = {
+    'file': 'django.core.mail.backends.filebased.EmailBackend',
+    'locmem': 'django.core.mail.backends.locmem.EmailBackend',
+    'console': 'django.core.mail.backends.console.EmailBackend',
+    'smtp': 'django.core.mail.backends.smtp.EmailBackend',
+}
+EMAIL_BACKEND = EMAIL_BACKENDS[os.environ.get('DYSCHOOL_EMAIL_BACKEND', 'file')]
+EMAIL_FILE_PATH = os.environ.get('DYSCHOOL_EMAIL_FILE_PATH', BASE_DIR / 'sent_emails')
+DEFAULT_FROM_EMAIL = os.environ.get('DYSCHOOL_DEFAULT_FROM_EMAIL', 'Dyschool <no-reply@dyschool.local>')
+
+# Base URL for links in emails
+SITE_URL = os.environ.get('DYSCHOOL_SITE_URL', 'http://localhost:8000')
+
+# Notification outbox (core.outbox), delivered by deliver_notifications
+OUTBOX_BATCH_SIZE = 200  # messages claimed per batch
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = 60  # seconds before the first retry, doubled on each further one
+OUTBOX_CLAIM_TIMEOUT = 10 * 60  # seconds before a batch claimed by a dead worker is retried
+OUTBOX_RETENTION_DAYS = 30  # sent messages are purged after this many days
@@ -14,13 +14,14 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from core.lazyurls import lazy_include
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    # The admin loads on first use (see admin_urls.py)
+    lazy_include('admin/', 'dyschool.admin_urls', 'admin'),
     path('', include('core.urls')),
 ]
 
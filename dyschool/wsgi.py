@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dyschool.settings')
 
 application = get_wsgi_application()
+
+# Optionally warm the worker up before it accepts traffic (see core.warmup)
+from django.conf import settings  # noqa: E402
+
+if settings.WARMUP_ON_STARTUP:
+    from core.warmup import warm_up
+
+    warm_up(application)